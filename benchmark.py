@@ -0,0 +1,518 @@
+import gc
+import os
+import sys
+import time
+from collections import Counter
+from compiler.opcodes import OpCode
+from compiler.lexer import Lexer
+from compiler.parser import Parser
+from compiler.compiler import Compiler
+from runtime.vm.vm import VM
+from runtime.vm.base import range_of
+from runtime.vm.dispatch import build_dispatch_table, END
+
+# Usage: python benchmark.py <command> [file_or_dir ...] [--seconds N]
+#
+# vm       - instructions per second of every VM engine on the macros in examples/
+# opcodes  - most frequently executed opcode pairs, measured without superinstructions
+# quicken  - instructions per second of the table engine with and without type-feedback quickening
+# compile  - lexer, parser and compiler time on synthetic sources (python benchmark.py compile [lines ...])
+# lex      - lexer throughput in MB/s against the original character-by-character lexer (verify_lexer.py)
+# parse    - parser time against the original recursive-descent parser (verify_parser.py) and AST memory
+# edit     - latency of the editor's incremental front end on a 5000-line source (python benchmark.py edit [lines])
+# cache    - load time of compiled programs, pickle against the .tmlc format (python benchmark.py cache [lines ...])
+# shared   - start time and memory of 20 runtimes of one macro, each with its own program against one shared
+#            program (python benchmark.py shared [runtimes] [lines])
+#
+# Macros run against inert builtins, so no real input is injected while benchmarking.
+
+class Inert(float):
+    """Stand-in for stdlib objects: every attribute and call yields another Inert(0)."""
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return INERT
+
+    def __call__(self, *args, **kwargs):
+        return INERT
+
+INERT = Inert(0.0)
+
+def _noop(*args, **kwargs):
+    return None
+
+def find_macros(paths):
+    files = []
+    for path in paths or ["examples"]:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                for name in sorted(names):
+                    if name.endswith(".tml"):
+                        files.append(os.path.join(root, name))
+        elif os.path.exists(path):
+            files.append(path)
+    return sorted(files)
+
+def compile_source(source, superinstructions=True):
+    tokens = Lexer(source).tokenize()
+    program = Parser(tokens).parse()
+    compiler = Compiler(superinstructions=superinstructions)
+    chunk = compiler.compile(program)
+    return chunk, compiler.functions
+
+def make_globals(chunk, functions):
+    """Builds a globals dict where every name the macro could look up resolves to something harmless."""
+    env = {}
+    for c in [chunk] + [f.chunk for f in functions.values()]:
+        for const in c.constants:
+            if isinstance(const, str) and const.isidentifier() and const not in functions:
+                env[const] = INERT
+    env.update({
+        "int": int, "float": float, "str": str, "len": len, "type": type, "range": range_of,
+        "print": _noop, "sleep": _noop, "exit": _noop, "stop": _noop, "None": None,
+        "tick": INERT, "left": 1, "right": 2, "middle": 3,
+    })
+    return env
+
+def run_macro(chunk, functions, engine, seconds, vm_class=VM, **options):
+    """
+    Drives a macro through top-level code, on_init and as many ticks as fit in `seconds`.
+    Macros without on_tick are restarted on a fresh VM until the time is up.
+    `options` override @meta settings of the macro.
+    """
+    meta = chunk.metadata
+    limit = meta.get("instruction_limit", 1000)
+    if limit == -1 or meta.get("no_limit", False):
+        # Unbounded macros never return on their own; give them a finite per-tick budget
+        limit = 1000
+    chunk.metadata = dict(meta, instruction_limit=limit, engine=engine, **options)
+
+    count = 0
+    errors = 0
+    has_tick = "on_tick" in functions
+    start = time.perf_counter()
+    deadline = start + seconds
+    vm = None
+    try:
+        while time.perf_counter() < deadline and errors <= 100:
+            try:
+                if vm is None or (not vm.is_yielded and not has_tick):
+                    if vm is not None:
+                        count += vm.total_instruction_count
+                    vm = vm_class(make_globals(chunk, functions), engine=engine)
+                    vm.run(chunk, functions)
+                    if not vm.is_yielded and "on_init" in functions:
+                        vm.call_function("on_init")
+                elif vm.is_yielded:
+                    vm.resume()
+                else:
+                    vm.call_function("on_tick", 0.016)
+            except Exception:
+                errors += 1
+                vm.stack.clear()
+                vm.frames.clear()
+                vm.is_yielded = False
+    finally:
+        chunk.metadata = meta
+    elapsed = time.perf_counter() - start
+    if vm is not None:
+        count += vm.total_instruction_count
+    return count, elapsed, errors
+
+def bench_vm(paths, seconds):
+    engines = VM.ENGINES
+    print(f"{'macro':<40}" + "".join(f"{e + ' IPS':>16}" for e in engines) + f"{'speedup':>10}")
+    totals = {e: [0, 0.0] for e in engines}
+    for path in find_macros(paths):
+        with open(path, "r", encoding="utf-8") as f:
+            source = f.read()
+        try:
+            chunk, functions = compile_source(source)
+        except Exception as e:
+            print(f"{os.path.basename(path):<40} compile error: {e}")
+            continue
+
+        row = {}
+        for engine in engines:
+            count, elapsed, errors = run_macro(chunk, functions, engine, seconds)
+            row[engine] = count / elapsed if elapsed > 0 else 0.0
+            totals[engine][0] += count
+            totals[engine][1] += elapsed
+
+        speedup = row[engines[0]] / row[engines[-1]] if row[engines[-1]] else 0.0
+        name = os.path.relpath(path)[-40:]
+        print(f"{name:<40}" + "".join(f"{row[e]:>16,.0f}" for e in engines) + f"{speedup:>9.2f}x")
+
+    overall = {e: (c / t if t else 0.0) for e, (c, t) in totals.items()}
+    speedup = overall[engines[0]] / overall[engines[-1]] if overall[engines[-1]] else 0.0
+    print(f"{'TOTAL':<40}" + "".join(f"{overall[e]:>16,.0f}" for e in engines) + f"{speedup:>9.2f}x")
+
+def bench_quicken(paths, seconds):
+    """Compares the table engine with quickening off and on. Tiering is disabled so all code stays in the bytecode."""
+    modes = (False, True)
+    print(f"{'macro':<40}{'generic IPS':>16}{'quickened IPS':>16}{'speedup':>10}")
+    totals = {q: [0, 0.0] for q in modes}
+    for path in find_macros(paths):
+        with open(path, "r", encoding="utf-8") as f:
+            source = f.read()
+        try:
+            chunk, functions = compile_source(source)
+        except Exception as e:
+            print(f"{os.path.basename(path):<40} compile error: {e}")
+            continue
+
+        row = {}
+        for quicken in modes:
+            count, elapsed, errors = run_macro(chunk, functions, "table", seconds, backend="bytecode", quicken=quicken)
+            row[quicken] = count / elapsed if elapsed > 0 else 0.0
+            totals[quicken][0] += count
+            totals[quicken][1] += elapsed
+
+        speedup = row[True] / row[False] if row[False] else 0.0
+        name = os.path.relpath(path)[-40:]
+        print(f"{name:<40}{row[False]:>16,.0f}{row[True]:>16,.0f}{speedup:>9.2f}x")
+
+    overall = {q: (c / t if t else 0.0) for q, (c, t) in totals.items()}
+    speedup = overall[True] / overall[False] if overall[False] else 0.0
+    print(f"{'TOTAL':<40}{overall[False]:>16,.0f}{overall[True]:>16,.0f}{speedup:>9.2f}x")
+
+def tracing_vm(pairs):
+    """Returns a VM class whose dispatch table counts every executed (previous, current) opcode pair."""
+    names = {op.value: op.name for op in OpCode}
+    names[END] = "END"
+    last = [None]
+
+    def trace(name, handler):
+        def traced(base, arg, ip):
+            pairs[(last[0], name)] += 1
+            last[0] = name
+            return handler(base, arg, ip)
+        return traced
+
+    class TracingVM(VM):
+        def _execute_table(self):
+            if self._dispatch is None:
+                table = build_dispatch_table(self)
+                self._dispatch = [trace(names.get(op), handler) for op, handler in enumerate(table)]
+            return super()._execute_table()
+
+    return TracingVM
+
+def bench_opcodes(paths, seconds, top=25):
+    """
+    Averages the share of each opcode pair over all macros, so a single hot
+    loop does not drown out the rest. This is the data superinstructions are picked from.
+    """
+    shares = Counter()
+    macros = 0
+    for path in find_macros(paths):
+        with open(path, "r", encoding="utf-8") as f:
+            source = f.read()
+        try:
+            chunk, functions = compile_source(source, superinstructions=False)
+        except Exception:
+            continue
+        pairs = Counter()
+        run_macro(chunk, functions, "table", seconds, vm_class=tracing_vm(pairs))
+        total = sum(count for pair, count in pairs.items() if pair[0] is not None)
+        if not total:
+            continue
+        macros += 1
+        for pair, count in pairs.items():
+            if pair[0] is not None:
+                shares[pair] += count / total
+
+    print(f"{'opcode pair':<50}{'share':>10}")
+    for (a, b), share in shares.most_common(top):
+        print(f"{a + ', ' + b:<50}{share / macros:>9.1%}")
+
+def synthetic_source(lines):
+    """
+    A generated macro of about `lines` lines: many small functions, distinct
+    string and number constants at top level, and one function whose locals
+    grow with the size, the shapes that made constant and local lookups
+    quadratic.
+    """
+    out = ["@meta {\"no_tick\": true}", "let total = 0"]
+    big = ["func big(seed):", "    let v0 = seed"]
+    i = 0
+    while len(out) + len(big) < lines:
+        out += [
+            f"func f{i}(a, b):",
+            f"    let x = a * {i} + b",
+            f"    if x > {i % 97}:",
+            f"        set x = x - 1",
+            f"    return x",
+            f"let g{i} = f{i}({i}, 2)",
+            f"set total = total + g{i}",
+            f"print(\"value {i}\", g{i})",
+        ]
+        big.append(f"    let v{i + 1} = v{i} + {i % 13}")
+        i += 1
+    big.append(f"    return v{i}")
+    return "\n".join(out + big + ["print(big(total))"]) + "\n"
+
+def bench_compile(sizes, repeats=3):
+    """
+    Best-of-`repeats` times per stage; time per line should stay flat as
+    sources grow. The cyclic GC is paused while timing, as timeit does: its
+    full collections rescan every live token and AST node and would
+    otherwise hide the compiler's own scaling.
+    """
+    print(f"{'lines':>8}{'lex ms':>10}{'parse ms':>10}{'compile ms':>12}{'total ms':>10}{'us/line':>10}{'scaling':>9}")
+    base = None
+    for size in sizes:
+        source = synthetic_source(size)
+        n = source.count("\n")
+        best = None
+        for _ in range(repeats):
+            gc.collect()
+            gc.disable()
+            try:
+                t0 = time.perf_counter()
+                tokens = Lexer(source).tokenize()
+                t1 = time.perf_counter()
+                program = Parser(tokens).parse()
+                t2 = time.perf_counter()
+                Compiler().compile(program)
+                t3 = time.perf_counter()
+            finally:
+                gc.enable()
+            del tokens, program
+            times = (t1 - t0, t2 - t1, t3 - t2)
+            if best is None or sum(times) < sum(best):
+                best = times
+        per_line = sum(best) / n * 1e6
+        if base is None:
+            base = per_line
+        lex, parse, comp = (t * 1000 for t in best)
+        print(f"{n:>8}{lex:>10.1f}{parse:>10.1f}{comp:>12.1f}{lex + parse + comp:>10.1f}{per_line:>10.1f}{per_line / base:>8.2f}x")
+
+def lex_throughput(lexer_class, source, seconds):
+    """Megabytes of UTF-8 source tokenized per second, with the cyclic GC paused as in bench_compile."""
+    size = len(source.encode("utf-8"))
+    count = 0
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        while True:
+            lexer_class(source).tokenize()
+            count += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= seconds:
+                return size * count / elapsed / 1e6
+    finally:
+        gc.enable()
+
+def bench_lex(paths, seconds):
+    from verify_lexer import ReferenceLexer
+    sources = []
+    for path in find_macros(paths):
+        with open(path, "r", encoding="utf-8") as f:
+            sources.append((os.path.relpath(path)[-40:], f.read()))
+    sources.append(("<synthetic 10000 lines>", synthetic_source(10000)))
+    # Many @meta blocks and long string literals
+    sources.append(("<synthetic 2000 @meta blocks>",
+                    "".join(f'@meta {{"key{i}": {i}}}\nlet s{i} = "{"x" * 200}"\n' for i in range(2000))))
+    print(f"{'source':<40}{'KB':>8}{'reference MB/s':>16}{'lexer MB/s':>12}{'speedup':>10}")
+    for name, source in sources:
+        try:
+            reference = lex_throughput(ReferenceLexer, source, seconds)
+            current = lex_throughput(Lexer, source, seconds)
+        except Exception as e:
+            print(f"{name:<40} lex error: {e}")
+            continue
+        print(f"{name:<40}{len(source.encode('utf-8')) / 1024:>8.1f}{reference:>16.2f}{current:>12.2f}{current / reference:>9.2f}x")
+
+def parse_time(parser_class, tokens, repeats):
+    """Best-of-`repeats` seconds to parse `tokens`, GC paused as in bench_compile."""
+    best = None
+    for _ in range(repeats):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            parser_class(tokens).parse()
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def bench_parse(sizes, repeats=3):
+    """Parse time of both parsers and the peak memory of parsing (tokens excluded), measured with tracemalloc."""
+    import tracemalloc
+    from verify_parser import ReferenceParser
+    print(f"{'lines':>8}{'reference ms':>14}{'parser ms':>11}{'speedup':>9}{'peak MB':>9}{'bytes/line':>12}")
+    for size in sizes:
+        source = synthetic_source(size)
+        n = source.count("\n")
+        tokens = Lexer(source).tokenize()
+        reference = parse_time(ReferenceParser, tokens, repeats)
+        current = parse_time(Parser, tokens, repeats)
+        tracemalloc.start()
+        program = Parser(tokens).parse()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del program
+        print(f"{n:>8}{reference * 1000:>14.1f}{current * 1000:>11.1f}{reference / current:>8.2f}x"
+              f"{peak / 1e6:>9.1f}{peak / n:>12.0f}")
+
+def bench_edit(lines=5000, repeats=200):
+    """Median and worst latency of IncrementalDocument updates, for single keystrokes and a diagnostics refresh."""
+    from compiler.incremental import IncrementalDocument
+    source = synthetic_source(lines)
+    start = time.perf_counter()
+    document = IncrementalDocument(source)
+    load = time.perf_counter() - start
+    start = time.perf_counter()
+    document.diagnostics()
+    parse = time.perf_counter() - start
+    print(f"{len(document.lines)} lines: load {load * 1000:.1f} ms, first diagnostics (parses everything) {parse * 1000:.1f} ms")
+
+    body = document.lines.index("    let x = a * 10 + b")
+    top = document.lines.index("let g20 = f20(20, 2)")
+    edits = [
+        ("type in a function body", lambda k: document.edit(body, 1, [document.lines[body] + " "])),
+        ("type at top level", lambda k: document.edit(top, 1, [f"let g20 = f20(20, {k})"])),
+        ("re-indent a line", lambda k: document.edit(body, 1, [(" " * (8 if k % 2 == 0 else 4)) + document.lines[body].strip()])),
+        ("insert and delete a line", lambda k: document.edit(body + 1, 0, ["    set x = x + 1"]) if k % 2 == 0 else document.edit(body + 1, 1, [])),
+        ("keystroke + diagnostics", lambda k: (document.edit(body, 1, [document.lines[body] + " "]), document.diagnostics())),
+    ]
+    print(f"{'edit':<28}{'median us':>12}{'max us':>10}")
+    for name, edit in edits:
+        times = []
+        for k in range(repeats):
+            start = time.perf_counter()
+            edit(k)
+            times.append(time.perf_counter() - start)
+        times.sort()
+        print(f"{name:<28}{times[len(times) // 2] * 1e6:>12.0f}{times[-1] * 1e6:>10.0f}")
+
+def best_time(action, repeats):
+    """Best-of-`repeats` seconds of `action()`, with the cyclic GC paused as in bench_compile."""
+    best = None
+    for _ in range(repeats):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            action()
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def bench_cache(sizes, repeats=5):
+    """
+    Size and load time of a compiled synthetic program: pickled as the
+    bytecode cache used to store it, and in the .tmlc format, where a lazy
+    load decodes only the main chunk and the function directory and the
+    full one every function body as well. `memory us` is a BytecodeCache
+    hit on a program still in memory, a macro started again.
+    """
+    import pickle
+    import shutil
+    import tempfile
+    from compiler import bytecode_format
+    from services.cache_manager import BytecodeCache
+    print(f"{'lines':>8}{'pickle KB':>11}{'tmlc KB':>9}{'pickle ms':>11}{'lazy ms':>9}{'full ms':>9}{'speedup':>9}"
+          f"{'memory us':>11}")
+    for size in sizes:
+        source = synthetic_source(size)
+        chunk, functions = compile_source(source)
+        pickled = pickle.dumps({'chunk': chunk, 'functions': functions})
+        fd, path = tempfile.mkstemp(suffix=".tmlc")
+        os.close(fd)
+        try:
+            bytecode_format.save(path, chunk, functions)
+            pickle_time = best_time(lambda: pickle.loads(pickled), repeats)
+            lazy_time = best_time(lambda: bytecode_format.load(path), repeats)
+            full_time = best_time(lambda: bytecode_format.load(path, lazy=False), repeats)
+            tmlc_size = os.path.getsize(path)
+        finally:
+            os.remove(path)
+        folder = tempfile.mkdtemp()
+        try:
+            cache = BytecodeCache(folder)
+            cache.set(source, chunk, functions)
+            memory_time = best_time(lambda: cache.get(source), repeats)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+        print(f"{source.count(chr(10)):>8}{len(pickled) / 1024:>11.0f}{tmlc_size / 1024:>9.0f}{pickle_time * 1000:>11.1f}"
+              f"{lazy_time * 1000:>9.1f}{full_time * 1000:>9.1f}{pickle_time / lazy_time:>8.1f}x{memory_time * 1e6:>11.0f}")
+
+def bench_shared(count=20, lines=5000):
+    """
+    Starts `count` VMs on one synthetic macro (top-level code calls every
+    function) and keeps them alive. `separate` loads the program from its
+    .tmlc file for every VM, as each runtime did before programs were
+    shared; `shared` takes every one from a BytecodeCache, so all VMs run
+    one program. Prints the start time per VM and the memory still held.
+    """
+    import shutil
+    import tempfile
+    import tracemalloc
+    from compiler import bytecode_format
+    from services.cache_manager import BytecodeCache
+    source = synthetic_source(lines)
+    folder = tempfile.mkdtemp()
+    try:
+        cache = BytecodeCache(folder)
+        path = cache._path(source, None)
+        bytecode_format.save(path, *compile_source(source))
+        loaders = (("separate", lambda: bytecode_format.load(path)),
+                   ("shared", lambda: cache.get(source)))
+        print(f"{'program':>10}{'runtimes':>10}{'start ms':>10}{'memory MB':>11}")
+        for name, load in loaders:
+            gc.collect()
+            tracemalloc.start()
+            start = time.perf_counter()
+            vms = []
+            for _ in range(count):
+                program = load()
+                vm = VM(make_globals(*program))
+                vm.run(*program)
+                vms.append((vm, program))
+            elapsed = time.perf_counter() - start
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            print(f"{name:>10}{count:>10}{elapsed * 1000 / count:>10.1f}{memory / 1024 / 1024:>11.1f}")
+            del vms, program, vm
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+def main():
+    args = sys.argv[1:]
+    seconds = 0.5
+    if "--seconds" in args:
+        i = args.index("--seconds")
+        seconds = float(args[i + 1])
+        del args[i:i + 2]
+
+    command = args[0] if args else "vm"
+    if command == "vm":
+        bench_vm(args[1:], seconds)
+    elif command == "opcodes":
+        bench_opcodes(args[1:], seconds)
+    elif command == "quicken":
+        bench_quicken(args[1:], seconds)
+    elif command == "lex":
+        bench_lex(args[1:], seconds)
+    elif command == "parse":
+        bench_parse([int(n) for n in args[1:]] or [1000, 10000, 50000])
+    elif command == "edit":
+        bench_edit(*[int(n) for n in args[1:2]])
+    elif command == "cache":
+        bench_cache([int(n) for n in args[1:]] or [1000, 10000, 50000])
+    elif command == "shared":
+        bench_shared(*[int(n) for n in args[1:3]])
+    elif command == "compile":
+        bench_compile([int(n) for n in args[1:]] or [1000, 10000, 50000])
+    else:
+        print(f"Unknown benchmark: {command}")
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,25 @@
+# Nodes are slotted: without a per-instance __dict__ a large program's AST
+# takes about a third less memory and field access is a fixed-offset load.
+# A pass can only set the fields a node declares.
+
 class ASTNode:
+    __slots__ = ("line", "column")
+
     def __init__(self, line=None, column=None):
         self.line = line
         self.column = column
 
 class Program(ASTNode):
+    __slots__ = ("statements", "metadata")
+
     def __init__(self, statements, metadata=None, line=None, column=None):
         super().__init__(line, column)
         self.statements = statements
         self.metadata = metadata or {}
 
 class FunctionDef(ASTNode):
+    __slots__ = ("name", "params", "defaults", "body", "kwargs_param")
+
     def __init__(self, name, params, defaults, body, kwargs_param=None, line=None, column=None):
         super().__init__(line, column)
         self.name = name
@@ -19,18 +29,24 @@ class FunctionDef(ASTNode):
         self.kwargs_param = kwargs_param # Name of the **kwargs parameter
 
 class VarDecl(ASTNode):
+    __slots__ = ("name", "expression")
+
     def __init__(self, name, expression, line=None, column=None):
         super().__init__(line, column)
         self.name = name
         self.expression = expression
 
 class VarAssign(ASTNode):
+    __slots__ = ("target", "expression")
+
     def __init__(self, target, expression, line=None, column=None):
         super().__init__(line, column)
         self.target = target # Can be a VariableExpr or a GetExpr
         self.expression = expression
 
 class IfStmt(ASTNode):
+    __slots__ = ("condition", "then_branch", "elif_branches", "else_branch")
+
     def __init__(self, condition, then_branch, elif_branches=None, else_branch=None, line=None, column=None):
         super().__init__(line, column)
         self.condition = condition
@@ -39,12 +55,16 @@ class IfStmt(ASTNode):
         self.else_branch = else_branch
 
 class WhileStmt(ASTNode):
+    __slots__ = ("condition", "body")
+
     def __init__(self, condition, body, line=None, column=None):
         super().__init__(line, column)
         self.condition = condition
         self.body = body
 
 class ForStmt(ASTNode):
+    __slots__ = ("item_name", "iterable", "body")
+
     def __init__(self, item_name, iterable, body, line=None, column=None):
         super().__init__(line, column)
         self.item_name = item_name
@@ -52,24 +72,34 @@ class ForStmt(ASTNode):
         self.body = body
 
 class ReturnStmt(ASTNode):
+    __slots__ = ("expression",)
+
     def __init__(self, expression, line=None, column=None):
         super().__init__(line, column)
         self.expression = expression
 
 class BreakStmt(ASTNode):
+    __slots__ = ()
+
     def __init__(self, line=None, column=None):
         super().__init__(line, column)
 
 class ContinueStmt(ASTNode):
+    __slots__ = ()
+
     def __init__(self, line=None, column=None):
         super().__init__(line, column)
 
 class ExprStmt(ASTNode):
+    __slots__ = ("expression",)
+
     def __init__(self, expression, line=None, column=None):
         super().__init__(line, column)
         self.expression = expression
 
 class BinaryExpr(ASTNode):
+    __slots__ = ("left", "operator", "right")
+
     def __init__(self, left, operator, right, line=None, column=None):
         super().__init__(line, column)
         self.left = left
@@ -77,33 +107,45 @@ class BinaryExpr(ASTNode):
         self.right = right
 
 class UnaryExpr(ASTNode):
+    __slots__ = ("operator", "right")
+
     def __init__(self, operator, right, line=None, column=None):
         super().__init__(line, column)
         self.operator = operator
         self.right = right
 
 class LiteralExpr(ASTNode):
+    __slots__ = ("value",)
+
     def __init__(self, value, line=None, column=None):
         super().__init__(line, column)
         self.value = value
 
 class ListExpr(ASTNode):
+    __slots__ = ("elements",)
+
     def __init__(self, elements, line=None, column=None):
         super().__init__(line, column)
         self.elements = elements
 
 class DictExpr(ASTNode):
+    __slots__ = ("keys", "values")
+
     def __init__(self, keys, values, line=None, column=None):
         super().__init__(line, column)
         self.keys = keys
         self.values = values
 
 class VariableExpr(ASTNode):
+    __slots__ = ("name",)
+
     def __init__(self, name, line=None, column=None):
         super().__init__(line, column)
         self.name = name
 
 class CallExpr(ASTNode):
+    __slots__ = ("callee", "arguments", "keyword_arguments")
+
     def __init__(self, callee, arguments, keyword_arguments=None, line=None, column=None):
         super().__init__(line, column)
         self.callee = callee # Can be a VariableExpr or a dot access
@@ -111,17 +153,23 @@ class CallExpr(ASTNode):
         self.keyword_arguments = keyword_arguments or {} # Dictionary: name -> expression
 
 class GetExpr(ASTNode):
+    __slots__ = ("object", "name")
+
     def __init__(self, object, name, line=None, column=None):
         super().__init__(line, column)
         self.object = object
         self.name = name
 
 class IndexExpr(ASTNode):
+    __slots__ = ("object", "index")
+
     def __init__(self, object, index, line=None, column=None):
         super().__init__(line, column)
         self.object = object
         self.index = index
 
 class YieldStmt(ASTNode):
+    __slots__ = ()
+
     def __init__(self, line=None, column=None):
         super().__init__(line, column)
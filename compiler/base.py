@@ -1,55 +1,159 @@
-from .opcodes import OpCode
+import math
+from .opcodes import OpCode, jump_target, with_jump_target
 from . import ast_nodes as ast
 
+def _constant_key(value):
+    # Typed, so that 1, 1.0 and True stay separate constants; -0.0 prints differently from 0.0
+    if type(value) is float and value == 0.0:
+        return (float, value, math.copysign(1.0, value))
+    return (type(value), value)
+
 class Chunk:
     def __init__(self):
         self.code = []
         self.constants = []
         self.lines = []
         self.metadata = {}
-        
+        self.local_names = [] # frame slots of top-level code compiled with toplevel_locals
+        self._constant_index = {} # _constant_key(value) -> index in constants
+
+    def __getstate__(self):
+        # The interning index is rebuilt on demand instead of being pickled
+        state = self.__dict__.copy()
+        state.pop("_constant_index", None)
+        return state
+
     def emit(self, opcode, arg=None, line=None):
         self.code.append((opcode, arg))
         self.lines.append(line)
         return len(self.code) - 1
 
     def add_constant(self, value):
-        for i, const in enumerate(self.constants):
-            if const == value:
-                return i
-        self.constants.append(value)
-        return len(self.constants) - 1
+        """Index of `value` in the constant pool; equal constants of the same type share one entry."""
+        index = self.__dict__.get("_constant_index")
+        if index is None:
+            index = self._constant_index = {}
+            for i, const in enumerate(self.constants):
+                try:
+                    index.setdefault(_constant_key(const), i)
+                except TypeError:
+                    pass
+        try:
+            key = _constant_key(value)
+            idx = index.get(key)
+        except TypeError:
+            # Unhashable constants are not interned
+            self.constants.append(value)
+            return len(self.constants) - 1
+        if idx is None:
+            idx = index[key] = len(self.constants)
+            self.constants.append(value)
+        return idx
+
+    def copy(self, line_offset=0):
+        """An independent copy, its line numbers moved by `line_offset` (code that moved in the source)."""
+        chunk = Chunk()
+        chunk.code = list(self.code)
+        chunk.constants = list(self.constants)
+        chunk.lines = [line + line_offset if line else line for line in self.lines]
+        chunk.metadata = {key: dict(value) if isinstance(value, dict) else value for key, value in self.metadata.items()}
+        chunk.local_names = list(self.local_names)
+        return chunk
 
     def patch_jump(self, offset):
         if offset is None:
             return
-        self.code[offset] = (self.code[offset][0], len(self.code))
+        op, arg = self.code[offset]
+        self.code[offset] = (op, with_jump_target(op, arg, len(self.code)))
+
+def rebuild_chunk(chunk, keep, replacements=None):
+    """
+    Rewrites chunk.code without the instructions where keep[i] is False,
+    substituting replacements[i] for the kept ones that have an entry.
+    Jump targets are remapped: a jump to a removed instruction lands on the
+    next kept one. chunk.lines stays aligned with the code.
+    """
+    code = chunk.code
+    new_indices = [0] * (len(code) + 1)
+    current_new = 0
+    for idx in range(len(code)):
+        new_indices[idx] = current_new
+        if keep[idx]:
+            current_new += 1
+    new_indices[len(code)] = current_new
+
+    rebuilt = []
+    rebuilt_lines = []
+    for idx, (op, arg) in enumerate(code):
+        if not keep[idx]:
+            continue
+        if replacements and idx in replacements:
+            op, arg = replacements[idx]
+        target = jump_target(op, arg)
+        if target is not None and 0 <= target < len(new_indices):
+            arg = with_jump_target(op, arg, new_indices[target])
+        rebuilt.append((op, arg))
+        rebuilt_lines.append(chunk.lines[idx])
+    chunk.code = rebuilt
+    chunk.lines = rebuilt_lines
+
+class LocalTable:
+    """
+    Frame slots of one function (or of top-level code with toplevel_locals):
+    `names` in slot order plus a name -> slot dict, so lookups stay O(1)
+    in functions with many locals. TML scopes are whole functions, so one
+    table per compiled function is the whole scope chain.
+    """
+    def __init__(self, names=()):
+        self.names = []
+        self.slots = {}
+        for name in names:
+            self.declare(name)
+
+    def __contains__(self, name):
+        return name in self.slots
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def get(self, name):
+        """Slot of `name`, or None if it is not a local."""
+        return self.slots.get(name)
+
+    def declare(self, name):
+        """Slot of `name`, allocating the next one if it is new."""
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = self.slots[name] = len(self.names)
+            self.names.append(name)
+        return slot
 
 class LocalScanner:
     def __init__(self):
-        self.locals = []
+        self.table = LocalTable()
+
+    @property
+    def locals(self):
+        return self.table.names
 
     def visit(self, node):
         if isinstance(node, ast.FunctionDef):
             for p in node.params:
-                name = p if isinstance(p, str) else p.value
-                if name not in self.locals:
-                    self.locals.append(name)
+                self.table.declare(p if isinstance(p, str) else p.value)
             
             if node.kwargs_param:
-                name = node.kwargs_param if isinstance(node.kwargs_param, str) else node.kwargs_param.value
-                if name not in self.locals:
-                    self.locals.append(name)
+                self.table.declare(node.kwargs_param if isinstance(node.kwargs_param, str) else node.kwargs_param.value)
             
             for s in node.body:
                 if not isinstance(s, ast.FunctionDef):
                     self.visit(s)
         elif isinstance(node, ast.VarDecl):
-            if node.name not in self.locals:
-                self.locals.append(node.name)
+            self.table.declare(node.name)
         elif isinstance(node, ast.ForStmt):
-            if node.item_name not in self.locals:
-                self.locals.append(node.item_name)
+            self.table.declare(node.item_name)
             for s in node.body:
                 self.visit(s)
         elif isinstance(node, ast.IfStmt):
@@ -65,6 +169,75 @@ class LocalScanner:
             for s in node.body:
                 self.visit(s)
 
+# Marks a parameter without a default in CallingConvention.defaults
+REQUIRED = object()
+
+class CallingConvention:
+    """
+    Precomputed argument binding of a FunctionObject.
+
+    param_slots maps parameter names to frame slots, defaults holds one value
+    (or REQUIRED) per parameter and kwargs_slot is the slot of **kwargs.
+    fills[n] is what has to be pushed after n positional arguments to
+    complete the frame (the remaining defaults and None for the other
+    locals), or None when n positionals alone cannot bind the call.
+    """
+    def __init__(self, func):
+        params = func.local_names[:func.arity]
+        self.name = func.name
+        self.arity = func.arity
+        self.locals_count = func.locals_count
+        self.param_names = params
+        self.param_slots = {name: i for i, name in enumerate(params)}
+        self.defaults = [func.defaults.get(name, REQUIRED) for name in params]
+        self.kwargs_slot = func.local_names.index(func.kwargs_param) if func.kwargs_param else None
+
+        padding = [None] * (func.locals_count - func.arity)
+        self.fills = []
+        for n in range(func.arity + 1):
+            tail = self.defaults[n:]
+            if self.kwargs_slot is not None or any(d is REQUIRED for d in tail):
+                self.fills.append(None)
+            else:
+                self.fills.append(tail + padding)
+
+    def bind(self, pos_args, kwargs):
+        """Maps call arguments onto the frame slots. Extra positionals are ignored."""
+        call_args = list(pos_args[:self.arity])
+        call_args.extend(self.defaults[len(call_args):])
+        call_args.extend([None] * (self.locals_count - self.arity))
+
+        extra_kwargs = {}
+        for name, val in kwargs.items():
+            slot = self.param_slots.get(name)
+            if slot is not None:
+                call_args[slot] = val
+            elif self.kwargs_slot is not None:
+                extra_kwargs[name] = val
+            else:
+                raise TypeError(f"Function {self.name} got unexpected keyword argument '{name}'")
+
+        for i in range(self.arity):
+            if call_args[i] is REQUIRED:
+                raise TypeError(f"Function {self.name} missing required argument: '{self.param_names[i]}'")
+
+        if self.kwargs_slot is not None:
+            call_args[self.kwargs_slot] = extra_kwargs
+        return call_args
+
+    def bind_loose(self, pos_args):
+        """
+        Binds arguments passed by the host (on_tick(delta), on_hotkey(key)).
+        Extra arguments are dropped and missing ones fall back to their
+        default or None, so a handler may declare fewer parameters.
+        """
+        call_args = list(pos_args[:self.arity])
+        call_args.extend(None if d is REQUIRED else d for d in self.defaults[len(call_args):])
+        call_args.extend([None] * (self.locals_count - self.arity))
+        if self.kwargs_slot is not None:
+            call_args[self.kwargs_slot] = {}
+        return call_args
+
 class FunctionObject:
     def __init__(self, name, arity, defaults=None, kwargs_param=None, local_names=None):
         self.name = name
@@ -74,6 +247,34 @@ class FunctionObject:
         self.chunk = Chunk()
         self.locals_count = 0
         self.local_names = local_names or []
+        self.convention = None
+        self.native_source = None # Python backend: factory source from compiler/pygen.py
+        self.native_lines = None  # Python backend: TML line of every generated line
+        self.content_key = None   # compiler/function_cache.py: equal keys mean identical compiled code and lines
+
+    def calling_convention(self):
+        """Returns the CallingConvention, building it on first use (also for functions loaded from the cache)."""
+        convention = self.__dict__.get("convention")
+        if convention is None:
+            convention = self.convention = CallingConvention(self)
+        return convention
+
+    def copy(self, line_offset=0):
+        """An independent copy (chunk and local names included), its line numbers moved by `line_offset`."""
+        func = FunctionObject(self.name, self.arity, dict(self.defaults), self.kwargs_param, list(self.local_names))
+        func.chunk = self.chunk.copy(line_offset)
+        func.locals_count = self.locals_count
+        func.native_source = self.native_source
+        if self.native_lines is not None:
+            func.native_lines = [line + line_offset if line else line for line in self.native_lines]
+        func.content_key = getattr(self, "content_key", None)
+        return func
+
+    def __getstate__(self):
+        # The convention holds identity sentinels, so it is rebuilt after unpickling instead
+        state = self.__dict__.copy()
+        state.pop("convention", None)
+        return state
     
     def __repr__(self):
         return f"<function {self.name}>"
@@ -0,0 +1,316 @@
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from itertools import chain, repeat
+from .base import Chunk, FunctionObject
+from .opcodes import OpCode
+
+# Compiled program file (.tmlc), used by the bytecode cache
+# (services/cache_manager.py). Layout:
+#   header     magic, format version, byte order, compiler version and
+#              opcode table version (digests), offset and size of the directory
+#   bodies     the main chunk, then one blob per function
+#   directory  marshal data: the main chunk's blob, per function its
+#              signature (name, arity, defaults, ...) and blob, and the info
+#              dict of the writer (e.g. the source hash of a bundle,
+#              services/bundles.py), or None
+# A blob is marshal data of the flattened chunk:
+#   - code as two flat arrays, one opcode byte (index in the opcode table)
+#     and one 32-bit argument per instruction. Arguments index a table of
+#     `base` small integers (argument i below `base` is i itself), then
+#     None, then the extended arguments (tuples, large or negative numbers,
+#     the keyword names of CALL_KW), so decoding is a lookup per instruction;
+#   - the constants, metadata and local names as plain marshal values;
+#   - the line table run-length encoded as arrays of lines and run lengths;
+#   - for functions, the Python backend source and its line table.
+#
+# A file is read through mmap and only its header and directory are decoded:
+# every function comes back as a StoredFunction whose chunk and Python
+# source are decoded on first use. A file written by another compiler or
+# with another opcode table raises StaleFile rather than loading.
+
+MAGIC = b"TMLC"
+FORMAT_VERSION = 2
+
+HEADER = struct.Struct("<4sHB16s16sQQ")
+
+_NO_LINE = -1
+_MAX_PLAIN_ARG = 1 << 20 # larger numbers go to the extended arguments, which keeps the lookup table small
+
+_OPCODES = list(OpCode)
+_OPCODE_INDEX = {op: i for i, op in enumerate(_OPCODES)}
+_BYTE_ORDER = 0 if sys.byteorder == "little" else 1
+
+_compiler_version = None
+
+class FormatError(ValueError):
+    """A file that is not a compiled program or is damaged."""
+
+class StaleFile(FormatError):
+    """A compiled program from another format, compiler or opcode table version."""
+
+# Sources that produce or interpret stored code, relative to the project root:
+# the compiler, and the VM that runs chunks and the Python backend's source
+_VERSIONED_FOLDERS = ("compiler", os.path.join("runtime", "vm"))
+
+def compiler_version():
+    """
+    Digest of the compiler's and the VM's source files: any change to either
+    gives a new version. Line endings are normalised, so CRLF and LF
+    checkouts of the same revision share their compiled programs.
+    """
+    global _compiler_version
+    if _compiler_version is None:
+        digest = hashlib.blake2b(digest_size=16)
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for folder in _VERSIONED_FOLDERS:
+            path = os.path.join(root, folder)
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".py"):
+                    with open(os.path.join(path, name), "rb") as f:
+                        text = f.read().replace(b"\r\n", b"\n")
+                    digest.update(f"{folder}/{name}".replace(os.sep, "/").encode("utf-8") + b"\0" + text)
+        _compiler_version = digest.digest()
+    return _compiler_version
+
+def opcode_table_version():
+    return hashlib.blake2b(",".join(op.name for op in _OPCODES).encode("ascii"), digest_size=16).digest()
+
+# Encoding
+
+def _encode_lines(lines):
+    values, counts = array("i"), array("i")
+    for line in lines:
+        line = _NO_LINE if line is None else line
+        if counts and values[-1] == line:
+            counts[-1] += 1
+        else:
+            values.append(line)
+            counts.append(1)
+    return values.tobytes(), counts.tobytes()
+
+def _encode_chunk(chunk, native_source=None, native_lines=None):
+    ops = bytes(_OPCODE_INDEX[op] for op, _ in chunk.code)
+    plain = [arg for _, arg in chunk.code if type(arg) is int and 0 <= arg < _MAX_PLAIN_ARG]
+    base = max(plain) + 1 if plain else 0
+    args = array("i")
+    extended = []
+    operators = [] # (extended index, position) of the opcodes inside tuple arguments
+    for _, arg in chunk.code:
+        if type(arg) is int and 0 <= arg < base:
+            args.append(arg)
+        elif arg is None:
+            args.append(base)
+        else:
+            if isinstance(arg, tuple) and any(isinstance(item, OpCode) for item in arg):
+                # Fused instructions carry their operator (BINARY_CONST, COMPARE_JUMP_IF_FALSE, ...)
+                operators.extend((len(extended), i) for i, item in enumerate(arg) if isinstance(item, OpCode))
+                arg = tuple(_OPCODE_INDEX[item] if isinstance(item, OpCode) else item for item in arg)
+            args.append(base + 1 + len(extended))
+            extended.append(arg)
+    lines = _encode_lines(native_lines) if native_lines is not None else None
+    try:
+        return marshal.dumps((ops, args.tobytes(), base, extended, operators, chunk.constants,
+                              _encode_lines(chunk.lines), chunk.metadata, list(chunk.local_names),
+                              native_source, lines))
+    except ValueError as e:
+        raise FormatError(f"cannot store chunk: {e}") from None
+
+def dumps(chunk, functions, info=None):
+    """
+    The compiled program `chunk` with its `functions` (name -> FunctionObject)
+    as bytes. `info` is a dict of plain values stored alongside (see read_info).
+    """
+    blobs = [_encode_chunk(chunk)]
+    entries = []
+    offset = HEADER.size + len(blobs[0])
+    for func in functions.values():
+        blob = _encode_chunk(func.chunk, func.native_source, func.native_lines)
+        entries.append((func.name, func.arity, func.defaults, func.kwargs_param, func.locals_count,
+                        list(func.local_names), getattr(func, "content_key", None), offset, len(blob)))
+        blobs.append(blob)
+        offset += len(blob)
+    try:
+        directory = marshal.dumps(((HEADER.size, len(blobs[0])), entries, info))
+    except ValueError as e:
+        raise FormatError(f"cannot store function signatures or info: {e}") from None
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, _BYTE_ORDER, compiler_version(), opcode_table_version(),
+                         offset, len(directory))
+    return b"".join([header] + blobs + [directory])
+
+# Decoding
+
+def _decode_lines(encoded):
+    values, counts = array("i"), array("i")
+    values.frombytes(encoded[0])
+    counts.frombytes(encoded[1])
+    values = [None if line == _NO_LINE else line for line in values]
+    return list(chain.from_iterable(map(repeat, values, counts)))
+
+def _decode_chunk(data):
+    """(Chunk, native_source, native_lines) of a blob."""
+    (op_bytes, arg_bytes, base, extended, operators, constants, lines, metadata, local_names,
+     native_source, native_lines) = marshal.loads(data)
+    for index, position in operators:
+        arg = extended[index]
+        extended[index] = arg[:position] + (_OPCODES[arg[position]],) + arg[position + 1:]
+    table = list(range(base))
+    table.append(None)
+    table += extended
+    args = array("i")
+    args.frombytes(arg_bytes)
+    chunk = Chunk()
+    chunk.code = list(zip(map(_OPCODES.__getitem__, op_bytes), map(table.__getitem__, args)))
+    chunk.constants = constants
+    chunk.lines = _decode_lines(lines)
+    chunk.metadata = metadata
+    chunk.local_names = local_names
+    return chunk, native_source, _decode_lines(native_lines) if native_lines is not None else None
+
+class StoredFunction(FunctionObject):
+    """
+    A FunctionObject of a compiled program file. Its chunk, native_source
+    and native_lines are decoded from the file the first time one of them
+    is used; until then the function holds only its signature.
+    """
+    _LAZY = frozenset(("chunk", "native_source", "native_lines"))
+
+    def __init__(self, name, arity, defaults, kwargs_param, local_names, source, offset, length):
+        # FunctionObject.__init__ minus the lazy attributes (and the empty chunk it would build)
+        self.name = name
+        self.arity = arity
+        self.defaults = defaults
+        self.kwargs_param = kwargs_param
+        self.locals_count = 0
+        self.local_names = local_names
+        self.convention = None
+        self.content_key = None
+        self._source = source # LoadedFile
+        self._blob = (offset, length)
+
+    def __getattr__(self, name):
+        # Only called for attributes not set yet, so a decoded function costs nothing extra
+        source = self.__dict__.get("_source")
+        if name not in StoredFunction._LAZY or source is None:
+            raise AttributeError(name)
+        # Programs are shared between runtimes (services/cache_manager.py), so two threads may get here at once
+        with source.lock:
+            if "_blob" in self.__dict__:
+                self.chunk, self.native_source, self.native_lines = _decode_chunk(source.read(*self._blob))
+                del self._blob
+                source.release()
+        return self.__dict__[name]
+
+    def load(self):
+        """Decodes the body now."""
+        self.chunk
+        return self
+
+    def __getstate__(self):
+        self.load()
+        return FunctionObject.__getstate__(self)
+
+class LoadedFile:
+    """The bytes of a compiled program; closes its mmap once every function body was decoded."""
+
+    def __init__(self, data, pending, closer=None):
+        self.data = data
+        self.pending = pending
+        self.closer = closer
+        self.lock = threading.Lock()
+
+    def read(self, offset, length):
+        return self.data[offset:offset + length]
+
+    def release(self):
+        self.pending -= 1
+        if self.pending <= 0:
+            self.close()
+
+    def close(self):
+        if self.closer is not None:
+            self.closer()
+            self.closer = None
+        self.data = None
+
+def check_header(data):
+    """Unpacks and validates the header; returns (directory offset, directory size)."""
+    if len(data) < HEADER.size:
+        raise FormatError("file too short")
+    magic, version, byte_order, compiler, opcodes, offset, size = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise FormatError("not a compiled TML program")
+    if version != FORMAT_VERSION or byte_order != _BYTE_ORDER:
+        raise StaleFile(f"format version {version}, expected {FORMAT_VERSION}")
+    if compiler != compiler_version():
+        raise StaleFile("compiled by another compiler version")
+    if opcodes != opcode_table_version():
+        raise StaleFile("compiled for another opcode table")
+    if offset + size > len(data):
+        raise FormatError("truncated file")
+    return offset, size
+
+def _read_directory(data):
+    offset, size = check_header(data)
+    try:
+        (main_offset, main_length), entries, info = marshal.loads(data[offset:offset + size])
+    except (EOFError, ValueError, TypeError) as e:
+        raise FormatError(f"damaged directory: {e}") from None
+    return main_offset, main_length, entries, info
+
+def loads(data, lazy=True, closer=None):
+    """
+    (chunk, functions) of a compiled program in `data` (bytes or mmap). With
+    `lazy`, function bodies are decoded on first use; `closer` is called
+    once none is left to decode (the mmap is no longer needed).
+    """
+    main_offset, main_length, entries, _ = _read_directory(data)
+    source = LoadedFile(data, len(entries), closer)
+    chunk = _decode_chunk(data[main_offset:main_offset + main_length])[0]
+    functions = {}
+    for name, arity, defaults, kwargs_param, locals_count, local_names, key, body_offset, length in entries:
+        func = StoredFunction(name, arity, defaults, kwargs_param, local_names, source, body_offset, length)
+        func.locals_count = locals_count
+        func.content_key = key
+        functions[name] = func
+    if not lazy or not entries:
+        for func in functions.values():
+            func.load()
+        source.close()
+    return chunk, functions
+
+def load(path, lazy=True):
+    """(chunk, functions) of the compiled program file at `path`, mapped into memory rather than read."""
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return loads(data, lazy, data.close)
+    except Exception:
+        data.close()
+        raise
+
+def read_info(path):
+    """The info dict the file at `path` was saved with (None if none), without decoding any code."""
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return _read_directory(data)[3]
+    finally:
+        data.close()
+
+def save(path, chunk, functions, info=None):
+    """
+    Writes the program to `path`, through a temporary file so readers never
+    see a partial one. Returns the size of the file.
+    """
+    data = dumps(chunk, functions, info)
+    temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp, "wb") as f:
+        f.write(data)
+    os.replace(temp, path)
+    return len(data)
@@ -0,0 +1,262 @@
+from .opcodes import OpCode, UNCONDITIONAL_JUMP_OPS, jump_target, stack_effect
+
+# Control-flow graph and dataflow analyses over the code of one chunk, shared
+# by the optimizer passes (compiler/passes.py), the bytecode verifier and
+# visualizer.py. Building the graph, liveness and stack depths are linear in
+# the code size; the dominator fixpoint converges in two or three sweeps on
+# the reducible graphs the compiler emits.
+
+# Instructions after which execution never continues with the next one
+TERMINATORS = UNCONDITIONAL_JUMP_OPS | {OpCode.RETURN, OpCode.RETURN_NONE}
+
+class BasicBlock:
+    """
+    Instructions start..end-1 of the code. `successors` lists block indices,
+    the jump target first; a jump to the end of the code (frame exit) has
+    no successor block.
+    """
+    __slots__ = ("index", "start", "end", "successors", "predecessors")
+
+    def __init__(self, index, start, end):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.successors = []
+        self.predecessors = []
+
+    @property
+    def last(self):
+        return self.end - 1
+
+class ControlFlowGraph:
+    def __init__(self, code):
+        self.code = code
+        self.blocks = []
+        self.block_of = [0] * len(code) # instruction index -> block index
+        self._rpo = None
+        self._idom = None
+        if code:
+            self._build()
+
+    def _build(self):
+        code = self.code
+        n = len(code)
+        leader = [False] * (n + 1)
+        leader[0] = True
+        for i, (op, arg) in enumerate(code):
+            target = jump_target(op, arg)
+            if target is not None:
+                if 0 <= target <= n:
+                    leader[target] = True
+                leader[i + 1] = True
+            elif op in TERMINATORS:
+                leader[i + 1] = True
+
+        start = 0
+        for i in range(1, n + 1):
+            if leader[i] or i == n:
+                block = BasicBlock(len(self.blocks), start, i)
+                self.blocks.append(block)
+                for j in range(start, i):
+                    self.block_of[j] = block.index
+                start = i
+
+        for block in self.blocks:
+            op, arg = code[block.last]
+            target = jump_target(op, arg)
+            successors = []
+            if target is not None and 0 <= target < n:
+                successors.append(self.block_of[target])
+            if op not in TERMINATORS and block.end < n:
+                following = self.block_of[block.end]
+                if following not in successors:
+                    successors.append(following)
+            block.successors = successors
+            for succ in successors:
+                self.blocks[succ].predecessors.append(block.index)
+
+    def reverse_postorder(self):
+        """Block indices reachable from the entry, in reverse postorder."""
+        if self._rpo is None:
+            order = []
+            if self.blocks:
+                visited = [False] * len(self.blocks)
+                visited[0] = True
+                stack = [(0, iter(self.blocks[0].successors))]
+                while stack:
+                    index, successors = stack[-1]
+                    for succ in successors:
+                        if not visited[succ]:
+                            visited[succ] = True
+                            stack.append((succ, iter(self.blocks[succ].successors)))
+                            break
+                    else:
+                        stack.pop()
+                        order.append(index)
+            order.reverse()
+            self._rpo = order
+        return self._rpo
+
+    def reachable(self):
+        """Set of the block indices reachable from the entry."""
+        return set(self.reverse_postorder())
+
+    def dominators(self):
+        """
+        Immediate dominator of every block (Cooper, Harvey & Kennedy), the
+        entry being its own; None for unreachable blocks.
+        """
+        if self._idom is None:
+            rpo = self.reverse_postorder()
+            position = {block: i for i, block in enumerate(rpo)}
+            idom = [None] * len(self.blocks)
+            if rpo:
+                idom[0] = 0
+
+            def intersect(a, b):
+                while a != b:
+                    while position[a] > position[b]:
+                        a = idom[a]
+                    while position[b] > position[a]:
+                        b = idom[b]
+                return a
+
+            changed = True
+            while changed:
+                changed = False
+                for index in rpo[1:]:
+                    new_idom = None
+                    for pred in self.blocks[index].predecessors:
+                        if idom[pred] is None:
+                            continue
+                        new_idom = pred if new_idom is None else intersect(pred, new_idom)
+                    if idom[index] != new_idom:
+                        idom[index] = new_idom
+                        changed = True
+            self._idom = idom
+        return self._idom
+
+    def dominates(self, a, b):
+        """True if every path from the entry to block b passes through block a."""
+        idom = self.dominators()
+        if idom[b] is None:
+            return False
+        while b != a:
+            if b == 0:
+                return False
+            b = idom[b]
+        return True
+
+    def loops(self):
+        """
+        Natural loops as {header block: set of body blocks}. A back edge is
+        an edge to a block that dominates its source; loops sharing a header
+        are merged.
+        """
+        loops = {}
+        for index in self.reverse_postorder():
+            for succ in self.blocks[index].successors:
+                if not self.dominates(succ, index):
+                    continue
+                body = loops.setdefault(succ, {succ})
+                pending = [index]
+                while pending:
+                    member = pending.pop()
+                    if member in body:
+                        continue
+                    body.add(member)
+                    pending.extend(self.blocks[member].predecessors)
+        return loops
+
+# Dataflow
+
+def local_effects(op, arg):
+    """
+    (read slots, overwritten slots) of an instruction. FOR_RANGE only writes
+    its slot when the loop continues, so it overwrites nothing for sure.
+    """
+    if op == OpCode.GET_LOCAL:
+        return (arg,), ()
+    if op in (OpCode.SET_LOCAL, OpCode.SET_LOCAL_POP):
+        return (), (arg,)
+    if op == OpCode.BINARY_LOCALS:
+        return (arg[1], arg[2]), ()
+    return (), ()
+
+def liveness(cfg):
+    """
+    Live local slots at the entry and exit of every block, as bit sets
+    (bit n = slot n): a slot is live if some path reads it before
+    overwriting it.
+    """
+    code = cfg.code
+    blocks = cfg.blocks
+    gen = [0] * len(blocks)
+    kill = [0] * len(blocks)
+    for block in blocks:
+        g = k = 0
+        for i in range(block.last, block.start - 1, -1):
+            uses, defs = local_effects(*code[i])
+            for slot in defs:
+                bit = 1 << slot
+                k |= bit
+                g &= ~bit
+            for slot in uses:
+                g |= 1 << slot
+        gen[block.index] = g
+        kill[block.index] = k
+
+    live_in = [0] * len(blocks)
+    live_out = [0] * len(blocks)
+    postorder = cfg.reverse_postorder()[::-1]
+    changed = True
+    while changed:
+        changed = False
+        for index in postorder:
+            out = 0
+            for succ in blocks[index].successors:
+                out |= live_in[succ]
+            new_in = gen[index] | (out & ~kill[index])
+            if out != live_out[index] or new_in != live_in[index]:
+                live_out[index] = out
+                live_in[index] = new_in
+                changed = True
+    return live_in, live_out
+
+def stack_depths(code):
+    """
+    Operand stack depth before every instruction (None where unreachable),
+    counted from the frame's first operand. Raises ValueError if the depth
+    goes negative, differs between two paths into an instruction, or a
+    RETURN finds nothing to return.
+    """
+    n = len(code)
+    depths = [None] * n
+    if not code:
+        return depths
+    depths[0] = 0
+    pending = [0]
+
+    def merge(index, depth, origin):
+        if depth < 0:
+            raise ValueError(f"stack underflow after {code[origin][0].name} at {origin}")
+        if index >= n:
+            return
+        if depths[index] is None:
+            depths[index] = depth
+            pending.append(index)
+        elif depths[index] != depth:
+            raise ValueError(f"stack depth at {index} is {depths[index]} or {depth} (via {origin})")
+
+    while pending:
+        i = pending.pop()
+        op, arg = code[i]
+        depth = depths[i]
+        if op == OpCode.RETURN and depth < 1:
+            raise ValueError(f"RETURN at {i} with an empty stack")
+        target = jump_target(op, arg)
+        if target is not None:
+            merge(target, depth + stack_effect(op, arg, jump=True), i)
+        if op not in TERMINATORS:
+            merge(i + 1, depth + stack_effect(op, arg), i)
+    return depths
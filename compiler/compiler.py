@@ -1,13 +1,36 @@
 from .opcodes import OpCode
 from . import ast_nodes as ast
 from .lexer import TokenType
-from .base import Chunk, LocalScanner, FunctionObject
+from .base import Chunk, LocalScanner, LocalTable, FunctionObject
+from .passes import PassManager, DEFAULT_OPT
+from .pygen import generate_python, UnsupportedConstruct
+from .folding import fold_constants
+from .inliner import Inliner
+from .escape import top_level_locals, entry_point_names
+from .function_cache import function_key, content_key
 
 class Compiler:
-    def __init__(self):
+    # "tiered" generates Python code for every function but the VM only
+    # compiles it once the function gets hot; "py" compiles all of it up front.
+    BACKENDS = ("bytecode", "tiered", "py")
+
+    def __init__(self, superinstructions=True, backend=None, opt=None, builtins=None, toplevel_locals=None,
+                 function_cache=None):
+        self.superinstructions = superinstructions
+        self.builtins = builtins # host global names, which user functions cannot shadow (see compiler/inliner.py)
+        self.backend = backend # None = @meta "backend" of the program, default "tiered"
+        self.opt = opt # None = @meta "opt" of the program, default 2 (see compiler/passes.py)
+        self.toplevel_locals = toplevel_locals # None = @meta "toplevel_locals", default off (see compiler/escape.py)
+        self.folding = None # ConstantFolder of the last compile, for its statistics
+        self.inliner = None # Inliner of the last compile (opt level 2)
+        self.native_fallbacks = {} # function name -> why it stays on the interpreter (tiered/py backends)
+        self.function_cache = function_cache # FunctionCache reusing unchanged functions (compiler/function_cache.py)
+        self.function_keys = {} # function name -> (content key, line) of the cacheable functions
         self.chunk = Chunk()
         self.functions = {}
-        self.locals = [] 
+        self.function_call_sites = {} # function name -> its call_sites, for the inliner
+        self.call_sites = [] # (GET_GLOBAL index, CALL index, name, argc) of plain calls in this chunk
+        self.locals = LocalTable() # frame slots; at top level only with toplevel_locals
         self.scope_depth = 0
         self.current_line = 0
         self.loop_start_stack = []
@@ -15,124 +38,108 @@ class Compiler:
 
     def compile(self, program):
         self.chunk.metadata = program.metadata
+        if self.backend is None:
+            self.backend = program.metadata.get("backend", "tiered")
+        if self.backend not in self.BACKENDS:
+            raise SyntaxError(f"Unknown backend '{self.backend}'")
+        if self.opt is None:
+            self.opt = program.metadata.get("opt", DEFAULT_OPT)
+        passes = PassManager(self.opt, disabled=() if self.superinstructions else ("superinstructions",))
+        if passes.level >= 1:
+            self.folding = fold_constants(program)
+        if self.toplevel_locals is None:
+            self.toplevel_locals = bool(program.metadata.get("toplevel_locals", False))
+        if self.toplevel_locals:
+            host_names = set(self.builtins or ()) | entry_point_names(program.metadata)
+            self.locals = LocalTable(top_level_locals(program, host_names))
         for stmt in program.statements:
             self.compile_statement(stmt)
         self.emit_op(OpCode.PUSH_CONST, self.chunk.add_constant(None))
         self.emit_op(OpCode.RETURN)
-        
-        self._optimize_chunk(self.chunk)
-        for func in self.functions.values():
-            self._optimize_chunk(func.chunk)
+
+        main = None
+        if self.toplevel_locals:
+            # The top-level code runs as an implicit function whose slots the VM reserves from chunk.local_names
+            main = FunctionObject("<main>", 0, local_names=self.locals.names)
+            main.chunk = self.chunk
+            main.locals_count = len(self.locals)
+        if passes.level >= 2:
+            self.inliner = Inliner(self.chunk, self.functions, self.builtins)
+            if main is not None:
+                self.inliner.inline_calls(main, self.call_sites)
+        if main is not None:
+            self.chunk.local_names = main.local_names
+        passes.run(self.chunk)
+        pipeline = (passes.level, tuple(name for name, _ in passes.passes))
+        for name, func in list(self.functions.items()):
+            sites = self.function_call_sites.get(name, ())
+            context = self._optimization_context(name, func, sites, pipeline)
+            if context is not None:
+                key, line = self.function_keys[name]
+                cached = self.function_cache.optimized(key, context, line)
+                if cached is not None:
+                    cached.content_key = content_key(key, context, line)
+                    self.functions[name] = cached
+                    continue
+            if self.inliner is not None:
+                self.inliner.inline_calls(func, sites)
+            passes.run(func.chunk, name)
+            if context is not None:
+                func.content_key = content_key(key, context, line)
+                self.function_cache.store_optimized(key, context, line, func)
             
         return self.chunk
 
+    def _optimization_context(self, name, func, sites, pipeline):
+        """What the optimized code of a cacheable function depends on besides its own content, else None."""
+        if name not in self.function_keys:
+            return None
+        inlined = []
+        if self.inliner is not None:
+            line = self.function_keys[name][1]
+            for callee in self.inliner.callees(func, sites):
+                if callee not in self.function_keys:
+                    return None
+                callee_key, callee_line = self.function_keys[callee]
+                inlined.append((callee, callee_key, callee_line - line))
+        return pipeline + (tuple(inlined),)
+
     def emit_op(self, op, arg=None):
         return self.chunk.emit(op, arg, self.current_line)
 
     def add_constant(self, val):
         return self.chunk.add_constant(val)
 
-    def _optimize_chunk(self, chunk):
-        if not chunk.code:
-            return
-            
-        code = chunk.code
-        lines = chunk.lines
-        to_remove = [False] * len(code)
-        replacements = {} 
-        
-        i = 0
-        while i < len(code):
-            op, arg = code[i]
-            
-            if op == OpCode.SET_LOCAL and i + 1 < len(code):
-                next_op, next_arg = code[i+1]
-                if next_op == OpCode.POP:
-                    replacements[i] = (OpCode.SET_LOCAL_POP, arg)
-                    to_remove[i+1] = True
-                    i += 2
-                    continue
-            
-            if op == OpCode.SET_GLOBAL and i + 1 < len(code):
-                next_op, next_arg = code[i+1]
-                if next_op == OpCode.POP:
-                    replacements[i] = (OpCode.SET_GLOBAL_POP, arg)
-                    to_remove[i+1] = True
-                    i += 2
-                    continue
-
-            if op == OpCode.JUMP_IF_FALSE and i + 1 < len(code):
-                next_op, next_arg = code[i+1]
-                if next_op == OpCode.POP:
-                    replacements[i] = (OpCode.JUMP_IF_FALSE_POP, arg)
-                    to_remove[i+1] = True
-                    i += 2
-                    continue
-            
-            if op == OpCode.JUMP_IF_TRUE and i + 1 < len(code):
-                next_op, next_arg = code[i+1]
-                if next_op == OpCode.POP:
-                    replacements[i] = (OpCode.JUMP_IF_TRUE_POP, arg)
-                    to_remove[i+1] = True
-                    i += 2
-                    continue
-
-            if op == OpCode.PUSH_CONST and i + 1 < len(code):
-                const_val = chunk.constants[arg]
-                next_op, next_arg = code[i+1]
-                if const_val is None and next_op == OpCode.RETURN:
-                    replacements[i] = (OpCode.RETURN_NONE, None)
-                    to_remove[i+1] = True
-                    i += 2
-                    continue
-            
-            i += 1
-
-        new_indices = [0] * (len(code) + 1)
-        current_new = 0
-        for idx in range(len(code)):
-            new_indices[idx] = current_new
-            if not to_remove[idx]:
-                current_new += 1
-        new_indices[len(code)] = current_new
-        
-        optimized = []
-        optimized_lines = []
-        for idx in range(len(code)):
-            if to_remove[idx]:
-                continue
-            
-            op, arg = code[idx]
-            line = lines[idx]
-            if idx in replacements:
-                op, arg = replacements[idx]
-            
-            if op in (OpCode.JUMP, OpCode.JUMP_IF_FALSE, OpCode.JUMP_IF_TRUE, 
-                      OpCode.JUMP_IF_FALSE_POP, OpCode.JUMP_IF_TRUE_POP, OpCode.LOOP, OpCode.FOR_ITER):
-                if arg is not None and 0 <= arg < len(new_indices):
-                    arg = new_indices[arg]
-            
-            optimized.append((op, arg))
-            optimized_lines.append(line)
-            
-        for i in range(len(optimized)):
-            op, arg = optimized[i]
-            if op in (OpCode.JUMP, OpCode.JUMP_IF_FALSE, OpCode.JUMP_IF_TRUE, 
-                      OpCode.JUMP_IF_FALSE_POP, OpCode.JUMP_IF_TRUE_POP, OpCode.LOOP, OpCode.FOR_ITER):
-                if arg is not None and 0 <= arg < len(optimized):
-                    target_op, target_arg = optimized[arg]
-                    if target_op == OpCode.JUMP:
-                        if target_arg is not None:
-                            optimized[i] = (op, target_arg)
-                    elif op in (OpCode.JUMP_IF_FALSE_POP, OpCode.JUMP_IF_TRUE_POP) and target_op == OpCode.POP:
-                        optimized[i] = (op, arg + 1)
-
-        chunk.code = optimized
-        chunk.lines = optimized_lines
+    def _range_loop_args(self, iterable):
+        """Arguments of a `range(...)` loop iterable that can run as FOR_RANGE, or None."""
+        if not isinstance(iterable, ast.CallExpr) or iterable.keyword_arguments:
+            return None
+        callee = iterable.callee
+        if not isinstance(callee, ast.VariableExpr) or callee.name != "range":
+            return None
+        if "range" in self.locals:
+            return None
+        if not 1 <= len(iterable.arguments) <= 3:
+            return None
+        return iterable.arguments
 
     def compile_statement(self, stmt):
         if stmt.line: self.current_line = stmt.line
         if isinstance(stmt, ast.FunctionDef):
+            key = None
+            self.function_keys.pop(stmt.name, None)
+            if self.function_cache is not None:
+                key = function_key(stmt, self.backend != "bytecode")
+                cached = self.function_cache.compiled(key, stmt.line or 0) if key is not None else None
+                if cached is not None:
+                    func_obj, call_sites, fallback = cached
+                    self.functions[stmt.name] = func_obj
+                    self.function_call_sites[stmt.name] = call_sites
+                    if fallback is not None:
+                        self.native_fallbacks[stmt.name] = fallback
+                    self.function_keys[stmt.name] = (key, stmt.line or 0)
+                    return
+
             evaluated_defaults = {}
             for param, expr in stmt.defaults.items():
                 if isinstance(expr, ast.LiteralExpr):
@@ -143,12 +150,13 @@ class Compiler:
             local_scanner = LocalScanner()
             local_scanner.visit(stmt)
             
-            if stmt.kwargs_param and stmt.kwargs_param not in local_scanner.locals:
-                local_scanner.locals.append(stmt.kwargs_param)
+            if stmt.kwargs_param:
+                local_scanner.table.declare(stmt.kwargs_param)
 
             func_compiler = Compiler()
             func_compiler.functions = self.functions 
-            func_compiler.locals = local_scanner.locals
+            func_compiler.function_call_sites = self.function_call_sites
+            func_compiler.locals = local_scanner.table
             func_compiler.scope_depth = 1 
             
             for s in stmt.body:
@@ -158,8 +166,6 @@ class Compiler:
                 func_compiler.emit_op(OpCode.PUSH_CONST, func_compiler.add_constant(None))
                 func_compiler.emit_op(OpCode.RETURN)
             
-            func_compiler._optimize_chunk(func_compiler.chunk)
-            
             func_obj = FunctionObject(
                 stmt.name, 
                 len(stmt.params), 
@@ -168,27 +174,31 @@ class Compiler:
                 local_names=local_scanner.locals
             )
             func_obj.chunk = func_compiler.chunk
-            func_obj.locals_count = len(local_scanner.locals)
+            func_obj.locals_count = len(local_scanner.table)
+            fallback = None
+            if self.backend != "bytecode":
+                try:
+                    func_obj.native_source, func_obj.native_lines = generate_python(stmt, func_obj.local_names)
+                except UnsupportedConstruct as e:
+                    fallback = self.native_fallbacks[stmt.name] = str(e)
             
             self.functions[stmt.name] = func_obj
+            self.function_call_sites[stmt.name] = func_compiler.call_sites
+            if key is not None:
+                self.function_cache.store_compiled(key, stmt.line or 0, func_obj, func_compiler.call_sites, fallback)
+                self.function_keys[stmt.name] = (key, stmt.line or 0)
             
         elif isinstance(stmt, ast.VarDecl):
             self.compile_expression(stmt.expression)
-            if self.scope_depth > 0:
-                try:
-                    local_idx = self.locals.index(stmt.name)
-                    self.emit_op(OpCode.SET_LOCAL, local_idx)
-                    self.emit_op(OpCode.POP) 
-                except ValueError:
-                    self.locals.append(stmt.name)
-                    self.emit_op(OpCode.SET_LOCAL, len(self.locals) - 1)
-                    self.emit_op(OpCode.POP)
+            if self.scope_depth > 0 or stmt.name in self.locals:
+                self.emit_op(OpCode.SET_LOCAL, self.locals.declare(stmt.name))
+                self.emit_op(OpCode.POP)
             else:
                 idx = self.chunk.add_constant(stmt.name)
                 self.emit_op(OpCode.DEFINE_GLOBAL, idx)
                 
         elif isinstance(stmt, ast.VarAssign):
-            if isinstance(stmt.target, ast.VariableExpr) and self.scope_depth == 0:
+            if isinstance(stmt.target, ast.VariableExpr) and self.scope_depth == 0 and stmt.target.name not in self.locals:
                 var_name = stmt.target.name
                 if isinstance(stmt.expression, ast.BinaryExpr) and stmt.expression.operator == TokenType.PLUS:
                     left = stmt.expression.left
@@ -254,16 +264,20 @@ class Compiler:
             self.loop_start_stack.append(start)
             self.break_jumps_stack.append([])
             
-            self.compile_expression(stmt.condition)
-            exit_jump = self.emit_op(OpCode.JUMP_IF_FALSE, 0)
-            self.emit_op(OpCode.POP) 
+            # `while true:` needs no test; only a break leaves it
+            endless = isinstance(stmt.condition, ast.LiteralExpr) and bool(stmt.condition.value)
+            if not endless:
+                self.compile_expression(stmt.condition)
+                exit_jump = self.emit_op(OpCode.JUMP_IF_FALSE, 0)
+                self.emit_op(OpCode.POP) 
             
             for s in stmt.body:
                 self.compile_statement(s)
             
             self.emit_op(OpCode.LOOP, start)
-            self.chunk.patch_jump(exit_jump)
-            self.emit_op(OpCode.POP) 
+            if not endless:
+                self.chunk.patch_jump(exit_jump)
+                self.emit_op(OpCode.POP) 
             
             for jump in self.break_jumps_stack.pop():
                 self.chunk.patch_jump(jump)
@@ -272,34 +286,48 @@ class Compiler:
         elif isinstance(stmt, ast.ForStmt):
             self.break_jumps_stack.append([])
             
-            self.compile_expression(stmt.iterable)
+            range_args = self._range_loop_args(stmt.iterable)
+            if range_args is not None:
+                # `range` is resolved at run time: CALL_RANGE only counts natively if it is the builtin
+                self.compile_expression(stmt.iterable.callee)
+                for arg in range_args:
+                    self.compile_expression(arg)
+                self.emit_op(OpCode.CALL_RANGE, len(range_args))
+            else:
+                self.compile_expression(stmt.iterable)
             self.emit_op(OpCode.GET_ITER)
             
             start = len(self.chunk.code)
             self.loop_start_stack.append(start)
             
-            exit_jump = self.emit_op(OpCode.FOR_ITER, 0)
-            
-            if self.scope_depth > 0:
-                try:
-                    local_idx = self.locals.index(stmt.item_name)
+            if self.scope_depth > 0 or stmt.item_name in self.locals:
+                local_idx = self.locals.declare(stmt.item_name)
+                if range_args is not None:
+                    exit_jump = self.emit_op(OpCode.FOR_RANGE, (local_idx, 0))
+                else:
+                    exit_jump = self.emit_op(OpCode.FOR_ITER, 0)
                     self.emit_op(OpCode.SET_LOCAL, local_idx)
-                except ValueError:
-                    self.locals.append(stmt.item_name)
-                    self.emit_op(OpCode.SET_LOCAL, len(self.locals) - 1)
+                    self.emit_op(OpCode.POP)
             else:
+                # A top-level loop variable needs no `let`: each value defines the global
                 idx = self.chunk.add_constant(stmt.item_name)
-                self.emit_op(OpCode.SET_GLOBAL, idx)
-            self.emit_op(OpCode.POP) 
+                if range_args is not None:
+                    exit_jump = self.emit_op(OpCode.FOR_RANGE_GLOBAL, (idx, 0))
+                else:
+                    exit_jump = self.emit_op(OpCode.FOR_ITER, 0)
+                    self.emit_op(OpCode.DEFINE_GLOBAL, idx)
             
             for s in stmt.body:
                 self.compile_statement(s)
             
             self.emit_op(OpCode.LOOP, start)
+            breaks = self.break_jumps_stack.pop()
+            if breaks:
+                # A break leaves with the iterator still on the stack; the normal exit already popped it
+                for jump in breaks:
+                    self.chunk.patch_jump(jump)
+                self.emit_op(OpCode.POP)
             self.chunk.patch_jump(exit_jump)
-            
-            for jump in self.break_jumps_stack.pop():
-                self.chunk.patch_jump(jump)
             self.loop_start_stack.pop()
 
         elif isinstance(stmt, ast.BreakStmt):
@@ -329,13 +357,10 @@ class Compiler:
 
     def compile_assign_target(self, target):
         if isinstance(target, ast.VariableExpr):
-            if self.scope_depth > 0:
-                try:
-                    local_idx = self.locals.index(target.name)
-                    self.emit_op(OpCode.SET_LOCAL, local_idx)
-                    return
-                except ValueError:
-                    pass
+            local_idx = self.locals.get(target.name)
+            if local_idx is not None:
+                self.emit_op(OpCode.SET_LOCAL, local_idx)
+                return
             idx = self.chunk.add_constant(target.name)
             self.emit_op(OpCode.SET_GLOBAL, idx)
         elif isinstance(target, ast.GetExpr):
@@ -374,14 +399,11 @@ class Compiler:
             self.emit_op(OpCode.BUILD_MAP, len(expr.keys))
             
         elif isinstance(expr, ast.VariableExpr):
-            if self.scope_depth > 0:
-                try:
-                    local_idx = self.locals.index(expr.name)
-                    self.emit_op(OpCode.GET_LOCAL, local_idx)
-                    return
-                except ValueError:
-                    pass
-            
+            local_idx = self.locals.get(expr.name)
+            if local_idx is not None:
+                self.emit_op(OpCode.GET_LOCAL, local_idx)
+                return
+
             idx = self.chunk.add_constant(expr.name)
             self.emit_op(OpCode.GET_GLOBAL, idx)
             
@@ -428,6 +450,7 @@ class Compiler:
                 self.emit_op(OpCode.NOT)
                 
         elif isinstance(expr, ast.CallExpr):
+            callee_index = len(self.chunk.code)
             self.compile_expression(expr.callee)
             for arg in expr.arguments:
                 self.compile_expression(arg)
@@ -439,7 +462,10 @@ class Compiler:
                     kw_names.append(name)
                 self.emit_op(OpCode.CALL_KW, (len(expr.arguments), kw_names))
             else:
-                self.emit_op(OpCode.CALL, len(expr.arguments))
+                call_index = self.emit_op(OpCode.CALL, len(expr.arguments))
+                callee = expr.callee
+                if (self.scope_depth > 0 or self.toplevel_locals) and isinstance(callee, ast.VariableExpr) and callee.name not in self.locals:
+                    self.call_sites.append((callee_index, call_index, callee.name, len(expr.arguments)))
                 
         elif isinstance(expr, ast.GetExpr):
             self.compile_expression(expr.object)
@@ -0,0 +1,153 @@
+from . import ast_nodes as ast
+from .base import LocalScanner
+
+# Escape analysis for top-level code compiled as an implicit function
+# (@meta {"toplevel_locals": true}). A variable declared with a top-level
+# `let` (the loop variables of top-level `for` loops included) can live in a
+# frame slot of the top-level code unless something may look it up in the
+# globals:
+#   - a function that uses or `set`s it without a local of that name,
+#   - the host: the entry points it calls by name (on_init, on_tick, ... and
+#     their @meta remappings) and the host builtins a `let` would replace,
+#   - top-level code that may run before the name is bound (`print(x)`
+#     before `let x`, a `let` inside an `if` or a loop and a use after it),
+#     which has to keep failing with "Undefined variable" rather than
+#     reading None from an unset slot.
+# Such names stay real globals; the others become locals of the top-level frame.
+
+# (@meta key, default) of the functions runtime/__init__.py calls by name
+ENTRY_POINTS = (("init", "on_init"), ("tick", "on_tick"), ("exit", "on_exit"), ("hotkey", "on_hotkey"))
+
+def entry_point_names(metadata):
+    return {metadata.get(key, metadata.get(default, default)) for key, default in ENTRY_POINTS}
+
+def _expression_names(expr, names):
+    """Adds every variable name `expr` reads to `names`."""
+    if isinstance(expr, ast.VariableExpr):
+        names.add(expr.name)
+    elif isinstance(expr, ast.BinaryExpr):
+        _expression_names(expr.left, names)
+        _expression_names(expr.right, names)
+    elif isinstance(expr, ast.UnaryExpr):
+        _expression_names(expr.right, names)
+    elif isinstance(expr, ast.CallExpr):
+        _expression_names(expr.callee, names)
+        for arg in expr.arguments:
+            _expression_names(arg, names)
+        for value in expr.keyword_arguments.values():
+            _expression_names(value, names)
+    elif isinstance(expr, ast.ListExpr):
+        for element in expr.elements:
+            _expression_names(element, names)
+    elif isinstance(expr, ast.DictExpr):
+        for key, value in zip(expr.keys, expr.values):
+            _expression_names(key, names)
+            _expression_names(value, names)
+    elif isinstance(expr, (ast.GetExpr, ast.IndexExpr)):
+        _expression_names(expr.object, names)
+        if isinstance(expr, ast.IndexExpr):
+            _expression_names(expr.index, names)
+    return names
+
+def _statement_names(statements, names, functions):
+    """Adds the names the statements read or assign to `names`; function definitions go to `functions`."""
+    for stmt in statements:
+        if isinstance(stmt, ast.FunctionDef):
+            functions.append(stmt)
+        elif isinstance(stmt, ast.VarDecl):
+            _expression_names(stmt.expression, names)
+        elif isinstance(stmt, ast.VarAssign):
+            _expression_names(stmt.expression, names)
+            _expression_names(stmt.target, names)
+        elif isinstance(stmt, ast.IfStmt):
+            _expression_names(stmt.condition, names)
+            _statement_names(stmt.then_branch, names, functions)
+            for condition, body in stmt.elif_branches:
+                _expression_names(condition, names)
+                _statement_names(body, names, functions)
+            _statement_names(stmt.else_branch or [], names, functions)
+        elif isinstance(stmt, ast.WhileStmt):
+            _expression_names(stmt.condition, names)
+            _statement_names(stmt.body, names, functions)
+        elif isinstance(stmt, ast.ForStmt):
+            _expression_names(stmt.iterable, names)
+            _statement_names(stmt.body, names, functions)
+        elif isinstance(stmt, (ast.ReturnStmt, ast.ExprStmt)) and stmt.expression is not None:
+            _expression_names(stmt.expression, names)
+
+class EscapeAnalyzer:
+    """
+    Decides which top-level names can be frame-slot locals. `host_names`
+    are the globals the host provides or looks up; `escaping` collects the
+    names that have to stay globals.
+    """
+
+    def __init__(self, host_names=()):
+        self.escaping = set(host_names)
+        self.bound = [] # names top-level code binds, in order of first binding
+
+    def analyze(self, program):
+        """Returns the names to keep in slots, in slot order."""
+        self.block(program.statements, frozenset())
+        return [name for name in self.bound if name not in self.escaping]
+
+    def function(self, func):
+        scanner = LocalScanner()
+        scanner.visit(func)
+        used, nested = set(), []
+        _statement_names(func.body, used, nested)
+        self.escaping.update(used - set(scanner.locals))
+        for inner in nested:
+            self.function(inner)
+
+    # Top-level code, tracking the names bound on every path so far
+
+    def bind(self, name):
+        if name not in self.bound:
+            self.bound.append(name)
+
+    def use(self, expr, assigned):
+        self.escaping.update(_expression_names(expr, set()) - assigned)
+
+    def block(self, statements, assigned):
+        for stmt in statements:
+            assigned = self.statement(stmt, assigned)
+        return assigned
+
+    def statement(self, stmt, assigned):
+        """Returns the names bound on every path after `stmt`."""
+        if isinstance(stmt, ast.FunctionDef):
+            self.function(stmt)
+        elif isinstance(stmt, ast.VarDecl):
+            self.use(stmt.expression, assigned)
+            self.bind(stmt.name)
+            return assigned | {stmt.name}
+        elif isinstance(stmt, ast.VarAssign):
+            self.use(stmt.expression, assigned)
+            # `set` on a global that does not exist yet is an error too
+            self.use(stmt.target, assigned)
+        elif isinstance(stmt, ast.IfStmt):
+            self.use(stmt.condition, assigned)
+            paths = [self.block(stmt.then_branch, assigned)]
+            for condition, body in stmt.elif_branches:
+                self.use(condition, assigned)
+                paths.append(self.block(body, assigned))
+            paths.append(self.block(stmt.else_branch or [], assigned))
+            return frozenset.intersection(*paths)
+        elif isinstance(stmt, ast.WhileStmt):
+            # The body may not run at all, so nothing it binds is bound after it
+            self.use(stmt.condition, assigned)
+            self.block(stmt.body, assigned)
+        elif isinstance(stmt, ast.ForStmt):
+            # A top-level loop assigns its variable like `set`, so it needs a `let` first
+            self.use(stmt.iterable, assigned)
+            if stmt.item_name not in assigned:
+                self.escaping.add(stmt.item_name)
+            self.block(stmt.body, assigned)
+        elif isinstance(stmt, (ast.ReturnStmt, ast.ExprStmt)) and stmt.expression is not None:
+            self.use(stmt.expression, assigned)
+        return assigned
+
+def top_level_locals(program, host_names=()):
+    """Names of `program`'s top-level variables that can be frame slots (see EscapeAnalyzer)."""
+    return EscapeAnalyzer(host_names).analyze(program)
@@ -0,0 +1,278 @@
+from . import ast_nodes as ast
+from .base import LocalScanner
+from .lexer import TokenType
+
+# Constant folding on the AST, run by Compiler.compile before code generation
+# (so the Python backend sees the folded tree too).
+#
+#   - Operators whose operands are all literals are evaluated: `60 * 1000`
+#     becomes 60000.0, `"a" + "b"` becomes "ab", `not true` becomes false.
+#   - A top-level `let NAME = <constant>` that is declared once and never
+#     assigned makes NAME a constant for the code after it: `let DEBUG = false`
+#     turns `if DEBUG:` into `if false:`. The global is still defined.
+#   - Branches and loops with a constant condition are resolved: an `if false:`
+#     body or a `while false:` loop disappears, an `if true:` body is inlined.
+#   - Statements after return/break/continue in the same block are dropped.
+#
+# Code is only dropped if it declares nothing: a function definition, or a
+# `let`/`for` that makes a name local to its function, stays where it is.
+
+# Strings longer than this are left for the VM to build
+MAX_FOLDED_STRING = 4096
+
+_CONSTANT_TYPES = (bool, int, float, str, type(None))
+
+def _ordering(compare):
+    # Ordering comparisons evaluate to False when either side is None, like the opcodes
+    return lambda a, b: False if a is None or b is None else compare(a, b)
+
+_BINARY = {
+    TokenType.PLUS: lambda a, b: a + b,
+    TokenType.MINUS: lambda a, b: a - b,
+    TokenType.STAR: lambda a, b: a * b,
+    TokenType.SLASH: lambda a, b: a / b,
+    TokenType.EQUAL_EQUAL: lambda a, b: a == b,
+    TokenType.BANG_EQUAL: lambda a, b: a != b,
+    TokenType.GREATER: _ordering(lambda a, b: a > b),
+    TokenType.GREATER_EQUAL: _ordering(lambda a, b: a >= b),
+    TokenType.LESS: _ordering(lambda a, b: a < b),
+    TokenType.LESS_EQUAL: _ordering(lambda a, b: a <= b),
+}
+
+def _is_constant(node):
+    return isinstance(node, ast.LiteralExpr) and isinstance(node.value, _CONSTANT_TYPES)
+
+def _literal(value, node):
+    return ast.LiteralExpr(value, line=node.line, column=node.column)
+
+def _declares(statements, in_function):
+    """True if removing `statements` could change how names resolve."""
+    for stmt in statements:
+        if isinstance(stmt, ast.FunctionDef):
+            return True
+        if in_function and isinstance(stmt, (ast.VarDecl, ast.ForStmt)):
+            return True
+        if isinstance(stmt, ast.IfStmt):
+            bodies = [stmt.then_branch] + [body for _, body in stmt.elif_branches] + [stmt.else_branch or []]
+            if any(_declares(body, in_function) for body in bodies):
+                return True
+        elif isinstance(stmt, (ast.WhileStmt, ast.ForStmt)):
+            if _declares(stmt.body, in_function):
+                return True
+    return False
+
+def _assigned_names(statements, names, top_level):
+    """Collects every name a `set` assigns and every global a `let` or `for` binds more than once."""
+    for stmt in statements:
+        if isinstance(stmt, ast.VarAssign):
+            if isinstance(stmt.target, ast.VariableExpr):
+                names.add(stmt.target.name)
+        elif isinstance(stmt, ast.FunctionDef):
+            _assigned_names(stmt.body, names, False)
+        elif isinstance(stmt, ast.ForStmt):
+            if top_level:
+                names.add(stmt.item_name)
+            _assigned_names(stmt.body, names, top_level)
+        elif isinstance(stmt, ast.WhileStmt):
+            _assigned_names(stmt.body, names, top_level)
+        elif isinstance(stmt, ast.IfStmt):
+            _assigned_names(stmt.then_branch, names, top_level)
+            for _, body in stmt.elif_branches:
+                _assigned_names(body, names, top_level)
+            _assigned_names(stmt.else_branch or [], names, top_level)
+
+def _global_declarations(statements, counts):
+    # Top-level `let`s, including the ones inside top-level blocks
+    for stmt in statements:
+        if isinstance(stmt, ast.VarDecl):
+            counts[stmt.name] = counts.get(stmt.name, 0) + 1
+        elif isinstance(stmt, (ast.WhileStmt, ast.ForStmt)):
+            _global_declarations(stmt.body, counts)
+        elif isinstance(stmt, ast.IfStmt):
+            _global_declarations(stmt.then_branch, counts)
+            for _, body in stmt.elif_branches:
+                _global_declarations(body, counts)
+            _global_declarations(stmt.else_branch or [], counts)
+
+class ConstantFolder:
+    """
+    Folds one program in place. `constants` maps the global names found to
+    be constant to their values; `folded` counts rewritten expressions and
+    `pruned` removed statements.
+    """
+
+    def __init__(self):
+        self.constants = {}
+        self.folded = 0
+        self.pruned = 0
+        self._visible = {} # constants usable at the current point of the program
+
+    def fold(self, program):
+        assigned = set()
+        _assigned_names(program.statements, assigned, True)
+        declarations = {}
+        _global_declarations(program.statements, declarations)
+
+        statements = []
+        for stmt in program.statements:
+            statements.extend(self.statement(stmt, frozenset(), False))
+            # A constant is visible to the statements and functions that follow its `let`
+            if (isinstance(stmt, ast.VarDecl) and declarations[stmt.name] == 1
+                    and stmt.name not in assigned and _is_constant(stmt.expression)):
+                self.constants[stmt.name] = stmt.expression.value
+                self._visible[stmt.name] = stmt.expression.value
+        program.statements = statements
+        return program
+
+    # Statements
+
+    def block(self, statements, local_names, in_function):
+        result = []
+        for i, stmt in enumerate(statements):
+            result.extend(self.statement(stmt, local_names, in_function))
+            if isinstance(stmt, (ast.ReturnStmt, ast.BreakStmt, ast.ContinueStmt)):
+                rest = statements[i + 1:]
+                if rest and not _declares(rest, in_function):
+                    self.pruned += len(rest)
+                    break
+        return result
+
+    def statement(self, stmt, local_names, in_function):
+        """Returns the list of statements that replaces `stmt`."""
+        if isinstance(stmt, ast.FunctionDef):
+            scanner = LocalScanner()
+            scanner.visit(stmt)
+            stmt.body = self.block(stmt.body, frozenset(scanner.locals), True)
+        elif isinstance(stmt, ast.VarDecl):
+            stmt.expression = self.expression(stmt.expression, local_names)
+        elif isinstance(stmt, ast.VarAssign):
+            stmt.expression = self.expression(stmt.expression, local_names)
+            target = stmt.target
+            if isinstance(target, ast.GetExpr):
+                target.object = self.expression(target.object, local_names)
+            elif isinstance(target, ast.IndexExpr):
+                target.object = self.expression(target.object, local_names)
+                target.index = self.expression(target.index, local_names)
+        elif isinstance(stmt, ast.IfStmt):
+            return self.if_statement(stmt, local_names, in_function)
+        elif isinstance(stmt, ast.WhileStmt):
+            stmt.condition = self.expression(stmt.condition, local_names)
+            if _is_constant(stmt.condition) and not stmt.condition.value and not _declares(stmt.body, in_function):
+                self.pruned += 1
+                return []
+            stmt.body = self.block(stmt.body, local_names, in_function)
+        elif isinstance(stmt, ast.ForStmt):
+            stmt.iterable = self.expression(stmt.iterable, local_names)
+            stmt.body = self.block(stmt.body, local_names, in_function)
+        elif isinstance(stmt, ast.ReturnStmt):
+            if stmt.expression is not None:
+                stmt.expression = self.expression(stmt.expression, local_names)
+        elif isinstance(stmt, ast.ExprStmt):
+            stmt.expression = self.expression(stmt.expression, local_names)
+            if _is_constant(stmt.expression):
+                # A bare constant does nothing
+                self.pruned += 1
+                return []
+        return [stmt]
+
+    def if_statement(self, stmt, local_names, in_function):
+        branches = []
+        else_branch = stmt.else_branch
+        for condition, body in [(stmt.condition, stmt.then_branch)] + list(stmt.elif_branches):
+            condition = self.expression(condition, local_names)
+            if _is_constant(condition):
+                if condition.value:
+                    # Always taken: later branches are dead
+                    dead = [b for _, b in stmt.elif_branches[len(branches):]] + [else_branch or []]
+                    if not any(_declares(b, in_function) for b in dead):
+                        else_branch = body
+                        break
+                elif not _declares(body, in_function):
+                    self.pruned += 1
+                    continue
+            branches.append((condition, self.block(body, local_names, in_function)))
+        else:
+            if else_branch:
+                else_branch = self.block(else_branch, local_names, in_function)
+            if branches:
+                stmt.condition, stmt.then_branch = branches[0]
+                stmt.elif_branches = branches[1:]
+                stmt.else_branch = else_branch
+                return [stmt]
+            return else_branch or []
+
+        # A constant true condition ended the chain; its body is the new else
+        else_branch = self.block(else_branch, local_names, in_function)
+        self.pruned += 1
+        if not branches:
+            return else_branch
+        stmt.condition, stmt.then_branch = branches[0]
+        stmt.elif_branches = branches[1:]
+        stmt.else_branch = else_branch
+        return [stmt]
+
+    # Expressions
+
+    def expression(self, expr, local_names):
+        """Returns `expr` with its constant parts folded (possibly a new LiteralExpr)."""
+        if isinstance(expr, ast.VariableExpr):
+            if expr.name in self._visible and expr.name not in local_names:
+                self.folded += 1
+                return _literal(self._visible[expr.name], expr)
+        elif isinstance(expr, ast.BinaryExpr):
+            expr.left = self.expression(expr.left, local_names)
+            expr.right = self.expression(expr.right, local_names)
+            return self.binary(expr)
+        elif isinstance(expr, ast.UnaryExpr):
+            expr.right = self.expression(expr.right, local_names)
+            if _is_constant(expr.right):
+                value = expr.right.value
+                if expr.operator in (TokenType.BANG, TokenType.NOT):
+                    self.folded += 1
+                    return _literal(not value, expr)
+                if expr.operator == TokenType.MINUS and isinstance(value, (int, float)):
+                    self.folded += 1
+                    return _literal(-value, expr)
+        elif isinstance(expr, ast.CallExpr):
+            expr.callee = self.expression(expr.callee, local_names)
+            expr.arguments = [self.expression(a, local_names) for a in expr.arguments]
+            expr.keyword_arguments = {name: self.expression(v, local_names) for name, v in expr.keyword_arguments.items()}
+        elif isinstance(expr, ast.ListExpr):
+            expr.elements = [self.expression(e, local_names) for e in expr.elements]
+        elif isinstance(expr, ast.DictExpr):
+            expr.keys = [self.expression(k, local_names) for k in expr.keys]
+            expr.values = [self.expression(v, local_names) for v in expr.values]
+        elif isinstance(expr, ast.GetExpr):
+            expr.object = self.expression(expr.object, local_names)
+        elif isinstance(expr, ast.IndexExpr):
+            expr.object = self.expression(expr.object, local_names)
+            expr.index = self.expression(expr.index, local_names)
+        return expr
+
+    def binary(self, expr):
+        left, right, op = expr.left, expr.right, expr.operator
+        if op in (TokenType.AND, TokenType.OR):
+            # Like the jumps `and`/`or` compile to: the left value decides
+            if not _is_constant(left):
+                return expr
+            self.folded += 1
+            if op == TokenType.AND:
+                return right if left.value else left
+            return left if left.value else right
+        if not (_is_constant(left) and _is_constant(right)) or op not in _BINARY:
+            return expr
+        try:
+            value = _BINARY[op](left.value, right.value)
+        except Exception:
+            # Errors (division by zero, mixed types) are left to happen at run time
+            return expr
+        if not isinstance(value, _CONSTANT_TYPES) or (isinstance(value, str) and len(value) > MAX_FOLDED_STRING):
+            return expr
+        self.folded += 1
+        return _literal(value, expr)
+
+def fold_constants(program):
+    """Folds `program` in place and returns the ConstantFolder with its statistics."""
+    folder = ConstantFolder()
+    folder.fold(program)
+    return folder
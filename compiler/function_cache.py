@@ -0,0 +1,149 @@
+import hashlib
+import re
+from collections import OrderedDict
+from . import ast_nodes as ast
+
+# Content-addressed compilation of top-level functions, used by
+# Compiler(function_cache=...). A function is compiled in two stages and
+# both are cached:
+#   - code generation (bytecode and Python backend source), keyed by the
+#     function's folded AST with line numbers relative to its `func` line,
+#     so a function that only moved in the source is reused with its lines
+#     shifted;
+#   - inlining and the bytecode passes, keyed additionally by the pass
+#     pipeline and by the functions inlined into it (their keys and relative
+#     positions, since inlined code keeps the callee's line numbers).
+# An unchanged function therefore skips the compiler entirely, and changing
+# a function also recompiles the callers that inlined it.
+#
+# The final FunctionObject carries a `content_key`: two functions with the
+# same key have identical code and line numbers, which is how a hot reload
+# (MacroRuntime.hot_reload) tells the functions it has to swap.
+#
+# Functions that define nested functions are not cached: those register
+# themselves by name as a side effect of compiling the outer one.
+
+MAX_ENTRIES = 4096
+
+_LINE_RE = re.compile(r"\bline (\d+)")
+
+class _NestedFunction(Exception):
+    pass
+
+def _shape(node, base):
+    """`node` as nested tuples of its type and fields, lines relative to `base`."""
+    if isinstance(node, ast.ASTNode):
+        if isinstance(node, ast.FunctionDef):
+            raise _NestedFunction()
+        fields = []
+        for klass in type(node).__mro__:
+            for name in getattr(klass, "__slots__", ()):
+                value = getattr(node, name)
+                if name == "line":
+                    value = value - base if value else value
+                else:
+                    value = _shape(value, base)
+                fields.append(value)
+        return (type(node).__name__, tuple(fields))
+    if isinstance(node, (list, tuple)):
+        return tuple(_shape(item, base) for item in node)
+    if isinstance(node, dict):
+        return tuple((key, _shape(value, base)) for key, value in node.items())
+    return node
+
+def _digest(value):
+    return hashlib.blake2b(repr(value).encode("utf-8"), digest_size=16).hexdigest()
+
+def function_key(func_def, native):
+    """
+    Content key of a FunctionDef as the compiler sees it (after constant
+    folding), or None if it cannot be cached. `native`: whether the Python
+    backend source is generated too.
+    """
+    base = func_def.line or 0
+    try:
+        shape = (func_def.name, func_def.params, _shape(func_def.defaults, base), func_def.kwargs_param,
+                 func_def.column, _shape(func_def.body, base))
+    except _NestedFunction:
+        return None
+    return _digest((shape, bool(native)))
+
+def _move_lines(text, offset):
+    # Line numbers in a native fallback reason ("nested function 'f' at line 12")
+    return _LINE_RE.sub(lambda m: f"line {int(m.group(1)) + offset}", text) if text and offset else text
+
+class FunctionEntry:
+    """
+    Compiled forms of one function content, stored for the function at
+    `line`: `compiled` is the FunctionObject straight out of code generation,
+    `call_sites` its plain calls for the inliner, `fallback` why the Python
+    backend skipped it (or None), and `optimized` the final FunctionObject per
+    optimization context.
+    """
+    __slots__ = ("line", "compiled", "call_sites", "fallback", "optimized")
+
+    def __init__(self, line, compiled, call_sites, fallback):
+        self.line = line
+        self.compiled = compiled
+        self.call_sites = call_sites
+        self.fallback = fallback
+        self.optimized = {}
+
+class FunctionCache:
+    """
+    Compiled functions by content key, least recently used dropped first
+    beyond `max_entries`. Everything handed out is a copy, so the compiler
+    can optimize it in place. `hits` and `misses` count code generation
+    lookups, `optimized_hits` the lookups that also skipped the passes.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict() # key -> FunctionEntry
+        self.hits = 0
+        self.misses = 0
+        self.optimized_hits = 0
+
+    def _entry(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def compiled(self, key, line):
+        """(FunctionObject, call_sites, fallback reason) of the function with `key` at `line`, or None."""
+        entry = self._entry(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        offset = line - entry.line
+        return entry.compiled.copy(offset), entry.call_sites, _move_lines(entry.fallback, offset)
+
+    def store_compiled(self, key, line, func, call_sites, fallback):
+        self.entries[key] = FunctionEntry(line, func.copy(), list(call_sites), fallback)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def optimized(self, key, context, line):
+        """The final FunctionObject of the function with `key` at `line` in `context`, or None."""
+        entry = self._entry(key)
+        func = entry.optimized.get(context) if entry is not None else None
+        if func is None:
+            return None
+        self.optimized_hits += 1
+        return func.copy(line - entry.line)
+
+    def store_optimized(self, key, context, line, func):
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry.optimized[context] = func.copy(entry.line - line)
+
+    def stats(self):
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses,
+                "optimized_hits": self.optimized_hits}
+
+def content_key(key, context, line):
+    """Key of the final code of a function: equal only for the same code at the same line."""
+    return _digest((key, context, line))
@@ -0,0 +1,303 @@
+import re
+from .lexer import Lexer, Token, TokenType, _META_RE, _extract_meta
+from .parser import Parser
+
+# Incremental front end for the editor. The document is a list of lines,
+# each with its tokens and the lexer state at its start: the indent stack
+# and, inside a @meta block that spans lines, the block's text so far. An
+# edit relexes the changed lines and then the following ones only until a
+# line starts in the same state as before (the state has converged), so
+# typing inside a function relexes a single line.
+#
+# Top-level declarations - a line at indent 0 together with the indented
+# lines and the elif/else lines after it - are parsed one by one when
+# diagnostics are asked for. A parse is kept until one of the declaration's
+# lines is relexed or removed, so after an edit only the declarations it
+# touched are parsed again.
+#
+# Lines are split on "\n" like the editor's. Tokens and diagnostics use the
+# document's own line numbers: unlike Lexer.tokenize, which blanks a @meta
+# block spanning lines into a single line, the lines after such a block keep
+# their numbers, and its META token comes with the line that closes it.
+# Otherwise tokens() is the stream Lexer.tokenize returns.
+
+# Highlighting styles of line_spans
+STYLE_DEFAULT = 0
+STYLE_KEYWORD = 1
+STYLE_BUILTIN = 2
+STYLE_FUNCTION = 3
+STYLE_STRING = 4
+STYLE_NUMBER = 5
+STYLE_COMMENT = 6
+STYLE_OPERATOR = 7
+STYLE_IDENTIFIER = 8
+STYLE_META = 9
+STYLE_ERROR = 10
+
+_INITIAL_STATE = ((0,), None)
+_LAYOUT = (TokenType.INDENT, TokenType.DEDENT, TokenType.NEWLINE)
+_CONTINUATIONS = (TokenType.ELIF, TokenType.ELSE)
+_KEYWORDS = frozenset(t for t in TokenType if t.value.isalpha() and t.value.islower())
+_LOCATION_RE = re.compile(r" at line -?\d+(?::(\d+))?$")
+_TOKEN_SUFFIX_RE = re.compile(r" at Token\(.*\)$")
+
+def _block_end(text, start, depth):
+    """(index of the brace closing a @meta block, -1 if none) and the brace depth at that point."""
+    for i in range(start, len(text)):
+        char = text[i]
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return i, 0
+    return -1, depth
+
+class LineInfo:
+    """
+    Lexer result for one line: `tokens` (their line attribute unset),
+    highlight `spans` as (start, end, style) character ranges, the lexer
+    error as (column, message) or None, and the states at the `start` and
+    `end` of the line. `top` lines begin a top-level declaration, whose
+    parse is cached in `declaration`.
+    """
+    __slots__ = ("start", "end", "tokens", "spans", "error", "top", "declaration")
+
+    def __init__(self, start, end, tokens, spans, error):
+        self.start = start
+        self.end = end
+        self.tokens = tokens
+        self.spans = spans
+        self.error = error
+        first = next((t.type for t in tokens if t.type != TokenType.DEDENT), None)
+        self.top = first is not None and len(end[0]) == 1 and first not in _CONTINUATIONS
+        self.declaration = None
+
+class Declaration:
+    """Parse of the lines `infos`: syntax `errors` as (line in the declaration, column, message) and the @meta `metadata`."""
+    __slots__ = ("infos", "lex_errors", "errors", "metadata", "statements")
+
+    def __init__(self, infos, errors, metadata, statements):
+        self.infos = infos
+        self.lex_errors = any(info.error is not None for info in infos) # then the lines are not parsed
+        self.errors = errors
+        self.metadata = metadata
+        self.statements = statements
+
+class IncrementalDocument:
+    """
+    Source text kept as lines with cached tokens and parses. `builtins`
+    are highlighted as STYLE_BUILTIN.
+    """
+
+    def __init__(self, text="", builtins=()):
+        self.builtins = frozenset(builtins)
+        self._lexer = Lexer("")
+        self.lines = []
+        self.infos = []
+        self.set_text(text)
+
+    def set_text(self, text):
+        self.lines = []
+        self.infos = []
+        self.edit(0, 0, text.split("\n"))
+
+    def edit(self, first, removed, new_lines):
+        """
+        Replaces `removed` lines from line index `first` (0-based) by
+        `new_lines` and relexes. Returns the range of line indices whose
+        tokens were recomputed (for restyling). Declarations are reparsed
+        when diagnostics or metadata are asked for, and only the ones with
+        a relexed or removed line.
+        """
+        new_lines = [line[:-1] if line.endswith("\r") else line for line in new_lines]
+        if not new_lines and removed >= len(self.lines):
+            new_lines = [""] # like the editor, an empty document has one empty line
+        self.lines[first:first + removed] = new_lines
+        self.infos[first:first + removed] = [None] * len(new_lines)
+        stop = self._relex(first, first + len(new_lines))
+        return range(first, stop)
+
+    def text(self):
+        return "\n".join(self.lines)
+
+    # Lexing
+
+    def _relex(self, first, edited_end):
+        infos = self.infos
+        lines = self.lines
+        state = infos[first - 1].end if first > 0 else _INITIAL_STATE
+        i = first
+        while i < len(lines):
+            old = infos[i]
+            if i >= edited_end and old is not None and old.start == state:
+                break # converged: the rest lexes as before
+            info = self._lex(lines[i], state)
+            infos[i] = info
+            state = info.end
+            i += 1
+        return i
+
+    def _lex(self, line, state):
+        stack, meta = state
+        tokens = []
+        spans = []
+        rest = line
+
+        if meta is not None:
+            # Inside a @meta block opened on an earlier line
+            text, depth, column = meta
+            close, depth = _block_end(line, 0, depth)
+            if close < 0:
+                return LineInfo(state, (stack, (text + "\n" + line, depth, column)),
+                                tokens, [(0, len(line), STYLE_META)], None)
+            tokens.append(Token(TokenType.META, text + "\n" + line[:close + 1], 0, column))
+            spans.append((0, close + 1, STYLE_META))
+            rest = " " * (close + 1) + line[close + 1:]
+            meta = None
+
+        if "@meta" in rest:
+            rest, blocks = _extract_meta(rest)
+            for token in blocks.get(1, ()):
+                tokens.append(token)
+                spans.append((token.column - 1, token.column - 1 + len(token.value), STYLE_META))
+            opened = _META_RE.search(rest)
+            if opened:
+                _, depth = _block_end(rest, opened.end() - 1, 0)
+                meta = (rest[opened.start():], depth, opened.start() + 1)
+                spans.append((opened.start(), len(rest), STYLE_META))
+                rest = rest[:opened.start()]
+
+        lexer = self._lexer
+        lexer.tokens = tokens
+        lexer.indent_stack = list(stack)
+        lexer.line = 0
+        error = None
+        try:
+            lexer.lex_line(rest)
+        except (SyntaxError, ValueError) as e:
+            message = str(e)
+            location = _LOCATION_RE.search(message)
+            column = int(location.group(1)) if location and location.group(1) else None
+            if location:
+                message = message[:location.start()]
+            error = (column, message)
+        spans.extend(self._token_spans(line, tokens, error))
+        spans.sort()
+        return LineInfo(state, (tuple(lexer.indent_stack), meta), tokens, spans, error)
+
+    def _token_spans(self, line, tokens, error):
+        spans = []
+        end = 0
+        previous = None
+        for index, token in enumerate(tokens):
+            kind = token.type
+            if kind in _LAYOUT or kind == TokenType.META:
+                continue
+            start = token.column - 1
+            if kind == TokenType.IDENTIFIER:
+                following = tokens[index + 1].type if index + 1 < len(tokens) else None
+                if previous == TokenType.FUNC or following == TokenType.LPAREN:
+                    style = STYLE_FUNCTION
+                elif token.value in self.builtins:
+                    style = STYLE_BUILTIN
+                else:
+                    style = STYLE_IDENTIFIER
+                end = start + len(token.value)
+            elif kind == TokenType.STRING:
+                style, end = STYLE_STRING, start + len(token.value) + 2
+            elif kind == TokenType.NUMBER:
+                end = start + 1
+                while end < len(line) and (line[end].isdigit() or line[end] == '.'):
+                    end += 1
+                style = STYLE_NUMBER
+            else:
+                style = STYLE_KEYWORD if kind in _KEYWORDS else STYLE_OPERATOR
+                end = start + len(token.value)
+            spans.append((start, end, style))
+            previous = kind
+
+        if error is not None:
+            column = error[0]
+            spans.append((column - 1 if column else end, len(line), STYLE_ERROR))
+        else:
+            comment = line.find("#", end)
+            if comment >= 0 and not line[end:comment].strip():
+                spans.append((comment, len(line), STYLE_COMMENT))
+        return spans
+
+    # Parsing
+
+    def _declaration(self, start, end):
+        infos = tuple(self.infos[start:end])
+        cached = infos[0].declaration
+        if cached is not None and cached.infos == infos: # LineInfo compares by identity
+            return cached
+
+        if any(info.error is not None for info in infos):
+            declaration = Declaration(infos, [], {}, [])
+        else:
+            tokens = []
+            for offset, info in enumerate(infos, 1):
+                line_tokens = info.tokens
+                if offset == 1:
+                    # The DEDENTs of the first line close the previous declaration
+                    line_tokens = [t for t in line_tokens if t.type != TokenType.DEDENT]
+                tokens.extend(Token(t.type, t.value, offset, t.column) for t in line_tokens)
+            tail = len(infos) + 1
+            tokens.extend(Token(TokenType.DEDENT, 0, tail, 1) for _ in range(len(infos[-1].end[0]) - 1))
+            tokens.append(Token(TokenType.EOF, "", tail, 1))
+            parser = Parser(tokens, report_errors=False)
+            program = parser.parse()
+            errors = [(min(line, len(infos)), column if line <= len(infos) else None,
+                       _TOKEN_SUFFIX_RE.sub("", message)) for line, column, message in parser.errors]
+            declaration = Declaration(infos, errors, program.metadata, program.statements)
+        infos[0].declaration = declaration
+        return declaration
+
+    def declarations(self):
+        """(first line index, Declaration) of every top-level declaration, parsing the ones not parsed yet."""
+        starts = [i for i, info in enumerate(self.infos) if info.top and i > 0]
+        for start, end in zip([0] + starts, starts + [len(self.infos)]):
+            yield start, self._declaration(start, end)
+
+    # Queries
+
+    def line_spans(self, index):
+        """Highlight spans of line `index` (0-based) as sorted (start, end, style) character ranges."""
+        return self.infos[index].spans
+
+    def diagnostics(self):
+        """Lexer and syntax errors as (line, column or None, message), 1-based lines, in line order."""
+        found = []
+        for start, declaration in self.declarations():
+            if declaration.lex_errors:
+                for offset, info in enumerate(declaration.infos):
+                    if info.error is not None:
+                        found.append((start + offset + 1, info.error[0], info.error[1]))
+            for line, column, message in declaration.errors:
+                found.append((start + line, column, message))
+        open_meta = self.infos[-1].end[1] if self.infos else None
+        if open_meta is not None:
+            line = len(self.infos) - open_meta[0].count("\n")
+            found.append((line, open_meta[2], "Unterminated @meta block"))
+        found.sort(key=lambda d: d[0])
+        return found
+
+    def metadata(self):
+        """The @meta settings of the document, merged in order like Parser.parse."""
+        merged = {}
+        for _, declaration in self.declarations():
+            merged.update(declaration.metadata)
+        return merged
+
+    def tokens(self):
+        """The whole token stream with document line numbers, as Lexer.tokenize would produce it."""
+        stream = []
+        for number, info in enumerate(self.infos, 1):
+            stream.extend(Token(t.type, t.value, number, t.column) for t in info.tokens)
+        last = max(len(self.lines) - (self.lines[-1] == "" if self.lines else 0), 1)
+        stack = self.infos[-1].end[0] if self.infos else (0,)
+        stream.extend(Token(TokenType.DEDENT, 0, last + 1, 1) for _ in range(len(stack) - 1))
+        stream.append(Token(TokenType.EOF, "", last + 1, 1))
+        return stream
@@ -0,0 +1,187 @@
+from .opcodes import OpCode, jump_target, with_jump_target
+from .cfg import ControlFlowGraph, liveness, stack_depths
+from .passes import CONSTANT_ARGS
+
+# Small-function inlining, run by Compiler.compile at opt level 2 on the
+# freshly emitted function bodies, before the bytecode passes (which then
+# optimize the caller and the inlined code together).
+#
+# A call `f(a, b)` inside a function is replaced by the code of f when
+#   - f is a user function no global can shadow at run time: not a host
+#     builtin, nor a name that top-level `let`/`for` or `set` binds,
+#   - the call passes exactly f's parameters, positionally,
+#   - f takes no **kwargs, does not call itself or yield, has at most
+#     MAX_INLINE_SIZE instructions and returns with nothing but the result
+#     on its stack.
+#
+# f's locals get slots at the end of the caller's frame (named "f.x" in
+# local_names), shared by all the inlined calls of f in that caller. The
+# inlined instructions keep f's line numbers, so a runtime error inside them
+# reports the line in f. Only one level is inlined: calls in f's body stay
+# calls. Top-level code has no frame slots and is left alone.
+# chunk.metadata["inlined"] counts the inlined calls per callee for the
+# disassembler.
+
+# Callee size limit in unoptimized instructions
+MAX_INLINE_SIZE = 24
+
+# Instructions that write a global, with the position of the name in a tuple argument
+_GLOBAL_WRITES = {
+    OpCode.DEFINE_GLOBAL: None, OpCode.SET_GLOBAL: None, OpCode.SET_GLOBAL_POP: None,
+    OpCode.INC_GLOBAL: None, OpCode.ADD_GLOBAL: None, OpCode.FOR_RANGE_GLOBAL: 0,
+}
+
+def _shift_locals(op, arg, base):
+    if op in (OpCode.GET_LOCAL, OpCode.SET_LOCAL, OpCode.SET_LOCAL_POP):
+        return arg + base
+    if op == OpCode.FOR_RANGE:
+        return (arg[0] + base,) + arg[1:]
+    if op == OpCode.BINARY_LOCALS:
+        return (arg[0], arg[1] + base, arg[2] + base)
+    return arg
+
+def _remap_constants(op, arg, constants, chunk):
+    if op not in CONSTANT_ARGS:
+        return arg
+    positions = CONSTANT_ARGS[op]
+    if positions is None:
+        return chunk.add_constant(constants[arg])
+    arg = list(arg)
+    for p in positions:
+        arg[p] = chunk.add_constant(constants[arg[p]])
+    return tuple(arg)
+
+class InlineBody:
+    """Snapshot of an inlinable function's code, taken before any call in it is inlined."""
+    __slots__ = ("code", "lines", "constants", "arity", "local_names", "fresh")
+
+    def __init__(self, func):
+        chunk = func.chunk
+        self.code = list(chunk.code)
+        self.lines = list(chunk.lines)
+        self.constants = list(chunk.constants)
+        self.arity = func.arity
+        self.local_names = list(func.local_names[:func.locals_count])
+        # Locals that may be read before being set: a new frame has them as None
+        cfg = ControlFlowGraph(self.code)
+        live_in, _ = liveness(cfg)
+        entry = live_in[0] if cfg.blocks else 0
+        self.fresh = [slot for slot in range(self.arity, len(self.local_names)) if entry >> slot & 1]
+
+class Inliner:
+    """
+    Inlines the calls recorded by the compiler. `main` is the top-level
+    chunk, `builtins` the host globals (None if unknown); `inlined` counts
+    the replaced calls.
+    """
+
+    def __init__(self, main, functions, builtins=None):
+        self.functions = functions
+        self.inlined = 0
+        shadowed = set(builtins or ())
+        for chunk in [main] + [func.chunk for func in functions.values()]:
+            for op, arg in chunk.code:
+                if op in _GLOBAL_WRITES:
+                    position = _GLOBAL_WRITES[op]
+                    shadowed.add(chunk.constants[arg if position is None else arg[position]])
+        self.bodies = {name: InlineBody(func) for name, func in functions.items()
+                       if name not in shadowed and self._inlinable(name, func)}
+
+    def _inlinable(self, name, func):
+        if func.kwargs_param is not None:
+            return False
+        chunk = func.chunk
+        code = chunk.code
+        if not code or len(code) > MAX_INLINE_SIZE or code[-1][0] != OpCode.RETURN:
+            return False
+        for op, arg in code:
+            if op == OpCode.GET_GLOBAL and chunk.constants[arg] == name:
+                return False # recursive
+            if op == OpCode.YIELD:
+                return False # suspends in a frame of its own
+            target = jump_target(op, arg)
+            if target is not None and target >= len(code):
+                return False
+        try:
+            depths = stack_depths(code)
+        except ValueError:
+            return False
+        return all(depths[i] in (None, 1) for i, (op, _) in enumerate(code) if op == OpCode.RETURN)
+
+    def _eligible(self, func, name, argc):
+        body = self.bodies.get(name)
+        return body is not None and name != func.name and argc == body.arity
+
+    def callees(self, func, sites):
+        """Names of the functions inline_calls(func, sites) would inline, each once."""
+        return sorted({name for _, _, name, argc in sites if self._eligible(func, name, argc)})
+
+    def inline_calls(self, func, sites):
+        """
+        Inlines the eligible calls among `sites`, the (GET_GLOBAL index, CALL
+        index, callee name, argument count) of plain calls in func's chunk.
+        """
+        calls = {}
+        for get_index, call_index, name, argc in sites:
+            if self._eligible(func, name, argc):
+                calls[get_index] = None
+                calls[call_index] = name
+        if not calls:
+            return
+
+        chunk = func.chunk
+        code, lines = [], []
+        new_index = [0] * (len(chunk.code) + 1)
+        caller_jumps = [] # positions in `code` of the caller's own jumps, still with old targets
+        slot_bases = {}
+        counts = chunk.metadata.setdefault("inlined", {})
+        for i, (op, arg) in enumerate(chunk.code):
+            new_index[i] = len(code)
+            if i in calls:
+                name = calls[i]
+                if name is not None:
+                    if name not in slot_bases:
+                        slot_bases[name] = func.locals_count
+                        func.local_names.extend(f"{name}.{local}" for local in self.bodies[name].local_names)
+                        func.locals_count += len(self.bodies[name].local_names)
+                    self._expand(chunk, self.bodies[name], slot_bases[name], chunk.lines[i], code, lines)
+                    counts[name] = counts.get(name, 0) + 1
+                    self.inlined += 1
+                continue # the GET_GLOBAL of an inlined callee
+            if jump_target(op, arg) is not None:
+                caller_jumps.append(len(code))
+            code.append((op, arg))
+            lines.append(chunk.lines[i])
+        new_index[len(chunk.code)] = len(code)
+
+        for pos in caller_jumps:
+            op, arg = code[pos]
+            code[pos] = (op, with_jump_target(op, arg, new_index[jump_target(op, arg)]))
+        chunk.code = code
+        chunk.lines = lines
+
+    def _expand(self, chunk, body, base, line, code, lines):
+        # The arguments are on the stack, the last one on top
+        for slot in range(body.arity - 1, -1, -1):
+            code.append((OpCode.SET_LOCAL_POP, base + slot))
+            lines.append(line)
+        for slot in body.fresh:
+            code.append((OpCode.PUSH_CONST, chunk.add_constant(None)))
+            code.append((OpCode.SET_LOCAL_POP, base + slot))
+            lines.extend((line, line))
+
+        # One instruction per callee instruction but the final RETURN, whose
+        # index becomes the continuation; earlier RETURNs jump there.
+        start = len(code)
+        end = start + len(body.code) - 1
+        for i, (op, arg) in enumerate(body.code[:-1]):
+            if op == OpCode.RETURN:
+                op, arg = OpCode.JUMP, end
+            else:
+                arg = _shift_locals(op, arg, base)
+                arg = _remap_constants(op, arg, body.constants, chunk)
+                target = jump_target(op, arg)
+                if target is not None:
+                    arg = with_jump_target(op, arg, start + target)
+            code.append((op, arg))
+            lines.append(body.lines[i])
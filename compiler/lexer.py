@@ -1,5 +1,6 @@
 import enum
 import re
+from bisect import bisect_left
 
 class TokenType(enum.Enum):
     # Keywords
@@ -65,7 +66,12 @@ class TokenType(enum.Enum):
     META = "META"
     EOF = "EOF"
 
+    # Identity hash, as for OpCode: the parser looks token types up in dicts and sets
+    __hash__ = object.__hash__
+
 class Token:
+    __slots__ = ("type", "value", "line", "column")
+
     def __init__(self, type, value, line, column):
         self.type = type
         self.value = value
@@ -108,224 +114,202 @@ class Lexer:
         }
 
     def tokenize(self):
-        # Pre-process multiline @meta
-        source = self.source
-        meta_pattern = r'@meta\s*\{'
-        meta_matches = list(re.finditer(meta_pattern, source))
-        
-        # We'll replace @meta blocks with placeholders to not interfere with line-by-line tokenization
-        # then inject META tokens at correct positions
-        meta_tokens_to_inject = []
-        
-        for match in reversed(meta_matches):
-            start_pos = match.start()
-            # Find matching brace
-            brace_count = 0
-            found_end = False
-            for i in range(match.end() - 1, len(source)):
-                if source[i] == '{': brace_count += 1
-                elif source[i] == '}':
-                    brace_count -= 1
-                    if brace_count == 0:
-                        meta_full_content = source[start_pos:i+1]
-                        # Calculate line/col
-                        prefix = source[:start_pos]
-                        line = prefix.count('\n') + 1
-                        last_nl = prefix.rfind('\n')
-                        col = start_pos - last_nl if last_nl != -1 else start_pos + 1
-                        
-                        meta_tokens_to_inject.append((line, col, meta_full_content))
-                        
-                        # Replace with spaces to maintain line/col for other tokens
-                        replacement = ' ' * len(meta_full_content)
-                        source = source[:start_pos] + replacement + source[i+1:]
-                        found_end = True
-                        break
-            if not found_end:
-                # Let it fail during normal tokenization if not found
-                pass
+        source, meta_tokens = _extract_meta(self.source)
+        tokens = self.tokens
+        indent_stack = self.indent_stack
 
-        lines = source.splitlines()
-        for i, line_content in enumerate(lines):
-            self.line = i + 1
-            self.column = 1
-            self.current = 0
-            
-            # Inject META tokens for this line
-            for m_line, m_col, m_content in [t for t in meta_tokens_to_inject if t[0] == self.line]:
-                self.tokens.append(Token(TokenType.META, m_content, m_line, m_col))
-            
-            # Handle indentation at the start of the line
-            # If the line is now all spaces (because of @meta replacement), skip it
-            if not line_content.strip() or line_content.strip().startswith("#"):
-                continue
-            
-            indent = 0
-            for char in line_content:
-                if char == ' ':
-                    indent += 1
-                elif char == '\t':
-                    indent += 4 # Assume 4 spaces for tab
-                else:
-                    break
-            
-            if indent > self.indent_stack[-1]:
-                self.indent_stack.append(indent)
-                self.tokens.append(Token(TokenType.INDENT, indent, self.line, 1))
-            elif indent < self.indent_stack[-1]:
-                while indent < self.indent_stack[-1]:
-                    self.indent_stack.pop()
-                    self.tokens.append(Token(TokenType.DEDENT, indent, self.line, 1))
-                if indent != self.indent_stack[-1]:
-                    raise SyntaxError(f"Invalid indentation at line {self.line}")
+        for number, line_content in enumerate(source.splitlines(), 1):
+            self.line = number
 
-            self.tokenize_line(line_content[indent:], indent + 1)
-            self.tokens.append(Token(TokenType.NEWLINE, "\n", self.line, len(line_content) + 1))
+            # META tokens of the @meta blocks that started on this line
+            if number in meta_tokens:
+                tokens.extend(meta_tokens[number])
+
+            self.lex_line(line_content)
 
         # Close any remaining indents
-        while len(self.indent_stack) > 1:
-            self.indent_stack.pop()
-            self.tokens.append(Token(TokenType.DEDENT, 0, self.line + 1, 1))
-            
-        self.tokens.append(Token(TokenType.EOF, "", self.line + 1, 1))
-        return self.tokens
+        while len(indent_stack) > 1:
+            indent_stack.pop()
+            tokens.append(Token(TokenType.DEDENT, 0, self.line + 1, 1))
+
+        tokens.append(Token(TokenType.EOF, "", self.line + 1, 1))
+        return tokens
+
+    def lex_line(self, line_content):
+        """
+        Appends the tokens of one physical line (without @meta blocks) at
+        self.line: INDENT/DEDENT against self.indent_stack, the line's
+        tokens and its NEWLINE. Blank and comment lines add nothing.
+        """
+        # Blank lines (@meta blocks are blank by now) and comments carry no tokens
+        text = line_content.lstrip()
+        if not text or text[0] == '#':
+            return
+
+        tokens = self.tokens
+        indent_stack = self.indent_stack
+        number = self.line
+        leading = _INDENT_RE.match(line_content).group()
+        indent = len(leading) + 3 * leading.count('\t') # Assume 4 spaces for tab
+
+        if indent > indent_stack[-1]:
+            indent_stack.append(indent)
+            tokens.append(Token(TokenType.INDENT, indent, number, 1))
+        elif indent < indent_stack[-1]:
+            while indent < indent_stack[-1]:
+                indent_stack.pop()
+                tokens.append(Token(TokenType.DEDENT, indent, number, 1))
+            if indent != indent_stack[-1]:
+                raise SyntaxError(f"Invalid indentation at line {number}")
+
+        self.tokenize_line(line_content[indent:], indent + 1)
+        tokens.append(Token(TokenType.NEWLINE, "\n", number, len(line_content) + 1))
 
     def tokenize_line(self, content, start_col):
-        i = 0
-        while i < len(content):
-            char = content[i]
-            col = start_col + i
-            
-            if char.isspace():
-                i += 1
-                continue
-                
-            if char == '#': # Comment
-                break
-                
-            if char == '(':
-                self.tokens.append(Token(TokenType.LPAREN, "(", self.line, col))
-                i += 1
-            elif char == ')':
-                self.tokens.append(Token(TokenType.RPAREN, ")", self.line, col))
-                i += 1
-            elif char == ':':
-                self.tokens.append(Token(TokenType.COLON, ":", self.line, col))
-                i += 1
-            elif char == ',':
-                self.tokens.append(Token(TokenType.COMMA, ",", self.line, col))
-                i += 1
-            elif char == '.':
-                self.tokens.append(Token(TokenType.DOT, ".", self.line, col))
-                i += 1
-            elif char == '[':
-                self.tokens.append(Token(TokenType.LBRACKET, "[", self.line, col))
-                i += 1
-            elif char == ']':
-                self.tokens.append(Token(TokenType.RBRACKET, "]", self.line, col))
-                i += 1
-            elif char == '{':
-                self.tokens.append(Token(TokenType.LBRACE, "{", self.line, col))
-                i += 1
-            elif char == '}':
-                self.tokens.append(Token(TokenType.RBRACE, "}", self.line, col))
-                i += 1
-            elif char == '+':
-                if i + 1 < len(content) and content[i+1] == '+':
-                    self.tokens.append(Token(TokenType.PLUS_PLUS, "++", self.line, col))
-                    i += 2
-                elif i + 1 < len(content) and content[i+1] == '=':
-                    self.tokens.append(Token(TokenType.PLUS_EQUAL, "+=", self.line, col))
-                    i += 2
-                else:
-                    self.tokens.append(Token(TokenType.PLUS, "+", self.line, col))
-                    i += 1
-            elif char == '-':
-                if i + 1 < len(content) and content[i+1] == '-':
-                    self.tokens.append(Token(TokenType.MINUS_MINUS, "--", self.line, col))
-                    i += 2
-                elif i + 1 < len(content) and content[i+1] == '=':
-                    self.tokens.append(Token(TokenType.MINUS_EQUAL, "-=", self.line, col))
-                    i += 2
-                else:
-                    self.tokens.append(Token(TokenType.MINUS, "-", self.line, col))
-                    i += 1
-            elif char == '*':
-                if i + 1 < len(content) and content[i+1] == '=':
-                    self.tokens.append(Token(TokenType.STAR_EQUAL, "*=", self.line, col))
-                    i += 2
-                else:
-                    self.tokens.append(Token(TokenType.STAR, "*", self.line, col))
-                    i += 1
-            elif char == '/':
-                if i + 1 < len(content) and content[i+1] == '=':
-                    self.tokens.append(Token(TokenType.SLASH_EQUAL, "/=", self.line, col))
-                    i += 2
-                else:
-                    self.tokens.append(Token(TokenType.SLASH, "/", self.line, col))
-                    i += 1
-            elif char == '=':
-                if i + 1 < len(content) and content[i+1] == '=':
-                    self.tokens.append(Token(TokenType.EQUAL_EQUAL, "==", self.line, col))
-                    i += 2
-                else:
-                    self.tokens.append(Token(TokenType.EQUAL, "=", self.line, col))
-                    i += 1
-            elif char == '!':
-                if i + 1 < len(content) and content[i+1] == '=':
-                    self.tokens.append(Token(TokenType.BANG_EQUAL, "!=", self.line, col))
-                    i += 2
-                else:
-                    self.tokens.append(Token(TokenType.BANG, "!", self.line, col))
-                    i += 1
-            elif char == '>':
-                if i + 1 < len(content) and content[i+1] == '=':
-                    self.tokens.append(Token(TokenType.GREATER_EQUAL, ">=", self.line, col))
-                    i += 2
-                else:
-                    self.tokens.append(Token(TokenType.GREATER, ">", self.line, col))
-                    i += 1
-            elif char == '<':
-                if i + 1 < len(content) and content[i+1] == '=':
-                    self.tokens.append(Token(TokenType.LESS_EQUAL, "<=", self.line, col))
-                    i += 2
+        append = self.tokens.append
+        line = self.line
+        keywords = self.keywords
+        pos = 0
+        end = len(content.rstrip())
+        while pos < end:
+            for m in _TOKEN_RE.finditer(content, pos, end):
+                kind = m.lastindex
+                text = m.group(kind)
+                col = start_col + m.start(kind)
+                if kind == _NAME:
+                    if text[0] >= '\x80' and not text[0].isalpha():
+                        # Other numeric characters: a number like "²" or an error like "½"
+                        pos = self._scan_slow(content, col - start_col, start_col)
+                        break
+                    append(Token(keywords.get(text, _IDENTIFIER), text, line, col))
+                elif kind == _OPERATOR:
+                    append(Token(_OPERATORS[text], text, line, col))
+                elif kind == _NUMBER:
+                    following = content[m.end():m.end() + 1]
+                    if following >= '\x80' and following.isdigit():
+                        pos = self._scan_slow(content, col - start_col, start_col)
+                        break
+                    append(Token(_NUMBER_TOKEN, float(text), line, col))
+                elif kind == _STRING:
+                    append(Token(_STRING_TOKEN, text[1:-1], line, col))
+                elif kind == _COMMENT:
+                    return
+                elif kind == _QUOTE:
+                    raise SyntaxError(f"Unterminated string at line {line}:{col}")
                 else:
-                    self.tokens.append(Token(TokenType.LESS, "<", self.line, col))
-                    i += 1
-            elif char == '@':
-                # Unexpected @ outside of pre-processed @meta
-                raise SyntaxError(f"Unexpected character '@' at line {self.line}:{col}")
-            elif char == '"':
-                # String literal
-                start_i = i
+                    # '@' included: @meta blocks were taken out before
+                    raise SyntaxError(f"Unexpected character '{text}' at line {line}:{col}")
+            else:
+                return
+
+    def _scan_slow(self, content, i, start_col):
+        """
+        Scans the number or identifier at `i` character by character, for the
+        non-ASCII digits the master regex does not classify like str.isdigit.
+        Returns the index after it.
+        """
+        col = start_col + i
+        char = content[i]
+        if char.isdigit():
+            start = i
+            while i < len(content) and (content[i].isdigit() or content[i] == '.'):
                 i += 1
-                string_val = ""
-                while i < len(content) and content[i] != '"':
-                    string_val += content[i]
-                    i += 1
-                if i >= len(content):
-                    raise SyntaxError(f"Unterminated string at line {self.line}:{col}")
+            self.tokens.append(Token(TokenType.NUMBER, float(content[start:i]), self.line, col))
+        elif char.isalpha() or char == '_':
+            start = i
+            while i < len(content) and (content[i].isalnum() or content[i] == '_'):
                 i += 1
-                self.tokens.append(Token(TokenType.STRING, string_val, self.line, col))
-            elif char.isdigit():
-                # Number literal
-                start_i = i
-                num_str = ""
-                while i < len(content) and (content[i].isdigit() or content[i] == '.'):
-                    num_str += content[i]
-                    i += 1
-                self.tokens.append(Token(TokenType.NUMBER, float(num_str), self.line, col))
-            elif char.isalpha() or char == '_':
-                # Identifier or Keyword
-                start_i = i
-                ident = ""
-                while i < len(content) and (content[i].isalnum() or content[i] == '_'):
-                    ident += content[i]
-                    i += 1
-                
-                if ident in self.keywords:
-                    self.tokens.append(Token(self.keywords[ident], ident, self.line, col))
-                else:
-                    self.tokens.append(Token(TokenType.IDENTIFIER, ident, self.line, col))
-            else:
-                raise SyntaxError(f"Unexpected character '{char}' at line {self.line}:{col}")
+            ident = content[start:i]
+            self.tokens.append(Token(self.keywords.get(ident, TokenType.IDENTIFIER), ident, self.line, col))
+        else:
+            raise SyntaxError(f"Unexpected character '{char}' at line {self.line}:{col}")
+        return i
+
+# Single-pass scanner: every match is the whitespace before a token and the
+# token, found by one alternation. \s, \d and \w follow str.isspace,
+# str.isdecimal and str.isalnum; the few characters that are digits for
+# str.isdigit but not decimal go through Lexer._scan_slow.
+_TOKEN_RE = re.compile(r"""\s*(?:
+    (?P<name>[^\W\d]\w*)
+  | (?P<operator>\+\+|--|[-+*/=!<>]=|[-+*/=!<>():,.\[\]{}])
+  | (?P<number>\d[\d.]*)
+  | (?P<string>"[^"]*")
+  | (?P<quote>")
+  | (?P<comment>\#)
+  | (?P<other>.)
+)""", re.VERBOSE)
+_NAME, _OPERATOR, _NUMBER, _STRING, _QUOTE, _COMMENT, _OTHER = range(1, 8)
+_IDENTIFIER, _NUMBER_TOKEN, _STRING_TOKEN = TokenType.IDENTIFIER, TokenType.NUMBER, TokenType.STRING
+
+_OPERATORS = {t.value: t for t in TokenType if t.value and not t.value[0].isalpha()}
+
+_INDENT_RE = re.compile(r"[ \t]*")
+_META_RE = re.compile(r"@meta\s*\{")
+_BRACE_RE = re.compile(r"[{}]")
+
+def _extract_meta(source):
+    """
+    Blanks the @meta blocks of `source` with spaces and returns it with
+    {line: [META tokens]}. A block runs to its matching brace. Blocks are
+    taken from the last to the first, so a block nested in another one is
+    blanked inside the outer block's text; line numbers are counted in the
+    source before blanking, while the blanked source is what gets split
+    into lines. A block whose braces never close stays in the source and
+    fails on its '@'.
+    """
+    matches = list(_META_RE.finditer(source))
+    if not matches:
+        return source, {}
+
+    braces = [(m.start(), m.group()) for m in _BRACE_RE.finditer(source)]
+    positions = [pos for pos, _ in braces]
+    blanked = [False] * len(braces) # braces inside an already blanked block
+    newlines = [m.start() for m in re.finditer("\n", source)]
+    spans = [] # (start, end) of the blanked blocks, end inclusive
+    meta_tokens = {}
+    for match in reversed(matches):
+        start_pos = match.start()
+        depth = 0
+        end = None
+        for k in range(bisect_left(positions, match.end() - 1), len(braces)):
+            if blanked[k]:
+                continue
+            depth += 1 if braces[k][1] == '{' else -1
+            if depth == 0:
+                end = braces[k][0]
+                break
+        if end is None:
+            continue
+
+        # Blocks blanked so far start after this one, latest first: the ones inside it are at the end
+        inner = []
+        for s, e in reversed(spans):
+            if s > end:
+                break
+            inner.append((s, e))
+        content = list(source[start_pos:end + 1]) if inner else source[start_pos:end + 1]
+        for s, e in inner:
+            content[s - start_pos:e - start_pos + 1] = ' ' * (e - s + 1)
+        if inner:
+            content = "".join(content)
+
+        line = bisect_left(newlines, start_pos) + 1
+        col = start_pos - source.rfind('\n', 0, start_pos)
+        meta_tokens.setdefault(line, []).append(Token(TokenType.META, content, line, col))
+
+        for k in range(bisect_left(positions, start_pos), len(braces)):
+            if positions[k] > end:
+                break
+            blanked[k] = True
+        spans.append((start_pos, end))
+
+    pieces = []
+    last = 0
+    for s, e in sorted(spans):
+        if s < last:
+            continue # nested in a block blanked already
+        pieces.append(source[last:s])
+        pieces.append(' ' * (e - s + 1))
+        last = e + 1
+    pieces.append(source[last:])
+    return "".join(pieces), meta_tokens
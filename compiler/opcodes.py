@@ -48,6 +48,9 @@ class OpCode(Enum):
     BUILD_MAP = auto()    # Build dict from N*2 elements on stack (key, val, key, val...)
     GET_ITER = auto()     # Get iterator from object
     FOR_ITER = auto()     # Get next item from iterator or jump to end
+    CALL_RANGE = auto()   # argc: range(...) of a for loop; the builtin becomes a counter, anything else is called
+    FOR_RANGE = auto()    # (slot, target): store the next loop value in a local slot or jump to target when done
+    FOR_RANGE_GLOBAL = auto() # (name_idx, target): same for a global loop variable
     INDEX_GET = auto()    # obj[index]
     INDEX_SET = auto()    # obj[index] = val
 
@@ -63,3 +66,93 @@ class OpCode(Enum):
     SET_GLOBAL_POP = auto()    # Set global and pop
     SET_ATTR_POP = auto()      # Set attr and pop
     YIELD = auto()             # Suspend execution until next tick
+
+    # Superinstructions (emitted by compiler/superinstructions.py)
+    GET_GLOBAL_ATTR = auto()             # (name_idx, attr_idx): GET_GLOBAL + GET_ATTR
+    CALL_ATTR = auto()                   # attr_idx: GET_ATTR + CALL 0
+    CALL_POP = auto()                    # argc: CALL + POP
+    BINARY_CONST = auto()                # (op, const_idx): PUSH_CONST + ADD/SUB/MUL/DIV
+    BINARY_LOCALS = auto()               # (op, a, b): GET_LOCAL a + GET_LOCAL b + ADD/SUB/MUL/DIV
+    COMPARE_JUMP_IF_FALSE = auto()       # (op, target): compare + JUMP_IF_FALSE_POP
+    COMPARE_CONST_JUMP_IF_FALSE = auto() # (op, const_idx, target): PUSH_CONST + compare + JUMP_IF_FALSE_POP
+
+    # Python backend: never emitted, the VM runs a native function as a NATIVE_ENTER, NATIVE_RESUME frame
+    NATIVE_ENTER = auto()                # Start the generator of a native function from the bound slots
+    NATIVE_RESUME = auto()               # Resume it until it returns, yields or calls an interpreted function
+
+    # Members are singletons compared by identity, so the C-level identity
+    # hash is as good as Enum's hash of the name and keeps the opcode set and
+    # dict lookups of the compiler passes and the verifier cheap
+    __hash__ = object.__hash__
+
+# Opcodes whose argument is an absolute jump target
+JUMP_OPS = frozenset((
+    OpCode.JUMP, OpCode.JUMP_IF_FALSE, OpCode.JUMP_IF_TRUE,
+    OpCode.JUMP_IF_FALSE_POP, OpCode.JUMP_IF_TRUE_POP, OpCode.LOOP, OpCode.FOR_ITER,
+))
+
+# Jumps with a tuple argument (fused compare-and-branch, range loops) keep their target as its last element
+TUPLE_JUMP_OPS = frozenset((
+    OpCode.COMPARE_JUMP_IF_FALSE, OpCode.COMPARE_CONST_JUMP_IF_FALSE, OpCode.FOR_RANGE, OpCode.FOR_RANGE_GLOBAL,
+))
+
+# Jumps that are always taken; every other jump may also fall through
+UNCONDITIONAL_JUMP_OPS = frozenset((OpCode.JUMP, OpCode.LOOP))
+
+def jump_target(op, arg):
+    """Returns the jump target of an instruction, or None if it does not jump."""
+    if op in JUMP_OPS:
+        return arg
+    if op in TUPLE_JUMP_OPS:
+        return arg[-1]
+    return None
+
+def with_jump_target(op, arg, target):
+    """Returns the argument of a jump instruction retargeted to `target`."""
+    if op in TUPLE_JUMP_OPS:
+        return arg[:-1] + (target,)
+    return target
+
+# Net stack effect of the instructions whose effect does not depend on the argument
+_STACK_EFFECTS = {
+    OpCode.PUSH_CONST: 1, OpCode.PUSH_TRUE: 1, OpCode.PUSH_FALSE: 1, OpCode.POP: -1,
+    OpCode.DEFINE_GLOBAL: -1, OpCode.GET_GLOBAL: 1, OpCode.SET_GLOBAL: 0, OpCode.SET_GLOBAL_POP: -1,
+    OpCode.GET_LOCAL: 1, OpCode.SET_LOCAL: 0, OpCode.SET_LOCAL_POP: -1,
+    OpCode.GET_ATTR: 0, OpCode.SET_ATTR: -1, OpCode.SET_ATTR_POP: -2, OpCode.SET_ATTR_FAST: -2,
+    OpCode.ADD: -1, OpCode.SUB: -1, OpCode.MUL: -1, OpCode.DIV: -1,
+    OpCode.EQUAL: -1, OpCode.NOT_EQUAL: -1, OpCode.GREATER: -1,
+    OpCode.GREATER_EQUAL: -1, OpCode.LESS: -1, OpCode.LESS_EQUAL: -1,
+    OpCode.NEGATE: 0, OpCode.NOT: 0,
+    OpCode.JUMP: 0, OpCode.JUMP_IF_FALSE: 0, OpCode.JUMP_IF_TRUE: 0, OpCode.LOOP: 0,
+    OpCode.JUMP_IF_FALSE_POP: -1, OpCode.JUMP_IF_TRUE_POP: -1,
+    OpCode.RETURN: -1, OpCode.RETURN_NONE: 0, OpCode.YIELD: 0,
+    OpCode.GET_ITER: 0, OpCode.INDEX_GET: -1, OpCode.INDEX_SET: -2,
+    OpCode.INC_GLOBAL: 0, OpCode.ADD_GLOBAL: -1,
+    OpCode.GET_GLOBAL_ATTR: 1, OpCode.CALL_ATTR: 0, OpCode.BINARY_CONST: 0, OpCode.BINARY_LOCALS: 1,
+    OpCode.COMPARE_JUMP_IF_FALSE: -2, OpCode.COMPARE_CONST_JUMP_IF_FALSE: -1,
+}
+
+def stack_effect(op, arg, jump=False):
+    """
+    Net change of the operand stack depth when the instruction runs; with
+    `jump` the effect when it takes its jump. Loops pop their iterator
+    only on exit.
+    """
+    if op in (OpCode.FOR_ITER, OpCode.FOR_RANGE, OpCode.FOR_RANGE_GLOBAL):
+        if jump:
+            return -1
+        return 1 if op == OpCode.FOR_ITER else 0
+    if op in (OpCode.CALL, OpCode.CALL_RANGE):
+        return -arg
+    if op == OpCode.CALL_POP:
+        return -arg - 1
+    if op == OpCode.CALL_KW:
+        return -arg[0] - len(arg[1])
+    if op == OpCode.BUILD_LIST:
+        return 1 - arg
+    if op == OpCode.BUILD_MAP:
+        return 1 - 2 * arg
+    try:
+        return _STACK_EFFECTS[op]
+    except KeyError:
+        raise ValueError(f"{op.name} has no stack effect in compiled code")
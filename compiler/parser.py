@@ -1,10 +1,26 @@
 from .lexer import TokenType, Token
 from . import ast_nodes as ast
 
+# Binary operators and their precedence, higher binds tighter. All of them are
+# left-associative: `a - b - c` is `(a - b) - c`.
+BINARY_PRECEDENCE = {
+    TokenType.OR: 1,
+    TokenType.AND: 2,
+    TokenType.EQUAL_EQUAL: 3, TokenType.BANG_EQUAL: 3,
+    TokenType.GREATER: 4, TokenType.GREATER_EQUAL: 4, TokenType.LESS: 4, TokenType.LESS_EQUAL: 4,
+    TokenType.PLUS: 5, TokenType.MINUS: 5,
+    TokenType.STAR: 6, TokenType.SLASH: 6,
+}
+
+# Prefix operators, binding tighter than any binary operator
+UNARY_OPERATORS = frozenset((TokenType.NOT, TokenType.BANG, TokenType.MINUS))
+
 class Parser:
-    def __init__(self, tokens):
+    def __init__(self, tokens, report_errors=True):
         self.tokens = tokens
         self.current = 0
+        self.report_errors = report_errors # print syntax errors as they are recovered from
+        self.errors = [] # (line, column, message) of every recovered syntax error
 
     def parse(self):
         statements = []
@@ -57,12 +73,12 @@ class Parser:
 
     def declaration(self):
         try:
-            line = self.peek().line
-            column = self.peek().column
+            token = self.tokens[self.current]
+            line, column, kind = token.line, token.column, token.type
             stmt = None
-            if self.match(TokenType.FUNC): stmt = self.function_declaration()
-            elif self.match(TokenType.LET): stmt = self.var_declaration()
-            elif self.match(TokenType.SET): stmt = self.var_assignment()
+            if kind == TokenType.FUNC: stmt = self.function_declaration(self.advance())
+            elif kind == TokenType.LET: stmt = self.var_declaration(self.advance())
+            elif kind == TokenType.SET: stmt = self.var_assignment(self.advance())
             else: stmt = self.statement()
             
             if stmt and not stmt.line:
@@ -70,12 +86,15 @@ class Parser:
                 stmt.column = column
             return stmt
         except Exception as e:
+            token = self.peek()
+            self.errors.append((token.line, token.column, str(e)))
             self.synchronize()
-            print(f"Error: {e}")
+            if self.report_errors:
+                print(f"Error: {e}")
             return None
 
-    def function_declaration(self):
-        token = self.previous() # FUNC token
+    def function_declaration(self, token):
+        # token: the FUNC keyword
         name = self.consume(TokenType.IDENTIFIER, "Expect function name.").value
         self.consume(TokenType.LPAREN, "Expect '(' after function name.")
         parameters = []
@@ -104,16 +123,16 @@ class Parser:
         body.append(ast.ReturnStmt(ast.LiteralExpr(None, line=token.line), line=token.line))
         return ast.FunctionDef(name, parameters, defaults, body, kwargs_param, line=token.line, column=token.column)
 
-    def var_declaration(self):
-        token = self.previous() # LET token
+    def var_declaration(self, token):
+        # token: the LET keyword
         name = self.consume(TokenType.IDENTIFIER, "Expect variable name.").value
         self.consume(TokenType.EQUAL, "Expect '=' after variable name.")
         initializer = self.expression()
         self.consume(TokenType.NEWLINE, "Expect newline after variable declaration.")
         return ast.VarDecl(name, initializer, line=token.line, column=token.column)
 
-    def var_assignment(self):
-        token = self.previous() # SET token
+    def var_assignment(self, token):
+        # token: the SET keyword
         target = self.call() # This will parse IDENTIFIER or IDENTIFIER.IDENTIFIER etc.
         
         # Handle increment/decrement
@@ -146,33 +165,32 @@ class Parser:
         return ast.VarAssign(target, expression, line=token.line, column=token.column)
 
     def statement(self):
-        if self.match(TokenType.IF): return self.if_statement()
-        if self.match(TokenType.WHILE): return self.while_statement()
-        if self.match(TokenType.FOR): return self.for_statement()
-        if self.match(TokenType.RETURN): return self.return_statement()
-        if self.match(TokenType.BREAK): return self.break_statement()
-        if self.match(TokenType.CONTINUE): return self.continue_statement()
-        if self.match(TokenType.YIELD): return self.yield_statement()
-        if self.match(TokenType.NEWLINE): return None # Skip empty lines
+        kind = self.tokens[self.current].type
+        if kind == TokenType.IF: return self.if_statement(self.advance())
+        if kind == TokenType.WHILE: return self.while_statement(self.advance())
+        if kind == TokenType.FOR: return self.for_statement(self.advance())
+        if kind == TokenType.RETURN: return self.return_statement(self.advance())
+        if kind == TokenType.BREAK: return self.break_statement(self.advance())
+        if kind == TokenType.CONTINUE: return self.continue_statement(self.advance())
+        if kind == TokenType.YIELD: return self.yield_statement(self.advance())
+        if kind == TokenType.NEWLINE: # Skip empty lines
+            self.current += 1
+            return None
         return self.expression_statement()
 
-    def break_statement(self):
-        token = self.previous()
+    def break_statement(self, token):
         self.consume(TokenType.NEWLINE, "Expect newline after 'break'.")
         return ast.BreakStmt(line=token.line, column=token.column)
 
-    def continue_statement(self):
-        token = self.previous()
+    def continue_statement(self, token):
         self.consume(TokenType.NEWLINE, "Expect newline after 'continue'.")
         return ast.ContinueStmt(line=token.line, column=token.column)
 
-    def yield_statement(self):
-        token = self.previous() # YIELD
+    def yield_statement(self, token):
         self.consume(TokenType.NEWLINE, "Expect newline after 'yield'.")
         return ast.YieldStmt(line=token.line, column=token.column)
 
-    def if_statement(self):
-        token = self.previous() # IF
+    def if_statement(self, token):
         condition = self.expression()
         self.consume(TokenType.COLON, "Expect ':' after if condition.")
         then_branch = self.block()
@@ -191,15 +209,13 @@ class Parser:
             
         return ast.IfStmt(condition, then_branch, elif_branches, else_branch, line=token.line, column=token.column)
 
-    def while_statement(self):
-        token = self.previous() # WHILE
+    def while_statement(self, token):
         condition = self.expression()
         self.consume(TokenType.COLON, "Expect ':' after while condition.")
         body = self.block()
         return ast.WhileStmt(condition, body, line=token.line, column=token.column)
 
-    def for_statement(self):
-        token = self.previous() # FOR
+    def for_statement(self, token):
         item_name = self.consume(TokenType.IDENTIFIER, "Expect variable name after 'for'.").value
         self.consume(TokenType.IN, "Expect 'in' after variable name.")
         iterable = self.expression()
@@ -207,8 +223,7 @@ class Parser:
         body = self.block()
         return ast.ForStmt(item_name, iterable, body, line=token.line, column=token.column)
 
-    def return_statement(self):
-        token = self.previous() # RETURN
+    def return_statement(self, token):
         value = None
         if not self.check(TokenType.NEWLINE):
             value = self.expression()
@@ -232,93 +247,64 @@ class Parser:
         return statements
 
     # Expressions
-    def expression(self):
-        return self.logical_or()
-
-    def logical_or(self):
-        expr = self.logical_and()
-        while self.match(TokenType.OR):
-            operator = self.previous()
-            right = self.logical_and()
-            expr = ast.BinaryExpr(expr, operator.type, right, line=operator.line, column=operator.column)
-        return expr
-
-    def logical_and(self):
-        expr = self.equality()
-        while self.match(TokenType.AND):
-            operator = self.previous()
-            right = self.equality()
-            expr = ast.BinaryExpr(expr, operator.type, right, line=operator.line, column=operator.column)
-        return expr
-
-    def equality(self):
-        expr = self.comparison()
-        while self.match(TokenType.EQUAL_EQUAL, TokenType.BANG_EQUAL):
-            operator = self.previous()
-            right = self.comparison()
-            expr = ast.BinaryExpr(expr, operator.type, right, line=operator.line, column=operator.column)
-        return expr
-
-    def comparison(self):
-        expr = self.term()
-        while self.match(TokenType.GREATER, TokenType.GREATER_EQUAL, TokenType.LESS, TokenType.LESS_EQUAL):
-            operator = self.previous()
-            right = self.term()
-            expr = ast.BinaryExpr(expr, operator.type, right, line=operator.line, column=operator.column)
-        return expr
-
-    def term(self):
-        expr = self.factor()
-        while self.match(TokenType.PLUS, TokenType.MINUS):
-            operator = self.previous()
-            right = self.factor()
-            expr = ast.BinaryExpr(expr, operator.type, right, line=operator.line, column=operator.column)
-        return expr
-
-    def factor(self):
+    def expression(self, min_precedence=1):
+        """
+        Precedence climbing: a unary operand, then every binary operator that
+        binds at least as tightly as `min_precedence`, each with a right
+        operand of the operators binding tighter than itself.
+        """
         expr = self.unary()
-        while self.match(TokenType.STAR, TokenType.SLASH):
-            operator = self.previous()
-            right = self.unary()
+        tokens = self.tokens
+        while True:
+            operator = tokens[self.current]
+            precedence = BINARY_PRECEDENCE.get(operator.type, 0)
+            if precedence < min_precedence:
+                return expr
+            self.current += 1
+            right = self.expression(precedence + 1)
             expr = ast.BinaryExpr(expr, operator.type, right, line=operator.line, column=operator.column)
-        return expr
 
     def unary(self):
-        if self.match(TokenType.NOT, TokenType.BANG, TokenType.MINUS):
-            operator = self.previous()
+        operator = self.tokens[self.current]
+        if operator.type in UNARY_OPERATORS:
+            self.current += 1
             right = self.unary()
             return ast.UnaryExpr(operator.type, right, line=operator.line, column=operator.column)
         return self.call()
 
     def call(self):
         expr = self.primary()
+        tokens = self.tokens
         while True:
-            if self.match(TokenType.LPAREN):
+            token = tokens[self.current]
+            kind = token.type
+            if kind == TokenType.LPAREN:
+                self.current += 1
                 expr = self.finish_call(expr)
-            elif self.match(TokenType.DOT):
-                token = self.previous()
+            elif kind == TokenType.DOT:
+                self.current += 1
                 name = self.consume(TokenType.IDENTIFIER, "Expect property name after '.'.").value
                 expr = ast.GetExpr(expr, name, line=token.line, column=token.column)
-            elif self.match(TokenType.LBRACKET):
-                token = self.previous()
+            elif kind == TokenType.LBRACKET:
+                self.current += 1
                 index = self.expression()
                 self.consume(TokenType.RBRACKET, "Expect ']' after index.")
                 expr = ast.IndexExpr(expr, index, line=token.line, column=token.column)
             else:
-                break
-        return expr
+                return expr
 
     def finish_call(self, callee):
         token = self.previous() # LPAREN
         arguments = []
         keyword_arguments = {}
         
+        tokens = self.tokens
         if not self.check(TokenType.RPAREN):
             while True:
                 # Check if it's a keyword argument: IDENTIFIER = expression
-                if self.check(TokenType.IDENTIFIER) and self.peek_next() and self.peek_next().type == TokenType.EQUAL:
-                    name = self.advance().value
-                    self.advance() # Consume EQUAL
+                if tokens[self.current].type == TokenType.IDENTIFIER and tokens[self.current + 1].type == TokenType.EQUAL:
+                    name = tokens[self.current].value
+                    self.current += 2
                     value = self.expression()
                     keyword_arguments[name] = value
                 else:
@@ -381,52 +367,54 @@ class Parser:
             pass
 
     def primary(self):
-        token = self.peek()
+        token = self.tokens[self.current]
+        kind = token.type
         line, col = token.line, token.column
-        
-        if self.match(TokenType.FALSE): return ast.LiteralExpr(False, line=line, column=col)
-        if self.match(TokenType.TRUE): return ast.LiteralExpr(True, line=line, column=col)
-        if self.match(TokenType.NUMBER, TokenType.STRING):
-            val = self.previous().value
-            return ast.LiteralExpr(val, line=line, column=col)
-        if self.match(TokenType.LBRACKET): 
-            expr = self.list_expression()
-            expr.line, expr.column = line, col
-            return expr
-        
-        if self.match(TokenType.LBRACE):
-            expr = self.dict_expression()
-            expr.line, expr.column = line, col
-            return expr
-        
-        if self.match(TokenType.IDENTIFIER):
-            return ast.VariableExpr(self.previous().value, line=line, column=col)
 
-        if self.match(TokenType.LPAREN):
+        if kind == TokenType.IDENTIFIER:
+            self.current += 1
+            return ast.VariableExpr(token.value, line=line, column=col)
+        if kind == TokenType.NUMBER or kind == TokenType.STRING:
+            self.current += 1
+            return ast.LiteralExpr(token.value, line=line, column=col)
+        if kind == TokenType.FALSE:
+            self.current += 1
+            return ast.LiteralExpr(False, line=line, column=col)
+        if kind == TokenType.TRUE:
+            self.current += 1
+            return ast.LiteralExpr(True, line=line, column=col)
+        if kind == TokenType.LBRACKET:
+            self.current += 1
+            return self.list_expression()
+        if kind == TokenType.LBRACE:
+            self.current += 1
+            return self.dict_expression()
+        if kind == TokenType.LPAREN:
+            self.current += 1
             expr = self.expression()
             self.consume(TokenType.RPAREN, "Expect ')' after expression.")
             return expr
-        
-        raise SyntaxError(f"Expect expression at {self.peek()}")
 
-    # Helpers
+        raise SyntaxError(f"Expect expression at {token}")
+
+    # Helpers. None of them moves past EOF: check/match never match it.
     def match(self, *types):
-        for type in types:
-            if self.check(type):
-                self.advance()
-                return True
+        kind = self.tokens[self.current].type
+        if kind in types and kind != TokenType.EOF:
+            self.current += 1
+            return True
         return False
 
     def check(self, type):
-        if self.is_at_end(): return False
-        return self.peek().type == type
+        kind = self.tokens[self.current].type
+        return kind == type and kind != TokenType.EOF
 
     def advance(self):
-        if not self.is_at_end(): self.current += 1
-        return self.previous()
+        if self.tokens[self.current].type != TokenType.EOF: self.current += 1
+        return self.tokens[self.current - 1]
 
     def is_at_end(self):
-        return self.peek().type == TokenType.EOF
+        return self.tokens[self.current].type == TokenType.EOF
 
     def peek(self):
         return self.tokens[self.current]
@@ -435,8 +423,11 @@ class Parser:
         return self.tokens[self.current - 1]
 
     def consume(self, type, message):
-        if self.check(type): return self.advance()
-        raise SyntaxError(f"{message} at {self.peek()}")
+        token = self.tokens[self.current]
+        if token.type == type and type != TokenType.EOF:
+            self.current += 1
+            return token
+        raise SyntaxError(f"{message} at {token}")
 
     def synchronize(self):
         self.advance()
@@ -0,0 +1,273 @@
+from .opcodes import OpCode, jump_target, with_jump_target
+from .base import rebuild_chunk
+from .cfg import TERMINATORS, ControlFlowGraph, liveness, local_effects, stack_depths
+from .superinstructions import fuse_superinstructions
+
+# Bytecode optimization pipeline. Each pass takes a Chunk and rewrites
+# chunk.code/chunk.lines in place; PassManager runs the passes enabled by the
+# optimization level and verifies the chunk after each of them, so a broken
+# pass fails at compile time with its name instead of misbehaving in the VM.
+#
+# Levels (@meta {"opt": N}):
+#   0 - no optimization: the bytecode exactly as the compiler emitted it
+#   1 - constant folding (compiler/folding.py) and the cleanup passes below
+#   2 - everything: also store forwarding, dead-store elimination and
+#       superinstructions (default)
+
+DEFAULT_OPT = 2
+OPT_LEVELS = (0, 1, 2)
+
+# Instructions whose argument (or the listed positions of a tuple argument) indexes chunk.constants
+CONSTANT_ARGS = {
+    OpCode.PUSH_CONST: None, OpCode.DEFINE_GLOBAL: None, OpCode.GET_GLOBAL: None,
+    OpCode.SET_GLOBAL: None, OpCode.SET_GLOBAL_POP: None, OpCode.INC_GLOBAL: None,
+    OpCode.ADD_GLOBAL: None, OpCode.GET_ATTR: None, OpCode.SET_ATTR: None,
+    OpCode.SET_ATTR_FAST: None, OpCode.SET_ATTR_POP: None, OpCode.CALL_ATTR: None,
+    OpCode.FOR_RANGE_GLOBAL: (0,), OpCode.BINARY_CONST: (1,),
+    OpCode.COMPARE_CONST_JUMP_IF_FALSE: (1,), OpCode.GET_GLOBAL_ATTR: (0, 1),
+}
+
+class VerifyError(Exception):
+    pass
+
+def verify_chunk(chunk, where="chunk"):
+    """Checks the structural invariants every pass must keep, stack balance included; raises VerifyError."""
+    code = chunk.code
+    if len(chunk.lines) != len(code):
+        raise VerifyError(f"{where}: {len(code)} instructions but {len(chunk.lines)} line entries")
+    n_constants = len(chunk.constants)
+    for i, (op, arg) in enumerate(code):
+        if not isinstance(op, OpCode):
+            raise VerifyError(f"{where}: unknown opcode {op!r} at {i}")
+        target = jump_target(op, arg)
+        if target is not None and not (isinstance(target, int) and 0 <= target <= len(code)):
+            raise VerifyError(f"{where}: {op.name} at {i} jumps to {target!r}, outside 0..{len(code)}")
+        if op in CONSTANT_ARGS:
+            positions = CONSTANT_ARGS[op]
+            indices = (arg,) if positions is None else tuple(arg[p] for p in positions)
+            for idx in indices:
+                if not (isinstance(idx, int) and 0 <= idx < n_constants):
+                    raise VerifyError(f"{where}: {op.name} at {i} uses constant {idx!r} of {n_constants}")
+    if code and code[-1][0] not in TERMINATORS:
+        raise VerifyError(f"{where}: execution runs past the last instruction ({code[-1][0].name})")
+    try:
+        stack_depths(code)
+    except ValueError as e:
+        raise VerifyError(f"{where}: {e}")
+
+# Passes
+
+def peephole(chunk):
+    """
+    Merges SET+POP, JUMP_IF+POP and PUSH_CONST None+RETURN pairs into single
+    instructions. A JUMP_IF+POP only becomes a popping jump if its target is
+    a POP too (an if/while condition), which the jump then skips; the
+    `and`/`or` jumps that keep their operand as the result stay as they are.
+    """
+    code = chunk.code
+    keep = [True] * len(code)
+    replacements = {}
+    merged = {
+        OpCode.SET_LOCAL: OpCode.SET_LOCAL_POP,
+        OpCode.SET_GLOBAL: OpCode.SET_GLOBAL_POP,
+    }
+    merged_jumps = {
+        OpCode.JUMP_IF_FALSE: OpCode.JUMP_IF_FALSE_POP,
+        OpCode.JUMP_IF_TRUE: OpCode.JUMP_IF_TRUE_POP,
+    }
+
+    i = 0
+    while i < len(code) - 1:
+        op, arg = code[i]
+        next_op = code[i + 1][0]
+        if op in merged and next_op == OpCode.POP:
+            replacements[i] = (merged[op], arg)
+            keep[i + 1] = False
+            i += 2
+            continue
+        if op in merged_jumps and next_op == OpCode.POP and arg < len(code) and code[arg][0] == OpCode.POP:
+            replacements[i] = (merged_jumps[op], arg + 1)
+            keep[i + 1] = False
+            i += 2
+            continue
+        if op == OpCode.PUSH_CONST and chunk.constants[arg] is None and next_op == OpCode.RETURN:
+            replacements[i] = (OpCode.RETURN_NONE, None)
+            keep[i + 1] = False
+            i += 2
+            continue
+        i += 1
+
+    if replacements:
+        rebuild_chunk(chunk, keep, replacements)
+
+def thread_jumps(chunk):
+    """
+    Retargets jumps that land on a chain of JUMPs to its final destination.
+    """
+    code = chunk.code
+    for i, (op, arg) in enumerate(code):
+        target = jump_target(op, arg)
+        if target is None:
+            continue
+        seen = set()
+        while 0 <= target < len(code) and code[target][0] == OpCode.JUMP and target not in seen:
+            seen.add(target)
+            target = code[target][1]
+        if target != jump_target(op, arg):
+            code[i] = (op, with_jump_target(op, arg, target))
+
+def remove_unreachable(chunk):
+    """
+    Drops the instructions no path from the entry reaches (code after a
+    RETURN or JUMP, and the POPs at the labels that jump threading made
+    every branch skip) and JUMPs to the next instruction, which pruned
+    else branches leave behind.
+    """
+    code = chunk.code
+    keep = [False] * len(code)
+    pending = [0]
+    while pending:
+        i = pending.pop()
+        while i < len(code) and not keep[i]:
+            keep[i] = True
+            op, arg = code[i]
+            target = jump_target(op, arg)
+            if target is not None:
+                pending.append(target)
+            if op in TERMINATORS:
+                break
+            i += 1
+    # Forward JUMPs over nothing but removed code; backwards, so a JUMP onto a removed JUMP goes too
+    next_kept = len(code)
+    for idx in range(len(code) - 1, -1, -1):
+        op, arg = code[idx]
+        if op == OpCode.JUMP and keep[idx] and idx < arg <= next_kept:
+            keep[idx] = False
+        if keep[idx]:
+            next_kept = idx
+    if not all(keep):
+        rebuild_chunk(chunk, keep)
+
+def _jump_targets(code):
+    targets = set()
+    for op, arg in code:
+        target = jump_target(op, arg)
+        if target is not None:
+            targets.add(target)
+    return targets
+
+def forward_stores(chunk):
+    """
+    Keeps a value on the stack instead of storing and reloading it:
+    SET_LOCAL_POP x, GET_LOCAL x becomes SET_LOCAL x, and a GET_LOCAL x,
+    SET_LOCAL_POP x pair (`set x = x`) disappears.
+    """
+    code = chunk.code
+    targets = _jump_targets(code)
+    keep = [True] * len(code)
+    replacements = {}
+    i = 0
+    while i < len(code) - 1:
+        op, arg = code[i]
+        next_op, next_arg = code[i + 1]
+        if arg == next_arg and i + 1 not in targets:
+            if op == OpCode.SET_LOCAL_POP and next_op == OpCode.GET_LOCAL:
+                replacements[i] = (OpCode.SET_LOCAL, arg)
+                keep[i + 1] = False
+                i += 2
+                continue
+            if op == OpCode.GET_LOCAL and next_op == OpCode.SET_LOCAL_POP:
+                keep[i] = keep[i + 1] = False
+                i += 2
+                continue
+        i += 1
+    if not all(keep):
+        rebuild_chunk(chunk, keep, replacements)
+
+# Instructions that only push a value and can never fail
+_PURE_PUSHES = frozenset((OpCode.PUSH_CONST, OpCode.PUSH_TRUE, OpCode.PUSH_FALSE, OpCode.GET_LOCAL))
+
+def eliminate_dead_stores(chunk):
+    """
+    Removes stores to local slots that no path reads before the next store
+    (by liveness over the CFG): SET_LOCAL goes away, SET_LOCAL_POP becomes
+    a POP. A constant or local pushed only to be popped goes too. The
+    stored expression itself still runs, so calls and errors stay.
+    """
+    code = chunk.code
+    cfg = ControlFlowGraph(code)
+    _, live_out = liveness(cfg)
+    keep = [True] * len(code)
+    replacements = {}
+    changed = False
+    for index in cfg.reverse_postorder():
+        block = cfg.blocks[index]
+        live = live_out[index]
+        for i in range(block.last, block.start - 1, -1):
+            op, arg = code[i]
+            if op == OpCode.SET_LOCAL_POP and not live >> arg & 1:
+                replacements[i] = (OpCode.POP, None)
+                changed = True
+            elif op == OpCode.SET_LOCAL and not live >> arg & 1:
+                keep[i] = False
+                changed = True
+            uses, defs = local_effects(op, arg)
+            for slot in defs:
+                live &= ~(1 << slot)
+            for slot in uses:
+                live |= 1 << slot
+    if not changed:
+        return
+
+    # push + POP pairs, looking through the instructions removed above
+    targets = _jump_targets(code)
+    previous = None
+    for i, (op, arg) in enumerate(code):
+        if not keep[i]:
+            continue
+        op = replacements.get(i, (op, arg))[0]
+        if (op == OpCode.POP and previous is not None and code[previous][0] in _PURE_PUSHES
+                and previous not in replacements
+                and not any(j in targets for j in range(previous + 1, i + 1))):
+            keep[previous] = keep[i] = False
+            replacements.pop(i, None)
+            previous = None
+            continue
+        previous = i
+    rebuild_chunk(chunk, keep, replacements)
+
+# (name, lowest opt level that runs it, pass) in pipeline order
+PASSES = [
+    ("peephole", 1, peephole),
+    ("thread_jumps", 1, thread_jumps),
+    ("remove_unreachable", 1, remove_unreachable),
+    ("forward_stores", 2, forward_stores),
+    ("dead_stores", 2, eliminate_dead_stores),
+    ("superinstructions", 2, fuse_superinstructions),
+]
+
+class PassManager:
+    """
+    Runs the passes of an optimization level over chunks. `disabled` names
+    passes to skip (e.g. "superinstructions" for opcode statistics); with
+    `verify` every chunk is checked before the first pass and after each one.
+    """
+
+    def __init__(self, level=DEFAULT_OPT, disabled=(), verify=True):
+        if level not in OPT_LEVELS:
+            raise SyntaxError(f"Unknown optimization level '{level}' (expected 0, 1 or 2)")
+        self.level = int(level)
+        self.verify = verify
+        self.passes = [(name, run) for name, min_level, run in PASSES
+                       if min_level <= self.level and name not in disabled]
+
+    def run(self, chunk, name="<main>"):
+        if not chunk.code:
+            return chunk
+        if self.verify:
+            verify_chunk(chunk, name)
+        for pass_name, run in self.passes:
+            run(chunk)
+            if self.verify:
+                verify_chunk(chunk, f"{name} after {pass_name}")
+        return chunk
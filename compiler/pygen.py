@@ -0,0 +1,317 @@
+import keyword
+from . import ast_nodes as ast
+from .lexer import TokenType
+
+# Python backend (@meta {"backend": "py"}).
+#
+# Every FunctionDef is translated into the source of a factory function. The
+# VM execs that source once per run and calls the factory with its runtime
+# helpers (runtime/vm/native.py); the factory returns a generator function
+# that takes the bound frame slots as positional arguments. Suspension points
+# (yield statements, loop back-edges over budget, calls into interpreted
+# functions) are generator yields, so the VM can park a running function
+# between ticks exactly like a bytecode frame.
+#
+# Executed code is counted per basic block: every AST node stands for about
+# one bytecode instruction, and each straight-line run of statements adds
+# its count (`count(n)`) before control leaves it. Loop back-edges add the
+# rest of the body together with the loop's own instructions and check the
+# slice budget (`tick(n)`), so instruction counts and limits keep their
+# meaning when a function runs natively.
+
+class UnsupportedConstruct(Exception):
+    """Raised for code the Python backend does not translate; the function stays interpreted."""
+
+_ARITHMETIC = {
+    TokenType.PLUS: "+",
+    TokenType.MINUS: "-",
+    TokenType.STAR: "*",
+    TokenType.SLASH: "/",
+    TokenType.EQUAL_EQUAL: "==",
+    TokenType.BANG_EQUAL: "!=",
+}
+
+# Ordering comparisons evaluate to False when either side is None, like the opcodes
+_ORDERING = {
+    TokenType.GREATER: ">",
+    TokenType.GREATER_EQUAL: ">=",
+    TokenType.LESS: "<",
+    TokenType.LESS_EQUAL: "<=",
+}
+
+class PythonGenerator:
+    """
+    Translates one function into Python source.
+
+    Locals become the generator's parameters L0..Ln in frame slot order, so
+    CallingConvention binding is reused unchanged. Globals are read through
+    the slot array of the VM's GlobalTable; G<n> names hold the slot indices
+    resolved when the factory runs. Calls go through the `call` helper, which
+    returns a Pending object for user functions, resumed with `yield from`.
+    """
+
+    def __init__(self, func_def, local_names):
+        self.func_def = func_def
+        self.local_slots = {name: i for i, name in enumerate(local_names)}
+        self.locals_count = len(local_names)
+        self.global_slots = {} # name -> index of its G<n> variable
+        self.body = []
+        self.temp_count = 0
+        self.current_line = func_def.line or 0
+        self.loop_depth = 0
+        self.weight = 0 # instructions of the current straight-line run not counted yet
+        self.loop_weights = [] # per enclosing loop, instructions of one iteration outside its body
+
+    def generate(self):
+        """Returns (source, lines) where lines[i] is the TML line of generated line i + 1."""
+        # Frames of functions with inlined calls have more slots (compiler/inliner.py); *_ takes them
+        params = ", ".join([f"L{i}" for i in range(self.locals_count)] + ["*_"])
+        self.indent = 2
+        for stmt in self.func_def.body:
+            self.visit(stmt)
+        if not self.func_def.body or not isinstance(self.func_def.body[-1], ast.ReturnStmt):
+            self.weight += 1 # the implicit RETURN_NONE
+            self.flush()
+            self.emit("return None")
+        self.emit("yield  # makes the function a generator")
+
+        line = self.func_def.line or 0
+        header = [
+            ("def make(rt):", line),
+            ("    g = rt.slots", line),
+            ("    UNDEFINED, Pending = rt.UNDEFINED, rt.Pending", line),
+            ("    missing, undefined, call, call_kw = rt.missing, rt.undefined, rt.call, rt.call_kw", line),
+            ("    tick, count, index_get, index_set, set_attr = rt.tick, rt.count, rt.index_get, rt.index_set, rt.set_attr",
+             line),
+            ("    build_map, range_loop, range_builtin = rt.build_map, rt.range_loop, rt.range_builtin", line),
+        ]
+        for name, idx in self.global_slots.items():
+            header.append((f"    G{idx} = rt.slot({name!r})", line))
+        header.append((f"    def fn({params}):", line))
+
+        source = header + self.body + [("    return fn", line)]
+        return "\n".join(text for text, _ in source) + "\n", [l for _, l in source]
+
+    def emit(self, text):
+        self.body.append(("    " * self.indent + text, self.current_line))
+
+    def temp(self, prefix):
+        self.temp_count += 1
+        return f"_{prefix}{self.temp_count}"
+
+    def global_ref(self, name):
+        idx = self.global_slots.get(name)
+        if idx is None:
+            idx = self.global_slots[name] = len(self.global_slots)
+        return f"G{idx}"
+
+    def block(self, statements):
+        self.indent += 1
+        start = len(self.body)
+        for stmt in statements:
+            self.visit(stmt)
+        self.flush()
+        if len(self.body) == start:
+            self.emit("pass")
+        self.indent -= 1
+
+    def flush(self):
+        # Counts the straight-line run that ends here
+        if self.weight:
+            self.emit(f"count({self.weight})")
+            self.weight = 0
+
+    def back_edge(self):
+        # Loop back-edges are the budget check points, as in the interpreter
+        self.emit(f"if tick({self.weight + self.loop_weights[-1]}): yield")
+        self.weight = 0
+
+    def visit(self, node):
+        self.weight += 1
+        if node.line:
+            self.current_line = node.line
+        method = getattr(self, f"visit_{type(node).__name__}", None)
+        if method is None:
+            raise UnsupportedConstruct(f"{type(node).__name__} at line {self.current_line}")
+        return method(node)
+
+    # Statements
+
+    def visit_FunctionDef(self, node):
+        raise UnsupportedConstruct(f"nested function '{node.name}' at line {self.current_line}")
+
+    def visit_VarDecl(self, node):
+        self.emit(f"L{self.local_slots[node.name]} = {self.visit(node.expression)}")
+
+    def visit_VarAssign(self, node):
+        target = node.target
+        if isinstance(target, ast.GetExpr):
+            self.emit(f"set_attr({self.visit(target.object)}, {target.name!r}, {self.visit(node.expression)})")
+        elif isinstance(target, ast.IndexExpr):
+            # The value is evaluated before the container, as in compile_assign_target
+            value = self.temp("v")
+            self.emit(f"{value} = {self.visit(node.expression)}")
+            self.emit(f"index_set({self.visit(target.object)}, {self.visit(target.index)}, {value})")
+        elif isinstance(target, ast.VariableExpr):
+            slot = self.local_slots.get(target.name)
+            if slot is not None:
+                self.emit(f"L{slot} = {self.visit(node.expression)}")
+            else:
+                ref = self.global_ref(target.name)
+                value = self.temp("v")
+                self.emit(f"{value} = {self.visit(node.expression)}")
+                self.emit(f"if g[{ref}] is UNDEFINED: undefined({ref})")
+                self.emit(f"g[{ref}] = {value}")
+        else:
+            raise UnsupportedConstruct(f"assignment target at line {self.current_line}")
+
+    def visit_IfStmt(self, node):
+        # Conditions are counted up front, as if every one of them were tested
+        condition = self.visit(node.condition)
+        elif_conditions = [self.visit(c) for c, _ in node.elif_branches]
+        self.flush()
+        self.emit(f"if {condition}:")
+        self.block(node.then_branch)
+        for condition, (_, body) in zip(elif_conditions, node.elif_branches):
+            self.emit(f"elif {condition}:")
+            self.block(body)
+        if node.else_branch:
+            self.emit("else:")
+            self.block(node.else_branch)
+
+    def visit_WhileStmt(self, node):
+        start = self.weight
+        condition = self.visit(node.condition)
+        # Each further iteration tests the condition again and jumps back
+        iteration = self.weight - start + 1
+        self.flush()
+        self.emit(f"while {condition}:")
+        self.loop_body(node.body, iteration)
+
+    def visit_ForStmt(self, node):
+        iterable = node.iterable
+        if (isinstance(iterable, ast.CallExpr) and isinstance(iterable.callee, ast.VariableExpr)
+                and iterable.callee.name == "range" and "range" not in self.local_slots
+                and not iterable.keyword_arguments and 1 <= len(iterable.arguments) <= 3):
+            # Same as CALL_RANGE: the range builtin loops over a Python range, anything else is called
+            callee, args = self.temp("c"), self.temp("a")
+            self.emit(f"{callee} = {self.visit(iterable.callee)}")
+            self.emit(f"{args} = (" + "".join(f"{self.visit(a)}, " for a in iterable.arguments) + ")")
+            result = self.temp("r")
+            call = f"({result} if type({result} := call({callee}, {args})) is not Pending else (yield from {result}.gen))"
+            source = f"(range_loop({args}) if {callee} is range_builtin else {call})"
+        else:
+            source = self.visit(iterable)
+        self.flush()
+        self.emit(f"for L{self.local_slots[node.item_name]} in {source}:")
+        # FOR_ITER, the store of the item and the jump back
+        self.loop_body(node.body, 3)
+
+    def loop_body(self, body, iteration):
+        self.loop_depth += 1
+        self.loop_weights.append(iteration)
+        self.indent += 1
+        for stmt in body:
+            self.visit(stmt)
+        self.back_edge()
+        self.indent -= 1
+        self.loop_weights.pop()
+        self.loop_depth -= 1
+
+    def visit_BreakStmt(self, node):
+        if not self.loop_depth:
+            raise UnsupportedConstruct(f"'break' outside of loop at line {self.current_line}")
+        self.flush()
+        self.emit("break")
+
+    def visit_ContinueStmt(self, node):
+        if not self.loop_depth:
+            raise UnsupportedConstruct(f"'continue' outside of loop at line {self.current_line}")
+        self.back_edge()
+        self.emit("continue")
+
+    def visit_ExprStmt(self, node):
+        self.emit(self.visit(node.expression))
+
+    def visit_ReturnStmt(self, node):
+        value = self.visit(node.expression) if node.expression else "None"
+        self.flush()
+        self.emit(f"return {value}")
+
+    def visit_YieldStmt(self, node):
+        self.flush()
+        self.emit("yield")
+
+    # Expressions
+
+    def visit_LiteralExpr(self, node):
+        if node.value is None or isinstance(node.value, (bool, int, float, str)):
+            return repr(node.value)
+        raise UnsupportedConstruct(f"literal {node.value!r} at line {self.current_line}")
+
+    def visit_ListExpr(self, node):
+        return "[" + ", ".join(self.visit(e) for e in node.elements) + "]"
+
+    def visit_DictExpr(self, node):
+        if not node.keys:
+            return "{}"
+        # BUILD_MAP inserts pairs last to first; build_map keeps that order
+        items = "".join(f"{self.visit(k)}, {self.visit(v)}, " for k, v in zip(node.keys, node.values))
+        return f"build_map({items})"
+
+    def visit_VariableExpr(self, node):
+        slot = self.local_slots.get(node.name)
+        if slot is not None:
+            return f"L{slot}"
+        ref = self.global_ref(node.name)
+        value = self.temp("g")
+        return f"({value} if ({value} := g[{ref}]) is not UNDEFINED else missing({ref}))"
+
+    def visit_BinaryExpr(self, node):
+        op = node.operator
+        if op == TokenType.AND:
+            return f"({self.visit(node.left)} and {self.visit(node.right)})"
+        if op == TokenType.OR:
+            return f"({self.visit(node.left)} or {self.visit(node.right)})"
+        if op in _ARITHMETIC:
+            return f"({self.visit(node.left)} {_ARITHMETIC[op]} {self.visit(node.right)})"
+        if op in _ORDERING:
+            # `&` evaluates both sides, so operands run exactly once and in order
+            a, b = self.temp("a"), self.temp("b")
+            return (f"(({a} {_ORDERING[op]} {b}) if (({a} := {self.visit(node.left)}) is not None)"
+                    f" & (({b} := {self.visit(node.right)}) is not None) else False)")
+        raise UnsupportedConstruct(f"binary operator {op} at line {self.current_line}")
+
+    def visit_UnaryExpr(self, node):
+        if node.operator == TokenType.MINUS:
+            return f"(-{self.visit(node.right)})"
+        if node.operator in (TokenType.BANG, TokenType.NOT):
+            return f"(not {self.visit(node.right)})"
+        raise UnsupportedConstruct(f"unary operator {node.operator} at line {self.current_line}")
+
+    def visit_CallExpr(self, node):
+        callee = self.visit(node.callee)
+        args = "".join(f"{self.visit(a)}, " for a in node.arguments)
+        if node.keyword_arguments:
+            kwargs = "".join(f"{name!r}, {self.visit(v)}, " for name, v in node.keyword_arguments.items())
+            invocation = f"call_kw({callee}, ({args}), build_map({kwargs}))"
+        else:
+            invocation = f"call({callee}, ({args}))"
+        result = self.temp("r")
+        return f"({result} if type({result} := {invocation}) is not Pending else (yield from {result}.gen))"
+
+    def visit_GetExpr(self, node):
+        obj = self.visit(node.object)
+        if node.name.isidentifier() and not keyword.iskeyword(node.name):
+            return f"{obj}.{node.name}"
+        return f"getattr({obj}, {node.name!r})"
+
+    def visit_IndexExpr(self, node):
+        return f"index_get({self.visit(node.object)}, {self.visit(node.index)})"
+
+def generate_python(func_def, local_names):
+    """
+    Translates a FunctionDef into Python factory source.
+    Returns (source, lines); raises UnsupportedConstruct if the function has to stay interpreted.
+    """
+    return PythonGenerator(func_def, local_names).generate()
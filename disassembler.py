@@ -1,8 +1,8 @@
-import pickle
 import os
 import sys
 from compiler.opcodes import OpCode
 from compiler.base import Chunk, FunctionObject
+from compiler import bytecode_format
 
 class Disassembler:
     def __init__(self, output=sys.stdout):
@@ -14,6 +14,11 @@ class Disassembler:
             print("Empty chunk.", file=self.output)
             return
 
+        inlined = chunk.metadata.get("inlined")
+        if inlined:
+            calls = ", ".join(f"{callee} x{count}" for callee, count in inlined.items())
+            print(f"Inlined calls: {calls}", file=self.output)
+
         ip = 0
         while ip < len(chunk.code):
             self.disassemble_instruction(chunk, ip)
@@ -26,7 +31,7 @@ class Disassembler:
 
     def disassemble_instruction(self, chunk, ip):
         op, arg = chunk.code[ip]
-        op_name = op.name.ljust(15)
+        op_name = op.name.ljust(27)
         
         line_prefix = f"{ip:04d}  "
         
@@ -43,12 +48,38 @@ class Disassembler:
         elif op == OpCode.CALL:
             print(f"{line_prefix}{op_name} {arg:04d} (args)", file=self.output)
             
-        elif op in (OpCode.GET_ATTR, OpCode.SET_ATTR):
+        elif op in (OpCode.GET_ATTR, OpCode.SET_ATTR, OpCode.CALL_ATTR):
             const_val = chunk.constants[arg]
             print(f"{line_prefix}{op_name} {arg:04d} (attr: {const_val})", file=self.output)
+
+        # Superinstructions
+        elif op == OpCode.GET_GLOBAL_ATTR:
+            name, attr = chunk.constants[arg[0]], chunk.constants[arg[1]]
+            print(f"{line_prefix}{op_name} {arg[0]:04d} {arg[1]:04d} ({name}.{attr})", file=self.output)
+
+        elif op == OpCode.CALL_POP:
+            print(f"{line_prefix}{op_name} {arg:04d} (args, result dropped)", file=self.output)
+
+        elif op == OpCode.BINARY_CONST:
+            binop, const_idx = arg
+            print(f"{line_prefix}{op_name} {binop.name} {const_idx:04d} ({chunk.constants[const_idx]})", file=self.output)
+
+        elif op == OpCode.BINARY_LOCALS:
+            binop, a, b = arg
+            print(f"{line_prefix}{op_name} {binop.name} {a:04d} {b:04d}", file=self.output)
+
+        elif op == OpCode.COMPARE_JUMP_IF_FALSE:
+            cmp, target = arg
+            print(f"{line_prefix}{op_name} {cmp.name} (target: {target:04d})", file=self.output)
+
+        elif op == OpCode.COMPARE_CONST_JUMP_IF_FALSE:
+            cmp, const_idx, target = arg
+            print(f"{line_prefix}{op_name} {cmp.name} {const_idx:04d} ({chunk.constants[const_idx]}) (target: {target:04d})", file=self.output)
             
         else:
-            if arg is not None:
+            if isinstance(arg, tuple):
+                print(f"{line_prefix}{op_name} {arg}", file=self.output)
+            elif arg is not None:
                 print(f"{line_prefix}{op_name} {arg:04d}", file=self.output)
             else:
                 print(f"{line_prefix}{op_name}", file=self.output)
@@ -70,7 +101,7 @@ def main():
             print("No cache directory found. Run main.py first.")
             return
         
-        files = [os.path.join(cache_dir, f) for f in os.listdir(cache_dir) if f.endswith(".bin")]
+        files = [os.path.join(cache_dir, f) for f in os.listdir(cache_dir) if f.endswith(".tmlc")]
         if not files:
             print("No cache files found. Run main.py first.")
             return
@@ -80,19 +111,16 @@ def main():
         print(f"Loading latest cache: {cache_file}")
 
     try:
-        with open(cache_file, "rb") as f:
-            data = pickle.load(f)
-            chunk = data.get('chunk')
-            functions = data.get('functions')
-            
-            if output_file:
-                with open(output_file, "w", encoding="utf-8") as out:
-                    dis = Disassembler(output=out)
-                    dis.disassemble(chunk, functions)
-                print(f"Disassembly saved to: {output_file}")
-            else:
-                dis = Disassembler()
+        chunk, functions = bytecode_format.load(cache_file, lazy=False)
+
+        if output_file:
+            with open(output_file, "w", encoding="utf-8") as out:
+                dis = Disassembler(output=out)
                 dis.disassemble(chunk, functions)
+            print(f"Disassembly saved to: {output_file}")
+        else:
+            dis = Disassembler()
+            dis.disassemble(chunk, functions)
     except Exception as e:
         print(f"Error loading cache file: {e}")
 
@@ -34,7 +34,9 @@ from PyQt6.QtCore import Qt
 from runtime.controller import RuntimeController
 from ui.manager_window import MacroManagerWindow
 from services.hotkey_service import HotkeyService
+from services.warmup import WarmupService
 from services.config_manager import ConfigManager
+from services import bundles
 
 class TMLApp:
     def __init__(self):
@@ -54,6 +56,10 @@ class TMLApp:
         self.update_hotkey_bindings()
         self.hotkey_service.start()
         
+        # Compile the macro library into the cache in the background, hotkey-bound macros first
+        self.warmup_service = WarmupService(self.controller)
+        self.warmup_service.progress.connect(self.manager_win.on_warmup_progress)
+        
         # Connect signals
         self.manager_win.on_hotkeys_updated = self.update_hotkey_bindings
         
@@ -62,6 +68,9 @@ class TMLApp:
         self.stdout_redir = StdoutRedirector()
         self.stdout_redir.text_written.connect(self.manager_win.on_stdout_written)
         sys.stdout = self.stdout_redir
+        
+        # After the redirect, so warm-up messages reach the console
+        self.warmup_service.start()
 
     def apply_dark_theme(self):
         palette = QPalette()
@@ -85,15 +94,8 @@ class TMLApp:
                 self.controller.stop_macro(filename)
             else:
                 print(f"Hotkey: Starting {filename}")
-                path = os.path.join("examples", filename)
-                if not os.path.exists(path):
-                    # Try recursive search if not found in root examples
-                    for root, dirs, files in os.walk("examples"):
-                        if filename in files:
-                            path = os.path.join(root, filename)
-                            break
-                
-                if os.path.exists(path):
+                path = bundles.find_macro(filename)
+                if path is not None:
                     with open(path, "r", encoding="utf-8") as f:
                         source = f.read()
                     
@@ -102,12 +104,14 @@ class TMLApp:
                     overlay = HUDOverlay()
                     self.controller.set_overlay(filename, overlay)
                     
-                    self.controller.add_runtime(filename, source)
+                    # A fresh precompiled bundle beside the source skips compiling (python precompile.py)
+                    self.controller.add_runtime(filename, source, bundle=bundles.bundle_path(path))
 
     def run(self):
         self.manager_win.show()
         res = self.app.exec()
         self.hotkey_service.stop()
+        self.warmup_service.stop()
         sys.exit(res)
 
 if __name__ == "__main__":
@@ -0,0 +1,81 @@
+"""
+Ahead-of-time compiler of macros. Every .tml file is compiled into a bundle
+(.tmlc) beside it, which hotkeys and the macro manager load instead of
+compiling the source (services/bundles.py). A bundle records the hash of
+its source, so an edited macro is compiled as usual until it is rebuilt,
+and a bundle of another compiler version is never loaded. Macros are
+compiled exactly as MacroRuntime compiles them, with the same builtins and
+compile options.
+
+Usage: python precompile.py [file_or_directory ...] [--check] [--force]
+  (default: examples/)
+  --check  only list missing and out-of-date bundles; exit status 1 if any
+  --force  rebuild fresh bundles too
+"""
+import contextlib
+import io
+import os
+import sys
+from runtime import MacroRuntime
+from services import bundles
+
+def collect(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names) if name.endswith(".tml"))
+        elif os.path.exists(path):
+            files.append(path)
+    return sorted(files)
+
+def macro_name(path):
+    """The name the manager and the hotkeys give the macro: its path below examples/."""
+    relative = os.path.relpath(path, bundles.MACROS_DIR)
+    return path if relative.startswith("..") else relative.replace(os.sep, "/")
+
+def build(path, options, force=False):
+    """(status, detail) for `path`: "fresh", "built" or "failed"."""
+    with open(path, "r", encoding="utf-8") as f:
+        source = f.read()
+    target = bundles.bundle_path(path)
+    if not force and bundles.is_fresh(target, source, options):
+        return "fresh", ""
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            chunk, functions, _, _ = MacroRuntime.compile_source(macro_name(path), source, options["builtins"],
+                                                                 options["opt"])
+    except Exception as e:
+        return "failed", (log.getvalue() + str(e)).strip()
+    size = bundles.save(target, source, chunk, functions, options)
+    return "built", f"{size / 1024:.0f} KB"
+
+def main(args):
+    check = "--check" in args
+    force = "--force" in args
+    args = [arg for arg in args if arg not in ("--check", "--force")]
+    files = collect(args or [bundles.MACROS_DIR])
+    options = MacroRuntime.cache_options_for()
+
+    counts = {"fresh": 0, "built": 0, "failed": 0, "stale": 0}
+    for path in files:
+        if check:
+            with open(path, "r", encoding="utf-8") as f:
+                fresh = bundles.is_fresh(bundles.bundle_path(path), f.read(), options)
+            status, detail = ("fresh", "") if fresh else ("stale", "missing or out of date")
+        else:
+            try:
+                status, detail = build(path, options, force)
+            except Exception as e:
+                status, detail = "failed", str(e)
+        counts[status] += 1
+        if status != "fresh":
+            print(f"{status.upper():<6} {os.path.relpath(path)}" + (f": {detail}" if detail else ""))
+
+    summary = ", ".join(f"{count} {status}" for status, count in counts.items() if count)
+    print(f"{len(files)} macros: {summary or 'none found'}")
+    return 1 if counts["failed"] or counts["stale"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
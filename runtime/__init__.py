@@ -6,24 +6,32 @@ from compiler.compiler import Compiler
 from compiler.lexer import Lexer
 from compiler.parser import Parser
 from compiler.analyzer import StaticAnalyzer
+from compiler.function_cache import FunctionCache
+from compiler import ast_nodes as ast
 from services.cache_manager import BytecodeCache
-from .stdlib import get_builtins
+from services import bundles
+from .stdlib import get_builtins, BUILTIN_NAMES
 
 class MacroRuntime:
-    _cache = BytecodeCache()
+    _cache = BytecodeCache() # shared by all runtimes, so its in-memory programs serve every restart
     _cleanup_done = False
 
-    def __init__(self, name, source, controller=None):
-        # Periodic cache cleanup (only once per run)
+    def __init__(self, name, source, controller=None, opt=None, bundle=None):
+        # Periodic cache cleanup (only once per run), off the thread that starts the macro
         if not MacroRuntime._cleanup_done:
-            MacroRuntime._cache.cleanup()
+            MacroRuntime._cache.start_cleanup()
             MacroRuntime._cleanup_done = True
 
         self.name = name
         self.source = source
         self.controller = controller
+        self.opt = opt # optimization level overriding @meta "opt"; None keeps the macro's own
+        self.bundle = bundle # precompiled .tmlc of the source (see services/bundles.py), used if fresh
         self.vm = VM()
         self.error = None
+        self.function_cache = FunctionCache() # functions of earlier compiles, reused by hot_reload
+        self.reload_lock = threading.Lock() # one hot-reload compile at a time
+        self.pending_reload = None # compiled reload waiting for the run loop (see hot_reload)
         
         # Internal state placeholders (will be filled by get_builtins)
         self.tick_obj = None
@@ -34,31 +42,27 @@ class MacroRuntime:
         # Setup globals from builtins.py
         self.vm.globals.update(get_builtins(self))
         
-        # Try to load from cache
+        # Try to load from cache, then from a precompiled bundle
+        self.from_bundle = False
         try:
-            self.chunk, self.functions = self._cache.get(source)
+            self.cache_options = self.cache_options_for(opt)
             
-            if self.chunk is None:
-                # Compile if not in cache
+            def load_bundle():
+                program = bundles.load(bundle, source, self.cache_options) if bundle else None
+                self.from_bundle = program is not None
+                return program
+            
+            def compile_program():
+                # Compile if not in cache; runtimes starting the same macro at once wait for this one
                 print(f"[{self.name}] Compiling source...")
-                lexer = Lexer(source)
-                tokens = lexer.tokenize()
-                parser = Parser(tokens)
-                ast_tree = parser.parse()
-                
-                # 2. Аналіз коду на етапі побудови AST
-                print(f"[{self.name}] Analyzing AST...")
-                analyzer = StaticAnalyzer(builtins=self.vm.globals.keys())
-                if not analyzer.analyze(ast_tree):
-                    print(f"[{self.name}] Warning: Static analysis found potential issues.")
-
-                compiler = Compiler()
-                self.chunk = compiler.compile(ast_tree)
-                self.functions = compiler.functions
-                
-                # Save to cache
-                self._cache.set(source, self.chunk, self.functions)
-            else:
+                return self._compile(source)[:2]
+            
+            # Runtimes of the same macro share the compiled program; the VM keeps its own state beside it
+            self.chunk, self.functions, cached = self._cache.get_or_compile(
+                source, compile_program, self.cache_options, load_bundle)
+            if self.from_bundle:
+                print(f"[{self.name}] Loaded precompiled bundle.")
+            elif cached:
                 print(f"[{self.name}] Loaded from cache.")
         except Exception as e:
             self.error = str(e)
@@ -74,6 +78,113 @@ class MacroRuntime:
         self.event_queue = []
         self.event_lock = threading.Lock()
 
+    def _compile(self, source):
+        """Compiles `source`, reusing unchanged functions of earlier compiles; returns what compile_source does."""
+        return self.compile_source(self.name, source, self.vm.globals.keys(), self.opt, self.function_cache)
+
+    @staticmethod
+    def compile_source(name, source, builtins, opt=None, function_cache=None):
+        """
+        Lexer, parser, static analysis and compiler for the macro `name`;
+        returns (chunk, functions, AST, constants), where `constants` are the
+        top-level names the compiler folded into the code (compiler/folding.py).
+        """
+        lexer = Lexer(source)
+        tokens = lexer.tokenize()
+        parser = Parser(tokens)
+        ast_tree = parser.parse()
+        
+        # 2. Аналіз коду на етапі побудови AST
+        print(f"[{name}] Analyzing AST...")
+        analyzer = StaticAnalyzer(builtins=builtins)
+        if not analyzer.analyze(ast_tree):
+            print(f"[{name}] Warning: Static analysis found potential issues.")
+
+        compiler = Compiler(opt=opt, builtins=builtins, function_cache=function_cache)
+        chunk = compiler.compile(ast_tree)
+        constants = compiler.folding.constants if compiler.folding else {}
+        return chunk, compiler.functions, ast_tree, constants
+
+    @classmethod
+    def cache_options_for(cls, opt=None):
+        """
+        The cache options of a runtime started with `opt`, without starting
+        one: everything besides the source that the compiler reads, the
+        optimization level and the host globals.
+        """
+        return {"opt": opt, "builtins": tuple(sorted(BUILTIN_NAMES))}
+
+    @classmethod
+    def precompile(cls, name, source, opt=None, bundle=None):
+        """
+        Puts the compiled `source` into the shared cache the way a runtime
+        started on it would (taking a fresh `bundle` as it is), with every
+        function body decoded, so that runtime starts without compiling or
+        decoding (see services/warmup.py). Returns True if it was compiled.
+        """
+        options = cls.cache_options_for(opt)
+        compile_program = lambda: cls.compile_source(name, source, options["builtins"], opt)[:2]
+        load_bundle = lambda: bundles.load(bundle, source, options) if bundle else None
+        _, functions, cached = cls._cache.get_or_compile(source, compile_program, options, load_bundle)
+        for func in functions.values():
+            func.chunk # a function of a .tmlc file decodes its body on first use (compiler/bytecode_format.py)
+        return not cached
+
+    def hot_reload(self, source):
+        """
+        Compiles a new version of the running macro and queues it for the run
+        loop, which swaps it in before its next tick (see apply_reload).
+        Unchanged functions come out of the function cache. Returns False if
+        the source does not compile; the macro keeps running either way.
+        """
+        with self.reload_lock:
+            try:
+                chunk, functions, ast_tree, constants = self._compile(source)
+            except Exception as e:
+                print(f"[{self.name}] Hot reload failed: {e}")
+                return False
+        # Top-level `let`s of plain values, for the globals the old version did not have
+        new_globals = {stmt.name: stmt.expression.value for stmt in ast_tree.statements
+                       if isinstance(stmt, ast.VarDecl) and isinstance(stmt.expression, ast.LiteralExpr)}
+        with self.event_lock:
+            self.pending_reload = (source, chunk, functions, new_globals, constants)
+        return True
+
+    def apply_reload(self):
+        """
+        Swaps in a reload queued by hot_reload; called by the run loop between
+        ticks, so no VM code is running. Only the functions whose compiled
+        code or position changed are replaced, globals keep their values
+        (except constants folded into the new code) and top-level code does
+        not run again. Frames suspended inside a replaced
+        function (yield) finish on its old code. A change of @meta needs a
+        restart and is refused. Returns True if the reload was applied.
+        """
+        with self.event_lock:
+            pending, self.pending_reload = self.pending_reload, None
+        if pending is None:
+            return False
+        source, chunk, functions, new_globals, constants = pending
+        meta = lambda c: {key: value for key, value in c.metadata.items() if key != "inlined"} # minus the inliner's counts
+        if meta(chunk) != meta(self.chunk):
+            print(f"[{self.name}] Hot reload skipped: @meta changed, restart the macro to apply it.")
+            return False
+
+        before = set(self.vm.functions)
+        suspended = self.vm.active_functions()
+        changed, removed = self.vm.reload_functions(functions)
+        self.functions = self.vm.functions
+        self.vm.reload_globals(new_globals, constants)
+        self.source = source
+
+        added = sum(1 for name in changed if name not in before)
+        print(f"[{self.name}] Hot reload: {len(changed) - added} changed, {added} added, {len(removed)} removed, "
+              f"{len(functions) - len(changed)} unchanged.")
+        running = suspended & (set(changed) | set(removed))
+        if running:
+            print(f"[{self.name}] Suspended calls of {', '.join(sorted(running))} finish on the old code.")
+        return True
+
     @property
     def is_running(self):
         return self.thread and self.thread.is_alive()
@@ -140,6 +251,10 @@ class MacroRuntime:
             min_sleep = meta.get("min_sleep", 0.005)
 
             while not self.should_exit:
+                # 4.0 Hot reload (between ticks)
+                if self.pending_reload is not None and self.apply_reload():
+                    has_on_tick = tick_func in self.functions or tick_func in self.vm.globals
+
                 # 4.1 Process events (hotkeys, etc.)
                 self.process_events()
 
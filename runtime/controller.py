@@ -26,12 +26,17 @@ class RuntimeController:
         with self.lock:
             return self.overlays.get(name)
 
-    def add_runtime(self, name, source):
-        """Compiles and starts a new runtime instance in a background thread."""
+    def add_runtime(self, name, source, opt=None, bundle=None):
+        """
+        Compiles and starts a new runtime instance in a background thread.
+        `opt` overrides the optimization level of the macro (@meta "opt").
+        `bundle` is the path of its precompiled .tmlc, loaded instead of
+        compiling if it is fresh (see services/bundles.py).
+        """
         def task():
             try:
                 # Compilation happens here (inside the thread)
-                runtime = MacroRuntime(name, source, self)
+                runtime = MacroRuntime(name, source, self, opt=opt, bundle=bundle)
                 with self.lock:
                     self.runtimes[name] = runtime
                 runtime.start()
@@ -40,6 +45,40 @@ class RuntimeController:
 
         threading.Thread(target=task, name=f"TML-Comp-{name}", daemon=True).start()
 
+    def precompile(self, name, source, bundle=None):
+        """
+        Compiles `source` into the bytecode cache without starting it, so a
+        later add_runtime of the macro does not compile (see
+        services/warmup.py). Runs on the caller's thread; returns True if it
+        was compiled rather than found cached.
+        """
+        return MacroRuntime.precompile(name, source, bundle=bundle)
+
+    def hot_reload(self, name, source):
+        """
+        Recompiles `source` for the running macro `name` in a background
+        thread; the macro swaps in the functions that changed before its next
+        tick and keeps its globals (see MacroRuntime.apply_reload). Returns
+        False if no macro of that name is running.
+        """
+        with self.lock:
+            runtime = self.runtimes.get(name)
+        if runtime is None or not runtime.is_running:
+            return False
+
+        def task():
+            try:
+                runtime.hot_reload(source)
+            except Exception as e:
+                print(f"Failed to hot-reload runtime {name}: {e}")
+
+        threading.Thread(target=task, name=f"TML-Reload-{name}", daemon=True).start()
+        return True
+
+    def cache_stats(self):
+        """Counters of the bytecode cache shared by all runtimes (see BytecodeCache)."""
+        return MacroRuntime._cache.stats()
+
     def cleanup_finished(self):
         """Removes runtimes that have finished execution."""
         with self.lock:
@@ -20,6 +20,22 @@ from .window import WindowWrapper
 from .input import MouseWrapper, KeyWrapper
 from .ui import UIWrapper
 from .macro import MacroWrapper, TickWrapper
+from ..vm.base import range_of
+
+# Names of the globals get_builtins defines. The bytecode cache keys compiled
+# programs by them (MacroRuntime.cache_options_for), so they are known without
+# building the stdlib objects.
+BUILTIN_NAMES = (
+    "mouse", "key", "keyboard", "time", "math", "random", "window", "win", "screen",
+    "system", "net", "sound", "storage", "ui", "tick", "macro",
+    "left", "right", "middle",
+    *[f"K_{c}" for c in "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"],
+    *[f"K_F{i}" for i in range(1, 13)],
+    "K_ENTER", "K_ESC", "K_SPACE", "K_TAB", "K_BACKSPACE", "K_DELETE", "K_INSERT",
+    "K_HOME", "K_END", "K_PAGE_UP", "K_PAGE_DOWN", "K_UP", "K_DOWN", "K_LEFT", "K_RIGHT",
+    "K_SHIFT", "K_CTRL", "K_ALT", "K_CAPS_LOCK",
+    "exit", "stop", "sleep", "int", "float", "str", "len", "type", "print", "range", "Key", "None",
+)
 
 def get_builtins(runtime_instance):
     """Returns a dictionary of builtin objects and functions for the VM."""
@@ -46,7 +62,7 @@ def get_builtins(runtime_instance):
     runtime_instance.sound_obj = sound_obj
     runtime_instance.storage_obj = storage_obj
 
-    return {
+    builtins = {
         "mouse": mouse_obj,
         "key": key_obj,
         "keyboard": key_obj,
@@ -94,7 +110,8 @@ def get_builtins(runtime_instance):
         "len": len,
         "type": type,
         "print": print,
-        "range": range,
+        "range": range_of,
         "Key": keyboard.Key,
         "None": None,
     }
+    return {name: builtins[name] for name in BUILTIN_NAMES}
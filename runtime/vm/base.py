@@ -7,7 +7,42 @@ class VMRuntimeError(Exception):
         super().__init__(self.message)
 
 class CallFrame:
-    def __init__(self, function, ip, stack_start):
+    __slots__ = ("function", "ip", "stack_start", "discard_result")
+
+    def __init__(self, function, ip, stack_start, discard_result=False):
         self.function = function # FunctionObject or None for global
         self.ip = ip
         self.stack_start = stack_start
+        self.discard_result = discard_result # Set by CALL_POP: the return value is not pushed
+
+def range_of(*args):
+    """
+    The `range` builtin: range(*args), with whole float arguments counted as
+    ints, since number literals are floats. CALL_RANGE turns a call of this
+    function in a for loop into a RangeLoop counter.
+    """
+    return range(*[int(a) if type(a) is float and a.is_integer() else a for a in args])
+
+class RangeLoop:
+    """
+    Counter of a `for i in range(...)` loop (CALL_RANGE, FOR_RANGE). `end` is
+    the first value past the last one, so a single comparison ends the loop
+    for either step direction. Also a plain iterator, for FOR_ITER and GET_ITER.
+    """
+    __slots__ = ("current", "end", "step")
+
+    def __init__(self, args):
+        r = range_of(*args)
+        self.current = r.start
+        self.end = r.start + len(r) * r.step
+        self.step = r.step
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        i = self.current
+        if i == self.end:
+            raise StopIteration
+        self.current = i + self.step
+        return i
@@ -0,0 +1,898 @@
+import operator
+from time import perf_counter
+from compiler.opcodes import OpCode
+from compiler import FunctionObject
+from .base import CallFrame, VMRuntimeError, RangeLoop, range_of
+from .globals import UNDEFINED
+from .inline_cache import AttrCache, CallSite, TypeSite
+from .native import native_line
+
+# Handlers return the next ip, or one of these markers when the engine
+# has to leave the inner loop (frame change or suspension).
+RELOAD = -1
+SUSPEND = -2
+
+# Integer value of every opcode by name. Enum attribute access and hashing are
+# slow, so the hot paths below only ever deal with these plain ints.
+OPCODE_VALUES = {op.name: op.value for op in OpCode}
+
+# Pseudo-opcode appended to every decoded chunk so running off the end of the
+# code finishes the frame the same way the switch loop does.
+END = max(OPCODE_VALUES.values()) + 1
+
+# Pseudo-opcode replacing LOOP in functions that may be promoted to the native
+# tier (runtime/vm/tiers.py). Its argument is (target, FunctionTier).
+COUNTED_LOOP = END + 1
+
+# Type feedback (quickening). Ordering comparison sites (LESS, GREATER_EQUAL,
+# ... and the fused compare-and-jumps) decode to the ADAPTIVE pseudo-op, which
+# runs the generic handler and records operand types in a TypeSite. After
+# QUICKEN_AFTER executions with number operands the site is rewritten in place
+# to a specialized variant below, which skips the None checks of the generic
+# handler; sites with other operands go back to the generic opcode. Arithmetic
+# is not specialized: its generic handler is already the bare operation.
+ADAPTIVE = COUNTED_LOOP + 1
+QUICKEN_AFTER = 8
+# Deoptimizations before a site stays generic; each one doubles its warm-up
+MAX_DEOPTS = 4
+
+_QUICKEN_SHAPES = {
+    OPCODE_VALUES["LESS"]: "", OPCODE_VALUES["LESS_EQUAL"]: "",
+    OPCODE_VALUES["GREATER"]: "", OPCODE_VALUES["GREATER_EQUAL"]: "",
+    OPCODE_VALUES["COMPARE_JUMP_IF_FALSE"]: "JUMP",
+    OPCODE_VALUES["COMPARE_CONST_JUMP_IF_FALSE"]: "CONST_JUMP",
+}
+
+# Handler source of the specialized variants, one per shape. The guard is the
+# comparison itself: a TypeError (a None operand, mixed types) restores the
+# stack and deoptimizes, and the generic handler then produces the generic
+# result or error.
+_VARIANT_TEMPLATES = {
+    "": """
+def make(stack, pop, push, deopt):
+    def {name}(base, site, ip):
+        b = pop()
+        try:
+            stack[-1] = stack[-1] {op} b
+        except TypeError:
+            push(b)
+            return deopt(site, base, ip)
+        return ip
+    return {name}
+""",
+    "JUMP": """
+def make(stack, pop, push, deopt):
+    def {name}(base, site, ip):
+        b = pop()
+        a = pop()
+        try:
+            if a {op} b:
+                return ip
+        except TypeError:
+            push(a)
+            push(b)
+            return deopt(site, base, ip)
+        return site.target
+    return {name}
+""",
+    "CONST_JUMP": """
+def make(stack, pop, push, deopt):
+    def {name}(base, site, ip):
+        a = pop()
+        try:
+            if a {op} site.const:
+                return ip
+        except TypeError:
+            push(a)
+            return deopt(site, base, ip)
+        return site.target
+    return {name}
+""",
+}
+
+_ORDERING_SYMBOLS = {"LESS": "<", "LESS_EQUAL": "<=", "GREATER": ">", "GREATER_EQUAL": ">="}
+
+def _variants():
+    # (operator name, shape, feedback, symbol) of every specialized variant
+    for shape in _VARIANT_TEMPLATES:
+        for name, symbol in _ORDERING_SYMBOLS.items():
+            yield name, shape, "FLOAT", symbol
+
+def variant_name(name, shape, feedback):
+    """Name of a specialized variant, e.g. LESS_FLOAT or LESS_CONST_JUMP_FLOAT."""
+    return "_".join(part for part in (name, shape, feedback) if part)
+
+def _compile_variants():
+    variants = {}
+    for value, (name, shape, feedback, symbol) in enumerate(_variants(), ADAPTIVE + 1):
+        full_name = variant_name(name, shape, feedback)
+        namespace = {}
+        source = _VARIANT_TEMPLATES[shape].format(name=full_name.lower(), op=symbol)
+        exec(compile(source, f"<quickened {full_name}>", "exec"), namespace)
+        variants[full_name] = (value, namespace["make"])
+    return variants
+
+# Specialized variant name -> (pseudo-opcode, handler factory)
+QUICKENED = _compile_variants()
+_QUICKENABLE = frozenset((name, shape) for name, shape, _, _ in _variants())
+_LAST_OPCODE = max(value for value, _ in QUICKENED.values())
+
+# Opcodes whose argument is an index into chunk.constants. Decoding replaces
+# the index with the constant itself so handlers never touch the pool.
+_CONST_ARG_OPS = frozenset(OPCODE_VALUES[name] for name in (
+    "PUSH_CONST",
+))
+
+# Attribute reads get an inline cache; attribute writes get the caches of
+# their name so they can invalidate them.
+_ATTR_READ_OPS = frozenset(OPCODE_VALUES[name] for name in ("GET_ATTR", "CALL_ATTR"))
+_ATTR_WRITE_OPS = frozenset(OPCODE_VALUES[name] for name in ("SET_ATTR", "SET_ATTR_POP", "SET_ATTR_FAST"))
+
+# Opcodes whose argument is the constant index of a global name. Decoding
+# links the name to its slot in the VM's GlobalTable.
+_GLOBAL_ARG_OPS = frozenset(OPCODE_VALUES[name] for name in (
+    "DEFINE_GLOBAL", "GET_GLOBAL", "SET_GLOBAL", "SET_GLOBAL_POP", "INC_GLOBAL", "ADD_GLOBAL",
+))
+
+# Operators fused into BINARY_* and COMPARE_* superinstructions
+BINARY_FUNCS = {
+    OpCode.ADD: operator.add,
+    OpCode.SUB: operator.sub,
+    OpCode.MUL: operator.mul,
+    OpCode.DIV: operator.truediv,
+}
+
+COMPARE_FUNCS = {
+    OpCode.EQUAL: operator.eq,
+    OpCode.NOT_EQUAL: operator.ne,
+    OpCode.GREATER: operator.gt,
+    OpCode.GREATER_EQUAL: operator.ge,
+    OpCode.LESS: operator.lt,
+    OpCode.LESS_EQUAL: operator.le,
+}
+
+# Ordering comparisons evaluate to False when either side is None
+_ORDERING_OPS = frozenset((OpCode.GREATER, OpCode.GREATER_EQUAL, OpCode.LESS, OpCode.LESS_EQUAL))
+
+def compare(op, a, b):
+    """Evaluates comparison opcode `op` with the same None handling as the standalone opcodes."""
+    if op in _ORDERING_OPS and (a is None or b is None):
+        return False
+    return COMPARE_FUNCS[op](a, b)
+
+def _attr_caches(vm, name):
+    """Returns the list of inline caches for attribute `name`, shared by every site of the VM."""
+    caches = vm.attr_caches.get(name)
+    if caches is None:
+        caches = vm.attr_caches[name] = []
+    return caches
+
+def _new_attr_cache(vm, name):
+    cache = AttrCache(name)
+    _attr_caches(vm, name).append(cache)
+    return cache
+
+# Superinstruction arguments are tuples; decoding resolves the operator,
+# constant indices, global slots and inline caches inside them.
+def _decode_global_attr(arg, constants, vm):
+    return vm.globals.slot(constants[arg[0]]), _new_attr_cache(vm, constants[arg[1]])
+
+def _decode_binary_const(arg, constants, vm):
+    return BINARY_FUNCS[arg[0]], constants[arg[1]]
+
+def _decode_binary_locals(arg, constants, vm):
+    return BINARY_FUNCS[arg[0]], arg[1], arg[2]
+
+def _decode_call(arg, constants, vm):
+    return CallSite(arg)
+
+def _decode_for_range_global(arg, constants, vm):
+    return vm.globals.slot(constants[arg[0]]), arg[1]
+
+def _decode_compare_jump(arg, constants, vm):
+    return COMPARE_FUNCS[arg[0]], arg[0] in _ORDERING_OPS, arg[1]
+
+def _decode_compare_const_jump(arg, constants, vm):
+    return COMPARE_FUNCS[arg[0]], arg[0] in _ORDERING_OPS, constants[arg[1]], arg[2]
+
+_ARG_DECODERS = {
+    OPCODE_VALUES["CALL"]: _decode_call,
+    OPCODE_VALUES["CALL_POP"]: _decode_call,
+    OPCODE_VALUES["FOR_RANGE_GLOBAL"]: _decode_for_range_global,
+    OPCODE_VALUES["GET_GLOBAL_ATTR"]: _decode_global_attr,
+    OPCODE_VALUES["BINARY_CONST"]: _decode_binary_const,
+    OPCODE_VALUES["BINARY_LOCALS"]: _decode_binary_locals,
+    OPCODE_VALUES["COMPARE_JUMP_IF_FALSE"]: _decode_compare_jump,
+    OPCODE_VALUES["COMPARE_CONST_JUMP_IF_FALSE"]: _decode_compare_const_jump,
+}
+
+def _new_type_site(vm, ops, args, name, shape):
+    # Wraps the instruction just decoded in a TypeSite and switches it to ADAPTIVE
+    site = TypeSite(ops, args, len(ops) - 1, name, shape, QUICKEN_AFTER)
+    arg = site.generic_arg
+    if shape == "JUMP":
+        site.target = arg[2]
+    elif shape == "CONST_JUMP":
+        site.const, site.target = arg[2], arg[3]
+    ops[-1] = ADAPTIVE
+    args[-1] = site
+    vm.type_sites.append(site)
+
+def decode_chunk(chunk, vm):
+    """
+    Flattens chunk.code into parallel lists of integer opcodes and resolved
+    arguments for `vm`. Global names are linked to slots of vm.globals and
+    attribute accesses get inline caches registered in vm.attr_caches.
+    Ordering comparison sites start on ADAPTIVE with a TypeSite
+    registered in vm.type_sites, unless vm.quicken is off.
+    """
+    ops = []
+    args = []
+    constants = chunk.constants
+    globals = vm.globals
+    quicken = vm.quicken
+    for op, arg in chunk.code:
+        value = op._value_
+        ops.append(value)
+        if quicken and value in _QUICKEN_SHAPES:
+            # Fused instructions carry their operator as the first argument
+            name = op.name if not _QUICKEN_SHAPES[value] else arg[0].name
+        else:
+            name = None
+        if value in _CONST_ARG_OPS:
+            arg = constants[arg]
+        elif value in _GLOBAL_ARG_OPS:
+            arg = globals.slot(constants[arg])
+        elif value in _ATTR_READ_OPS:
+            arg = _new_attr_cache(vm, constants[arg])
+        elif value in _ATTR_WRITE_OPS:
+            arg = (constants[arg], _attr_caches(vm, constants[arg]))
+        elif value in _ARG_DECODERS:
+            arg = _ARG_DECODERS[value](arg, constants, vm)
+        args.append(arg)
+        if name is not None and (name, _QUICKEN_SHAPES[value]) in _QUICKENABLE:
+            _new_type_site(vm, ops, args, name, _QUICKEN_SHAPES[value])
+    ops.append(END)
+    args.append(None)
+    return ops, args
+
+def build_dispatch_table(vm):
+    """
+    Creates the handler table for one VM. Every handler has the signature
+    handler(base, arg, ip) -> next_ip, where base is the stack_start of the
+    running frame and ip already points past the current instruction.
+    Handlers close over the VM's stack and frames, so the VM must never rebind them.
+    """
+    stack = vm.stack
+    frames = vm.frames
+    push = stack.append
+    pop = stack.pop
+    extend = stack.extend
+    g = vm.globals.slots
+    global_names = vm.globals.names
+    tiering = vm.tiering
+    tiers = tiering.functions
+
+    def push_const(base, arg, ip):
+        push(arg)
+        return ip
+
+    def push_true(base, arg, ip):
+        push(True)
+        return ip
+
+    def push_false(base, arg, ip):
+        push(False)
+        return ip
+
+    def pop_(base, arg, ip):
+        pop()
+        return ip
+
+    def missing_global(slot):
+        # Unset globals fall back to functions, same as the name-based lookup
+        name = global_names[slot]
+        if name in vm.functions:
+            return vm.functions[name]
+        raise RuntimeError(f"Undefined variable '{name}'")
+
+    def define_global(base, arg, ip):
+        g[arg] = pop()
+        return ip
+
+    def get_global(base, arg, ip):
+        value = g[arg]
+        push(missing_global(arg) if value is UNDEFINED else value)
+        return ip
+
+    def set_global(base, arg, ip):
+        if g[arg] is UNDEFINED:
+            raise RuntimeError(f"Undefined variable '{global_names[arg]}'")
+        g[arg] = stack[-1]
+        return ip
+
+    def set_global_pop(base, arg, ip):
+        if g[arg] is UNDEFINED:
+            raise RuntimeError(f"Undefined variable '{global_names[arg]}'")
+        g[arg] = pop()
+        return ip
+
+    def get_local(base, arg, ip):
+        push(stack[base + arg])
+        return ip
+
+    def set_local(base, arg, ip):
+        stack[base + arg] = stack[-1]
+        return ip
+
+    def set_local_pop(base, arg, ip):
+        stack[base + arg] = pop()
+        return ip
+
+    # Attribute reads go through the site's AttrCache: the bound method of the
+    # cached receiver, else the getter chosen for the receiver's type.
+
+    def get_attr(base, arg, ip):
+        obj = stack[-1]
+        if obj is arg.receiver:
+            arg.hits += 1
+            stack[-1] = arg.bound
+        elif type(obj) is arg.type:
+            arg.hits += 1
+            stack[-1] = arg.getter(obj)
+        else:
+            stack[-1] = arg.miss(obj)
+        return ip
+
+    def invalidate(caches):
+        for cache in caches:
+            cache.invalidate()
+
+    def set_attr(base, arg, ip):
+        name, caches = arg
+        obj = pop()
+        setattr(obj, name, stack[-1])
+        if caches:
+            invalidate(caches)
+        return ip
+
+    def set_attr_pop(base, arg, ip):
+        name, caches = arg
+        obj = pop()
+        setattr(obj, name, pop())
+        if caches:
+            invalidate(caches)
+        return ip
+
+    def set_attr_fast(base, arg, ip):
+        name, caches = arg
+        val = pop()
+        setattr(pop(), name, val)
+        if caches:
+            invalidate(caches)
+        return ip
+
+    def add(base, arg, ip):
+        b = pop()
+        stack[-1] = stack[-1] + b
+        return ip
+
+    def sub(base, arg, ip):
+        b = pop()
+        stack[-1] = stack[-1] - b
+        return ip
+
+    def mul(base, arg, ip):
+        b = pop()
+        stack[-1] = stack[-1] * b
+        return ip
+
+    def div(base, arg, ip):
+        b = pop()
+        stack[-1] = stack[-1] / b
+        return ip
+
+    def equal(base, arg, ip):
+        b = pop()
+        stack[-1] = stack[-1] == b
+        return ip
+
+    def not_equal(base, arg, ip):
+        b = pop()
+        stack[-1] = stack[-1] != b
+        return ip
+
+    def greater(base, arg, ip):
+        b = pop()
+        a = stack[-1]
+        stack[-1] = a > b if a is not None and b is not None else False
+        return ip
+
+    def greater_equal(base, arg, ip):
+        b = pop()
+        a = stack[-1]
+        stack[-1] = a >= b if a is not None and b is not None else False
+        return ip
+
+    def less(base, arg, ip):
+        b = pop()
+        a = stack[-1]
+        stack[-1] = a < b if a is not None and b is not None else False
+        return ip
+
+    def less_equal(base, arg, ip):
+        b = pop()
+        a = stack[-1]
+        stack[-1] = a <= b if a is not None and b is not None else False
+        return ip
+
+    def not_(base, arg, ip):
+        stack[-1] = not stack[-1]
+        return ip
+
+    def negate(base, arg, ip):
+        stack[-1] = -stack[-1]
+        return ip
+
+    def jump(base, arg, ip):
+        return arg
+
+    def jump_if_false(base, arg, ip):
+        return ip if stack[-1] else arg
+
+    def jump_if_false_pop(base, arg, ip):
+        return ip if pop() else arg
+
+    def jump_if_true(base, arg, ip):
+        return arg if stack[-1] else ip
+
+    def jump_if_true_pop(base, arg, ip):
+        return arg if pop() else ip
+
+    def inc_global(base, arg, ip):
+        value = g[arg]
+        g[arg] = (0 if value is UNDEFINED else value) + 1
+        return ip
+
+    def add_global(base, arg, ip):
+        value = g[arg]
+        g[arg] = (0 if value is UNDEFINED else value) + pop()
+        return ip
+
+    def build_list(base, arg, ip):
+        if arg:
+            elements = stack[-arg:]
+            del stack[-arg:]
+        else:
+            elements = []
+        push(elements)
+        return ip
+
+    def build_map(base, arg, ip):
+        mapping = {}
+        for _ in range(arg):
+            val = pop()
+            key = pop()
+            mapping[key] = val
+        push(mapping)
+        return ip
+
+    def get_iter(base, arg, ip):
+        stack[-1] = iter(stack[-1])
+        return ip
+
+    def for_iter(base, arg, ip):
+        try:
+            push(next(stack[-1]))
+        except StopIteration:
+            pop()
+            return arg
+        return ip
+
+    # Range loops: CALL_RANGE turns the builtin range into a RangeLoop counter,
+    # FOR_RANGE stores each value straight into the loop variable
+
+    def call_range(base, arg, ip):
+        func = stack[-arg - 1]
+        if func is not range_of:
+            # `range` was rebound; GET_ITER and FOR_RANGE iterate whatever it returns
+            return invoke(arg, {}, ip)
+        try:
+            counter = RangeLoop(stack[-arg:])
+        except Exception as e:
+            raise RuntimeError(f"Error calling native function {func}: {e}")
+        del stack[-arg - 1:]
+        push(counter)
+        return ip
+
+    def for_range(base, arg, ip):
+        counter = stack[-1]
+        if type(counter) is RangeLoop:
+            i = counter.current
+            if i != counter.end:
+                counter.current = i + counter.step
+                stack[base + arg[0]] = i
+                return ip
+        else:
+            try:
+                stack[base + arg[0]] = next(counter)
+                return ip
+            except StopIteration:
+                pass
+        pop()
+        return arg[1]
+
+    def for_range_global(base, arg, ip):
+        # Like the `for` of a FOR_ITER loop, the first value defines the global
+        slot = arg[0]
+        counter = stack[-1]
+        if type(counter) is RangeLoop:
+            i = counter.current
+            if i != counter.end:
+                counter.current = i + counter.step
+                g[slot] = i
+                return ip
+        else:
+            try:
+                g[slot] = next(counter)
+                return ip
+            except StopIteration:
+                pass
+        pop()
+        return arg[1]
+
+    def index_get(base, arg, ip):
+        index = pop()
+        obj = stack[-1]
+        stack[-1] = obj[index] if isinstance(obj, dict) else obj[int(index)]
+        return ip
+
+    def index_set(base, arg, ip):
+        index = pop()
+        obj = pop()
+        val = stack[-1]
+        if isinstance(obj, dict): obj[index] = val
+        else: obj[int(index)] = val
+        return ip
+
+    def enter(tier):
+        # Counts an invocation and returns the ip the new frame starts at
+        if tier is None:
+            return 0
+        tier.calls += 1
+        if tier.calls >= tiering.hot_calls and not tier.level:
+            tiering.promote(tier, "calls")
+        return tier.entry
+
+    def invoke(argc, kwargs, ip, discard_result=False):
+        func_idx = len(stack) - argc - 1
+        func = stack[func_idx]
+        if isinstance(func, FunctionObject):
+            frames[-1].ip = ip
+            convention = func.calling_convention()
+            fill = convention.fills[argc] if not kwargs and argc <= convention.arity else None
+            if fill is not None:
+                extend(fill)
+            else:
+                call_args = convention.bind(stack[func_idx + 1:], kwargs)
+                del stack[func_idx + 1:]
+                extend(call_args)
+            frames.append(CallFrame(func, enter(tiers.get(func)), func_idx + 1, discard_result))
+            return RELOAD
+        if callable(func):
+            pos_args = stack[func_idx + 1:]
+            del stack[func_idx:]
+            try:
+                res = func(*pos_args, **kwargs)
+            except Exception as e:
+                raise RuntimeError(f"Error calling native function {func}: {e}")
+            if not discard_result:
+                push(res)
+            return ip
+        raise RuntimeError(f"Object {func} is not callable")
+
+    def call_site(site, ip, discard_result):
+        # Exact positional call of the function this site last saw: the
+        # arguments already sit in their slots, only the fill is pushed
+        argc = site.argc
+        func = stack[-argc - 1]
+        if func is not site.func:
+            if type(func) is not FunctionObject:
+                return invoke(argc, {}, ip, discard_result)
+            convention = func.calling_convention()
+            if argc > convention.arity or convention.fills[argc] is None:
+                return invoke(argc, {}, ip, discard_result)
+            site.func = func
+            site.fill = convention.fills[argc]
+            site.tier = tiers.get(func)
+        frames[-1].ip = ip
+        start = len(stack) - argc
+        extend(site.fill)
+        tier = site.tier
+        frames.append(CallFrame(func, 0 if tier is None else enter(tier), start, discard_result))
+        return RELOAD
+
+    def call(base, arg, ip):
+        return call_site(arg, ip, False)
+
+    def call_kw(base, arg, ip):
+        num_pos_args, kw_names = arg
+        kwargs = {name: pop() for name in reversed(kw_names)}
+        return invoke(num_pos_args, kwargs, ip)
+
+    # Frame teardown drops the locals together with the function object below them
+
+    def return_(base, arg, ip):
+        res = pop()
+        frame = frames.pop()
+        del stack[base - 1 if base > 0 else 0:]
+        if not frame.discard_result:
+            push(res)
+        return RELOAD
+
+    def return_none(base, arg, ip):
+        frame = frames.pop()
+        del stack[base - 1 if base > 0 else 0:]
+        if not frame.discard_result:
+            push(None)
+        return RELOAD
+
+    def counted_loop(base, arg, ip):
+        target, tier = arg
+        tier.backedges += 1
+        if tier.backedges >= tiering.hot_loops:
+            # Takes effect from the next call; this frame finishes in the bytecode
+            tiering.promote(tier, "loops")
+        return target
+
+    def yield_(base, arg, ip):
+        frames[-1].ip = ip
+        vm.is_yielded = True
+        return SUSPEND
+
+    # Superinstructions
+
+    def get_global_attr(base, arg, ip):
+        slot, cache = arg
+        obj = g[slot]
+        if obj is cache.receiver:
+            cache.hits += 1
+            push(cache.bound)
+        elif type(obj) is cache.type:
+            cache.hits += 1
+            push(cache.getter(obj))
+        else:
+            if obj is UNDEFINED:
+                obj = missing_global(slot)
+            push(cache.miss(obj))
+        return ip
+
+    def call_attr(base, arg, ip):
+        obj = stack[-1]
+        if obj is arg.receiver:
+            arg.hits += 1
+            stack[-1] = arg.bound
+        elif type(obj) is arg.type:
+            arg.hits += 1
+            stack[-1] = arg.getter(obj)
+        else:
+            stack[-1] = arg.miss(obj)
+        return invoke(0, {}, ip)
+
+    def call_pop(base, arg, ip):
+        return call_site(arg, ip, True)
+
+    def binary_const(base, arg, ip):
+        binop, b = arg
+        stack[-1] = binop(stack[-1], b)
+        return ip
+
+    def binary_locals(base, arg, ip):
+        binop, a, b = arg
+        push(binop(stack[base + a], stack[base + b]))
+        return ip
+
+    def compare_jump_if_false(base, arg, ip):
+        cmp, ordering, target = arg
+        b = pop()
+        a = pop()
+        if ordering and (a is None or b is None):
+            return target
+        return ip if cmp(a, b) else target
+
+    def compare_const_jump_if_false(base, arg, ip):
+        cmp, ordering, b, target = arg
+        a = pop()
+        if ordering and (a is None or b is None):
+            return target
+        return ip if cmp(a, b) else target
+
+    # Quickening: ADAPTIVE collects type feedback, the specialized variants
+    # (compiled from _VARIANT_TEMPLATES) call deopt when their guard fails.
+
+    def adaptive(base, site, ip):
+        shape = site.shape
+        if shape == "CONST_JUMP":
+            site.observe(stack[-1], site.const)
+        else:
+            site.observe(stack[-2], stack[-1])
+        if site.count >= site.threshold:
+            variant = QUICKENED.get(variant_name(site.name, shape, site.feedback))
+            if variant is None:
+                # Mixed operand types: nothing to specialize for
+                generic(site)
+            else:
+                site.ops[site.index] = variant[0]
+        return table[site.generic](base, site.generic_arg, ip)
+
+    def generic(site):
+        site.ops[site.index] = site.generic
+        site.args[site.index] = site.generic_arg
+
+    def deopt(site, base, ip):
+        site.deopts += 1
+        site.reset()
+        if site.deopts >= MAX_DEOPTS:
+            generic(site)
+        else:
+            site.threshold *= 2
+            site.ops[site.index] = ADAPTIVE
+        return table[site.generic](base, site.generic_arg, ip)
+
+    # Python backend: a native function runs as a two-instruction frame. The
+    # bound slots are replaced by its generator, which NATIVE_RESUME drives.
+
+    def native_enter(base, arg, ip):
+        gen = arg(*stack[base:])
+        del stack[base:]
+        push(gen)
+        return ip
+
+    def native_resume(base, arg, ip):
+        gen = stack[base]
+        # Above the generator sits the result of an interpreted callee, if one just returned
+        value = pop() if len(stack) > base + 1 else None
+        start = perf_counter()
+        try:
+            request = gen.send(value)
+        except StopIteration as stop:
+            tiering.native_time += perf_counter() - start
+            frame = frames.pop()
+            del stack[base - 1 if base > 0 else 0:]
+            if not frame.discard_result:
+                push(stop.value)
+            return RELOAD
+        except Exception as e:
+            tiering.native_time += perf_counter() - start
+            # Later calls run the bytecode, where errors and locals are inspectable
+            tier = tiers.get(frames[-1].function)
+            if tier is not None:
+                tiering.demote(tier, f"error: {e}")
+            if isinstance(e, VMRuntimeError):
+                raise
+            raise VMRuntimeError(str(e), line=native_line(e, vm.native_lines)) from e
+        tiering.native_time += perf_counter() - start
+        if request is None:
+            # `yield` statement or loop back-edge over budget
+            frames[-1].ip = ip - 1
+            vm.is_yielded = True
+            return SUSPEND
+        func, args, kwargs = request
+        push(func)
+        extend(args)
+        return invoke(len(args), kwargs, ip - 1)
+
+    handlers = {
+        "PUSH_CONST": push_const,
+        "PUSH_TRUE": push_true,
+        "PUSH_FALSE": push_false,
+        "POP": pop_,
+        "DEFINE_GLOBAL": define_global,
+        "GET_GLOBAL": get_global,
+        "SET_GLOBAL": set_global,
+        "SET_GLOBAL_POP": set_global_pop,
+        "GET_LOCAL": get_local,
+        "SET_LOCAL": set_local,
+        "SET_LOCAL_POP": set_local_pop,
+        "GET_ATTR": get_attr,
+        "SET_ATTR": set_attr,
+        "SET_ATTR_POP": set_attr_pop,
+        "SET_ATTR_FAST": set_attr_fast,
+        "ADD": add,
+        "SUB": sub,
+        "MUL": mul,
+        "DIV": div,
+        "EQUAL": equal,
+        "NOT_EQUAL": not_equal,
+        "GREATER": greater,
+        "GREATER_EQUAL": greater_equal,
+        "LESS": less,
+        "LESS_EQUAL": less_equal,
+        "NOT": not_,
+        "NEGATE": negate,
+        "JUMP": jump,
+        "JUMP_IF_FALSE": jump_if_false,
+        "JUMP_IF_FALSE_POP": jump_if_false_pop,
+        "JUMP_IF_TRUE": jump_if_true,
+        "JUMP_IF_TRUE_POP": jump_if_true_pop,
+        "LOOP": jump,
+        "INC_GLOBAL": inc_global,
+        "ADD_GLOBAL": add_global,
+        "BUILD_LIST": build_list,
+        "BUILD_MAP": build_map,
+        "GET_ITER": get_iter,
+        "FOR_ITER": for_iter,
+        "CALL_RANGE": call_range,
+        "FOR_RANGE": for_range,
+        "FOR_RANGE_GLOBAL": for_range_global,
+        "INDEX_GET": index_get,
+        "INDEX_SET": index_set,
+        "CALL": call,
+        "CALL_KW": call_kw,
+        "RETURN": return_,
+        "RETURN_NONE": return_none,
+        "YIELD": yield_,
+        "GET_GLOBAL_ATTR": get_global_attr,
+        "CALL_ATTR": call_attr,
+        "CALL_POP": call_pop,
+        "BINARY_CONST": binary_const,
+        "BINARY_LOCALS": binary_locals,
+        "COMPARE_JUMP_IF_FALSE": compare_jump_if_false,
+        "COMPARE_CONST_JUMP_IF_FALSE": compare_const_jump_if_false,
+        "NATIVE_ENTER": native_enter,
+        "NATIVE_RESUME": native_resume,
+    }
+
+    def unknown(base, arg, ip):
+        raise RuntimeError(f"Unknown opcode at {ip - 1}")
+
+    table = [unknown] * (_LAST_OPCODE + 1)
+    for name, handler in handlers.items():
+        table[OPCODE_VALUES[name]] = handler
+    table[END] = return_none
+    table[COUNTED_LOOP] = counted_loop
+    table[ADAPTIVE] = adaptive
+    for value, make in QUICKENED.values():
+        table[value] = make(stack, pop, push, deopt)
+    return table
+
+def build_overtime_table(vm, table):
+    """
+    Variant of a handler table used once the slice budget is spent. The VM
+    keeps running until the next back-edge (LOOP or a backward JUMP) or the
+    entry of a user function, the only places where unbounded work can
+    start, and suspends there.
+    """
+    frames = vm.frames
+
+    def suspend_at(target):
+        frames[-1].ip = target
+        vm.is_yielded = True
+        return SUSPEND
+
+    def loop(base, arg, ip):
+        return suspend_at(arg)
+
+    def jump(base, arg, ip):
+        return suspend_at(arg) if arg < ip else arg
+
+    def counted_loop(base, arg, ip):
+        return suspend_at(arg[0])
+
+    def entering(handler):
+        def call(base, arg, ip):
+            next_ip = handler(base, arg, ip)
+            if next_ip == RELOAD:
+                # A frame was pushed: suspend before the callee's first instruction
+                vm.is_yielded = True
+                return SUSPEND
+            return next_ip
+        return call
+
+    overtime = list(table)
+    overtime[OPCODE_VALUES["LOOP"]] = loop
+    overtime[OPCODE_VALUES["JUMP"]] = jump
+    overtime[COUNTED_LOOP] = counted_loop
+    for name in ("CALL", "CALL_KW", "CALL_POP", "CALL_ATTR", "CALL_RANGE"):
+        overtime[OPCODE_VALUES[name]] = entering(table[OPCODE_VALUES[name]])
+    return overtime
@@ -0,0 +1,74 @@
+from collections.abc import MutableMapping
+
+class _Undefined:
+    __slots__ = ()
+
+    def __repr__(self):
+        return "<undefined>"
+
+# Marks a slot that was allocated for a name which currently has no value
+UNDEFINED = _Undefined()
+
+class GlobalTable(MutableMapping):
+    """
+    Global variables stored in a flat slot array.
+
+    The linker assigns every global name used by the program a slot when the
+    VM receives it, so the table engine reads and writes globals by index.
+    Slots are never freed or moved; a name without a value holds UNDEFINED.
+    The mapping interface (used by call_function, the memory inspector and
+    the runtime when it installs builtins) only exposes defined names.
+    """
+
+    def __init__(self, initial=None):
+        self.slots = []      # slot -> value
+        self.names = []      # slot -> name
+        self.slot_of = {}    # name -> slot
+        if initial:
+            self.update(initial)
+
+    def slot(self, name):
+        """Returns the slot of `name`, allocating an undefined one on first use."""
+        idx = self.slot_of.get(name)
+        if idx is None:
+            idx = self.slot_of[name] = len(self.slots)
+            self.slots.append(UNDEFINED)
+            self.names.append(name)
+        return idx
+
+    def __getitem__(self, name):
+        idx = self.slot_of.get(name)
+        if idx is None or self.slots[idx] is UNDEFINED:
+            raise KeyError(name)
+        return self.slots[idx]
+
+    def __setitem__(self, name, value):
+        self.slots[self.slot(name)] = value
+
+    def __delitem__(self, name):
+        idx = self.slot_of.get(name)
+        if idx is None or self.slots[idx] is UNDEFINED:
+            raise KeyError(name)
+        self.slots[idx] = UNDEFINED
+
+    def __contains__(self, name):
+        idx = self.slot_of.get(name)
+        return idx is not None and self.slots[idx] is not UNDEFINED
+
+    def __iter__(self):
+        # Snapshot, so the UI thread can iterate while the VM defines new globals
+        slots = self.slots
+        return iter([name for name, idx in list(self.slot_of.items()) if slots[idx] is not UNDEFINED])
+
+    def __len__(self):
+        return sum(1 for value in self.slots if value is not UNDEFINED)
+
+    def get(self, name, default=None):
+        idx = self.slot_of.get(name)
+        if idx is None:
+            return default
+        value = self.slots[idx]
+        return default if value is UNDEFINED else value
+
+    def __repr__(self):
+        return f"GlobalTable({dict(self.items())!r})"
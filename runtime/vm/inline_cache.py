@@ -0,0 +1,125 @@
+from operator import attrgetter
+
+_MISSING = object()
+
+class AttrCache:
+    """
+    Inline cache of one attribute-reading instruction (GET_ATTR, GET_GLOBAL_ATTR,
+    CALL_ATTR), keyed on the receiver's type.
+
+    On a hit the handler calls `getter(obj)`, which was picked once per type:
+    a property's getter function is called directly, skipping the descriptor
+    lookup, and anything else uses a C-level attrgetter. For methods the bound
+    method of the last receiver is kept, so calls on the long-lived stdlib
+    objects from get_builtins (`mouse.click`, `ui.set_text`) reuse it instead
+    of binding a new one each time. Values are never cached, so `mouse.x`
+    still reads the live cursor position.
+
+    The VM invalidates every cache of an attribute name when user code assigns
+    that attribute (`set obj.attr = ...`), because an instance attribute may now
+    shadow a cached method.
+    """
+    __slots__ = ("name", "type", "getter", "receiver", "bound", "hits", "misses")
+
+    def __init__(self, name):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.invalidate()
+
+    def invalidate(self):
+        self.type = None
+        self.getter = None
+        self.receiver = _MISSING
+        self.bound = None
+
+    def miss(self, obj):
+        """Resolves the attribute for a receiver of a new type and returns its value."""
+        self.misses += 1
+        self.invalidate()
+        tp = type(obj)
+        name = self.name
+        self.type = tp
+        self.getter = attrgetter(name)
+
+        # Only the default lookup rules can be predicted from the type alone
+        if tp.__getattribute__ is not object.__getattribute__:
+            return getattr(obj, name)
+
+        descr = _MISSING
+        for klass in tp.__mro__:
+            if name in klass.__dict__:
+                descr = klass.__dict__[name]
+                break
+
+        descr_type = type(descr)
+        if descr_type is property:
+            if descr.fget is not None and not hasattr(tp, "__getattr__"):
+                self.getter = descr.fget
+        elif descr is not _MISSING and hasattr(descr_type, "__get__") and not hasattr(descr_type, "__set__"):
+            if name not in getattr(obj, "__dict__", ()):
+                self.receiver = obj
+                self.bound = descr.__get__(obj, tp)
+                return self.bound
+        return self.getter(obj)
+
+class CallSite:
+    """
+    Inline cache of a CALL or CALL_POP instruction: the last user function
+    called there and the frame fill for this site's argument count, taken
+    from the function's CallingConvention. While the same function is called
+    with exact positional arguments, frame setup is a single list extend.
+    `tier` is the function's FunctionTier, if it can be promoted.
+    """
+    __slots__ = ("argc", "func", "fill", "tier")
+
+    def __init__(self, argc):
+        self.argc = argc
+        self.func = None
+        self.fill = None
+        self.tier = None
+
+# Operand types that select the *_FLOAT variants. Number literals are always
+# float; ints only come from stdlib calls and compare the same way.
+_NUMBERS = (float, int)
+
+class TypeSite:
+    """
+    Type feedback of one ordering comparison (LESS, GREATER_EQUAL,
+    COMPARE_JUMP_IF_FALSE, ...) of a decoded chunk.
+
+    The site starts on the ADAPTIVE pseudo-op, which runs the generic handler
+    and records the operand types. After `threshold` executions with only
+    number operands the dispatch code rewrites ops[index] in place to a
+    specialized variant such as LESS_FLOAT; other sites go back to the
+    generic opcode for good. `generic` and `generic_arg` are the
+    original decoded instruction, used by the warm-up and deoptimization paths.
+    """
+    __slots__ = ("ops", "args", "index", "name", "shape", "generic", "generic_arg",
+                 "const", "target", "feedback", "count", "threshold", "deopts")
+
+    def __init__(self, ops, args, index, name, shape, threshold):
+        self.ops = ops
+        self.args = args
+        self.index = index
+        self.name = name   # operator name, e.g. "LESS_EQUAL"
+        self.shape = shape # "", "JUMP" or "CONST_JUMP"
+        self.generic = ops[index]
+        self.generic_arg = args[index]
+        self.const = self.target = None
+        self.threshold = threshold
+        self.deopts = 0
+        self.reset()
+
+    def reset(self):
+        self.feedback = None
+        self.count = 0
+
+    def observe(self, a, b):
+        """Records one operand pair; feedback stays "FLOAT" only while every pair is numbers."""
+        kind = "FLOAT" if type(a) in _NUMBERS and type(b) in _NUMBERS else None
+        if self.count == 0:
+            self.feedback = kind
+        elif kind != self.feedback:
+            self.feedback = None
+        self.count += 1
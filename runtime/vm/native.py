@@ -0,0 +1,149 @@
+from compiler import FunctionObject
+from .globals import UNDEFINED
+from .base import range_of
+
+# Generated code is compiled under "<tml:function_name>", which is how
+# native_line finds its frames in a traceback.
+FILENAME_PREFIX = "<tml:"
+
+class Pending:
+    """
+    Result of calling a user function from generated code. The caller runs
+    it with `yield from pending.gen`, so suspensions inside the callee
+    propagate up to the VM.
+    """
+    __slots__ = ("gen",)
+
+    def __init__(self, gen):
+        self.gen = gen
+
+def _interpreted(func, args, kwargs):
+    # Hands a bytecode function to the VM (NATIVE_RESUME) and receives its result
+    return (yield (func, args, kwargs))
+
+class NativeRuntime:
+    """
+    Helpers the factories generated by compiler/pygen.py bind to. They
+    mirror the opcode handlers of one VM: the same global slots, error
+    messages, call binding and attribute cache invalidation.
+    """
+
+    def __init__(self, vm):
+        globals = vm.globals
+        names = globals.names
+        natives = vm.natives
+        self.slots = globals.slots
+        self.slot = globals.slot
+        self.UNDEFINED = UNDEFINED
+        self.Pending = Pending
+
+        def missing(slot):
+            name = names[slot]
+            if name in vm.functions:
+                return vm.functions[name]
+            raise RuntimeError(f"Undefined variable '{name}'")
+
+        def undefined(slot):
+            raise RuntimeError(f"Undefined variable '{names[slot]}'")
+
+        def invoke(func, args, kwargs):
+            native = natives.get(func)
+            if native is None:
+                return Pending(_interpreted(func, args, kwargs))
+            convention = func.calling_convention()
+            fill = convention.fills[len(args)] if not kwargs and len(args) <= convention.arity else None
+            if fill is not None:
+                return Pending(native(*args, *fill))
+            return Pending(native(*convention.bind(args, kwargs)))
+
+        def call(func, args):
+            if isinstance(func, FunctionObject):
+                return invoke(func, args, {})
+            if callable(func):
+                try:
+                    return func(*args)
+                except Exception as e:
+                    raise RuntimeError(f"Error calling native function {func}: {e}")
+            raise RuntimeError(f"Object {func} is not callable")
+
+        def call_kw(func, args, kwargs):
+            if isinstance(func, FunctionObject):
+                return invoke(func, args, kwargs)
+            if callable(func):
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    raise RuntimeError(f"Error calling native function {func}: {e}")
+            raise RuntimeError(f"Object {func} is not callable")
+
+        def tick(executed):
+            # A loop back-edge: counts the instructions since the last count and checks the slice budget
+            vm.instruction_count += executed
+            vm.total_instruction_count += executed
+            return vm._over_budget()
+
+        def count(executed):
+            # The end of a straight-line run of code (see compiler/pygen.py)
+            vm.instruction_count += executed
+            vm.total_instruction_count += executed
+
+        def range_loop(args):
+            # The builtin range of a for loop, counted like CALL_RANGE does
+            try:
+                return range_of(*args)
+            except Exception as e:
+                raise RuntimeError(f"Error calling native function {range_of}: {e}")
+
+        def index_get(obj, index):
+            return obj[index] if isinstance(obj, dict) else obj[int(index)]
+
+        def index_set(obj, index, val):
+            if isinstance(obj, dict): obj[index] = val
+            else: obj[int(index)] = val
+
+        def build_map(*items):
+            # Same insertion order as BUILD_MAP and CALL_KW, which pop pairs off the stack
+            mapping = {}
+            for i in range(len(items) - 2, -1, -2):
+                mapping[items[i]] = items[i + 1]
+            return mapping
+
+        def set_attr(obj, name, val):
+            setattr(obj, name, val)
+            for cache in vm.attr_caches.get(name, ()):
+                cache.invalidate()
+
+        self.missing = missing
+        self.undefined = undefined
+        self.call = call
+        self.call_kw = call_kw
+        self.tick = tick
+        self.count = count
+        self.index_get = index_get
+        self.index_set = index_set
+        self.set_attr = set_attr
+        self.build_map = build_map
+        self.range_loop = range_loop
+        self.range_builtin = range_of
+
+def build_native(vm, runtime, func):
+    """
+    Execs the factory generated for `func` and returns its native function.
+    The line table of the generated code is registered in vm.native_lines.
+    """
+    filename = f"{FILENAME_PREFIX}{func.name}>"
+    namespace = {}
+    exec(compile(func.native_source, filename, "exec"), namespace)
+    vm.native_lines[filename] = func.native_lines
+    return namespace["make"](runtime)
+
+def native_line(exc, line_tables):
+    """TML line of the innermost generated frame in the traceback of `exc`, or None."""
+    line = None
+    tb = exc.__traceback__
+    while tb is not None:
+        lines = line_tables.get(tb.tb_frame.f_code.co_filename)
+        if lines is not None and 0 < tb.tb_lineno <= len(lines):
+            line = lines[tb.tb_lineno - 1]
+        tb = tb.tb_next
+    return line
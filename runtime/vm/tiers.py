@@ -0,0 +1,124 @@
+import time
+from collections import deque
+from .native import NativeRuntime, build_native
+from .dispatch import OPCODE_VALUES, COUNTED_LOOP
+
+_LOOP = OPCODE_VALUES["LOOP"]
+_STUB = [OPCODE_VALUES["NATIVE_ENTER"], OPCODE_VALUES["NATIVE_RESUME"]]
+
+# Tier numbers as shown in the stats
+BASELINE = 0 # bytecode interpreter
+NATIVE = 1   # Python backend (compiler/pygen.py)
+
+class FunctionTier:
+    """
+    Per-VM execution state of one user function that the Python backend can
+    translate. `entry` is the ip new frames start at: 0 for the bytecode,
+    or the index of the NATIVE_ENTER stub appended to the decoded code once
+    the function is promoted. Frames already running the bytecode keep
+    going, because promotion only appends to the decoded lists.
+    """
+    __slots__ = ("func", "ops", "args", "level", "entry", "calls", "backedges", "loop_sites", "failed")
+
+    def __init__(self, func, ops, args):
+        self.func = func
+        self.ops = ops
+        self.args = args
+        self.level = BASELINE
+        self.entry = 0
+        self.calls = 0
+        self.backedges = 0
+        self.loop_sites = [] # (index, target) of every LOOP counted by COUNTED_LOOP
+        self.failed = False  # demoted after an error: stays on the interpreter
+
+class TierManager:
+    """
+    Hot-function detection for one VM. Functions start in the baseline
+    interpreter; the dispatch handlers count invocations and loop back-edges
+    and call promote() when either crosses its threshold. One-shot code
+    (top-level statements, on_init) never gets there, so it never pays for
+    Python compilation, while on_tick, called 60 times a second, is promoted
+    within its first second.
+    """
+    # Defaults, overridable with @meta {"hot_calls": ..., "hot_loops": ...}
+    HOT_CALLS = 50
+    HOT_LOOPS = 1000
+    MAX_EVENTS = 100
+
+    def __init__(self, vm):
+        self.vm = vm
+        self.hot_calls = self.HOT_CALLS
+        self.hot_loops = self.HOT_LOOPS
+        self.events = deque(maxlen=self.MAX_EVENTS) # (time, function name, "promote"/"demote", reason)
+        self.promotions = 0
+        self.demotions = 0
+        self.total_time = 0.0  # seconds spent in VM._execute
+        self.native_time = 0.0 # seconds spent inside generated code
+        self.functions = {} # FunctionObject -> FunctionTier
+        self._runtime = None
+
+    def reset(self):
+        """Forgets all tier state; called when the VM links a new program."""
+        self.functions = {}
+        self._runtime = None
+
+    def register(self, func, ops, args):
+        """Tracks `func` if it has generated code; its LOOPs in the decoded lists are rewritten to COUNTED_LOOP."""
+        if getattr(func, "native_source", None) is None:
+            return None
+        tier = self.functions[func] = FunctionTier(func, ops, args)
+        for i, op in enumerate(ops):
+            if op == _LOOP:
+                tier.loop_sites.append((i, args[i]))
+                ops[i] = COUNTED_LOOP
+                args[i] = (args[i], tier)
+        return tier
+
+    def promote(self, tier, reason):
+        if tier.level != BASELINE or tier.failed:
+            return
+        vm = self.vm
+        if self._runtime is None:
+            self._runtime = NativeRuntime(vm)
+        self._restore_loops(tier)
+        try:
+            native = build_native(vm, self._runtime, tier.func)
+        except Exception as e:
+            tier.failed = True
+            self.events.append((time.time(), tier.func.name, "demote", f"compile failed: {e}"))
+            return
+        # The stub goes after the END pseudo-op, so jump targets and running frames are untouched
+        tier.entry = len(tier.ops)
+        tier.ops.extend(_STUB)
+        tier.args.extend([native, None])
+        tier.level = NATIVE
+        vm.natives[tier.func] = native
+        self.promotions += 1
+        self.events.append((time.time(), tier.func.name, "promote", reason))
+
+    def demote(self, tier, reason):
+        if tier.level == BASELINE:
+            return
+        tier.level = BASELINE
+        tier.entry = 0
+        tier.failed = True
+        self.vm.natives.pop(tier.func, None)
+        self.demotions += 1
+        self.events.append((time.time(), tier.func.name, "demote", reason))
+
+    def _restore_loops(self, tier):
+        # Promoted functions stop counting; frames still in the bytecode loop at full speed
+        for i, target in tier.loop_sites:
+            tier.ops[i] = _LOOP
+            tier.args[i] = target
+        tier.loop_sites = []
+
+    def stats(self):
+        """Tier counters for the runtime stats."""
+        hot = sum(1 for tier in list(self.functions.values()) if tier.level == NATIVE)
+        return {
+            "hot": hot,
+            "promotions": self.promotions,
+            "demotions": self.demotions,
+            "time": {"interpreter": max(0.0, self.total_time - self.native_time), "native": self.native_time},
+        }
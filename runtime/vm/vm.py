@@ -1,18 +1,48 @@
+import sys
+import time
 from compiler.opcodes import OpCode
 from compiler import FunctionObject
-from .base import VMRuntimeError, CallFrame
+from .base import VMRuntimeError, CallFrame, RangeLoop, range_of
+from .globals import GlobalTable
+from .dispatch import decode_chunk, build_dispatch_table, build_overtime_table, compare, BINARY_FUNCS, RELOAD, ADAPTIVE
+from .tiers import TierManager
 
 class VM:
-    def __init__(self, globals=None):
+    # "table" pre-decodes chunks and dispatches through a handler table,
+    # "switch" is the original if/elif interpreter loop.
+    ENGINES = ("table", "switch")
+
+    # With a time slice, the table engine checks the clock after this many instructions
+    TIME_CHECK_INTERVAL = 256
+
+    def __init__(self, globals=None, engine="table"):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown VM engine '{engine}'")
+        self.engine = engine
         self.stack = []
-        self.globals = globals if globals is not None else {}
+        # Name-keyed view over the slot array the table engine links against
+        self.globals = globals if isinstance(globals, GlobalTable) else GlobalTable(globals)
         self.frames = []
         self.chunk = None
         self.functions = {}
         self.instruction_count = 0
         self.total_instruction_count = 0
         self.instruction_limit = 1000 # 5. Ліміт інструкцій на тик
+        self.time_slice = None # Seconds of wall-clock time per slice (@meta time_slice_ms), None = unlimited
+        self._entry_depth = 1 # frame count of the running entry point (top-level code or call_function); resume() keeps it
+        self._slice_start = 0.0
         self.is_yielded = False
+        self._dispatch = None
+        self._overtime_dispatch = None
+        self._decoded = {} # id(chunk) -> (chunk, ops, args)
+        self.attr_caches = {} # attribute name -> [AttrCache] of every decoded site
+        self.type_sites = [] # TypeSite of every quickenable instruction decoded
+        # Type-feedback specialization of the table engine (@meta quicken); off until
+        # `python benchmark.py quicken` measures a gain on the examples
+        self.quicken = False
+        self.natives = {} # FunctionObject -> generator function built by the Python backend
+        self.native_lines = {} # generated code filename -> TML line table
+        self.tiering = TierManager(self)
 
     def run(self, chunk, functions=None):
         self.chunk = chunk
@@ -27,10 +57,30 @@ class VM:
                 self.instruction_limit = float('inf') if limit == -1 else limit
             elif meta.get("no_limit", False):
                 self.instruction_limit = float('inf')
+            if meta.get("time_slice_ms"):
+                self.time_slice = meta["time_slice_ms"] / 1000.0
+                if "instruction_limit" not in meta:
+                    # The time slice replaces the instruction count unless both are given
+                    self.instruction_limit = float('inf')
+            if meta.get("engine") in self.ENGINES:
+                self.engine = meta["engine"]
+            if "quicken" in meta:
+                self.quicken = bool(meta["quicken"])
+            if "hot_calls" in meta:
+                self.tiering.hot_calls = meta["hot_calls"]
+            if "hot_loops" in meta:
+                self.tiering.hot_loops = meta["hot_loops"]
 
-        self.frames = [CallFrame(None, 0, 0)]
+        self.frames.clear()
+        self.frames.append(CallFrame(None, 0, 0))
+        self._entry_depth = 1
+        # Slots of top-level locals (@meta toplevel_locals) sit below the operands of the top-level frame
+        self.stack.clear()
+        self.stack.extend([None] * len(getattr(self.chunk, "local_names", None) or ()))
         self.instruction_count = 0
+        self._slice_start = time.perf_counter()
         self.is_yielded = False
+        self._link()
         
         return self._execute()
 
@@ -42,85 +92,49 @@ class VM:
     def _finish_frame(self, res, start_frame_count):
         frame = self.frames.pop()
         
-        # Clean up local stack
-        while len(self.stack) > frame.stack_start:
-            self.stack.pop()
-        
-        # Pop function object if it was a function call
-        if frame.stack_start > 0:
-            if self.stack:
-                self.stack.pop()
+        # Drop locals together with the function object below them (if it was a function call)
+        stack_start = frame.stack_start
+        del self.stack[stack_start - 1 if stack_start > 0 else 0:]
         
         if len(self.frames) < start_frame_count:
             return res, True
         
-        self.stack.append(res)
+        if not frame.discard_result:
+            self.stack.append(res)
         return res, False
 
-    def _call_func(self, num_args, kwargs, start_frame_count):
-        func_idx = -num_args - 1
-        func = self.stack[func_idx]
+    def _bind_args(self, func, pos_args, kwargs):
+        """Maps call arguments onto the local slots of a user-defined function."""
+        return func.calling_convention().bind(pos_args, kwargs)
+
+    def _call_func(self, num_args, kwargs, start_frame_count, discard_result=False):
+        stack_start = len(self.stack) - num_args
+        func = self.stack[stack_start - 1]
         
         if isinstance(func, FunctionObject):
-            # User-defined function
-            pos_args = []
-            for _ in range(num_args):
-                pos_args.append(self.stack.pop())
-            pos_args.reverse()
-            self.stack.pop() # Pop function object
-            
-            call_args = [None] * func.locals_count
-            params_provided = set()
-            
-            # Fill positional
-            for i in range(min(len(pos_args), func.arity)):
-                call_args[i] = pos_args[i]
-                params_provided.add(func.local_names[i])
-            
-            # Fill keywords
-            extra_kwargs = {}
-            for name, val in kwargs.items():
-                if name in func.local_names[:func.arity]:
-                    idx = func.local_names.index(name)
-                    call_args[idx] = val
-                    params_provided.add(name)
-                elif func.kwargs_param:
-                    extra_kwargs[name] = val
-                else:
-                    raise TypeError(f"Function {func.name} got unexpected keyword argument '{name}'")
-            
-            # Fill defaults
-            for i in range(func.arity):
-                name = func.local_names[i]
-                if name not in params_provided:
-                    if name in func.defaults:
-                        call_args[i] = func.defaults[name]
-                    else:
-                        raise TypeError(f"Function {func.name} missing required argument: '{name}'")
-            
-            # Fill **kwargs
-            if func.kwargs_param:
-                idx = func.local_names.index(func.kwargs_param)
-                call_args[idx] = extra_kwargs
-            
-            # Setup frame
-            stack_start = len(self.stack)
-            for val in call_args:
-                self.stack.append(val)
+            # User-defined function. The function object stays below the locals
+            # and is popped by _finish_frame, same as for frames pushed by call_function.
+            convention = func.calling_convention()
+            fill = convention.fills[num_args] if not kwargs and num_args <= convention.arity else None
+            if fill is not None:
+                # Exact positional call: the arguments already sit in their slots
+                self.stack.extend(fill)
+            else:
+                call_args = convention.bind(self.stack[stack_start:], kwargs)
+                del self.stack[stack_start:]
+                self.stack.extend(call_args)
                 
-            self.frames.append(CallFrame(func, 0, stack_start))
+            self.frames.append(CallFrame(func, 0, stack_start, discard_result))
             
         elif callable(func):
             # Native function
-            pos_args = []
-            for _ in range(num_args):
-                pos_args.append(self.stack.pop())
-            pos_args.reverse()
-            self.stack.pop() # Pop function object
+            pos_args = self.stack[stack_start:]
+            del self.stack[stack_start - 1:]
             
             try:
                 res = func(*pos_args, **kwargs)
-                self.stack.append(res)
+                if not discard_result:
+                    self.stack.append(res)
             except Exception as e:
                 raise RuntimeError(f"Error calling native function {func}: {e}")
         else:
@@ -141,204 +155,486 @@ class VM:
         return chunk.lines[idx]
 
     def _execute(self):
-        start_frame_count = len(self.frames)
-        while len(self.frames) >= start_frame_count:
+        start = time.perf_counter()
+        try:
+            if self.engine == "table":
+                return self._execute_table()
+            return self._execute_switch()
+        finally:
+            self.tiering.total_time += time.perf_counter() - start
+
+    def _link(self):
+        """
+        Decodes the main chunk, assigning a global slot to each name it uses.
+        Functions are decoded the same way on their first call (see _decode),
+        so a function that never runs is never decoded, nor loaded from a
+        compiled program file (compiler/bytecode_format.py). Only the table
+        engine executes linked code and only it tiers: functions with
+        generated Python code are registered with the TierManager when they
+        are decoded, and it promotes them once they get hot. With
+        @meta {"backend": "py"} they are all decoded and promoted here instead.
+        """
+        self._decoded = {}
+        self.attr_caches = {}
+        self.type_sites = []
+        self.natives.clear()
+        self.native_lines.clear()
+        self.tiering.reset()
+        for func in self.functions.values():
+            func.calling_convention()
+        if self.engine != "table":
+            return
+        if self.chunk is not None:
+            self._decoded[id(self.chunk)] = (self.chunk,) + decode_chunk(self.chunk, self)
+        if getattr(self.chunk, "metadata", {}).get("backend") == "py":
+            for func in self.functions.values():
+                entry = self._decoded[id(func.chunk)] = (func.chunk,) + decode_chunk(func.chunk, self)
+                tier = self.tiering.register(func, entry[1], entry[2])
+                if tier is not None:
+                    self.tiering.promote(tier, "backend")
+
+    def reload_functions(self, functions):
+        """
+        Makes `functions`, a newer compile of the running program, the user
+        functions of the VM; call it between two slices (no instruction
+        executing). Functions whose content_key (compiler/function_cache.py)
+        is unchanged keep their object, with its decoded code, caches and
+        tier; the others are replaced and the ones missing from `functions`
+        removed. Calls made afterwards run the new code, while frames already
+        inside a replaced function finish on the old one. Globals are left
+        alone (see reload_globals). Returns the names of the (changed,
+        removed) functions.
+        """
+        changed = {}
+        for name, func in functions.items():
+            key = getattr(self.functions.get(name), "content_key", None)
+            if key is None or key != func.content_key:
+                changed[name] = func
+        removed = [name for name in self.functions if name not in functions]
+
+        eager = getattr(self.chunk, "metadata", {}).get("backend") == "py"
+        for name in removed:
+            self.tiering.functions.pop(self.functions.pop(name), None)
+        for name, func in changed.items():
+            old = self.functions.get(name)
+            if old is not None:
+                self.tiering.functions.pop(old, None)
+            self.functions[name] = func
+            func.calling_convention()
+            if self.engine != "table":
+                continue
+            entry = self._decoded[id(func.chunk)] = (func.chunk,) + decode_chunk(func.chunk, self)
+            tier = self.tiering.register(func, entry[1], entry[2])
+            if tier is not None and eager:
+                self.tiering.promote(tier, "backend")
+        return list(changed), removed
+
+    def reload_globals(self, values, constants=()):
+        """
+        Defines the globals in `values`, the top-level `let`s of plain values
+        of a newer compile, that the VM does not have yet. The names in
+        `constants` were folded into the new code (compiler/folding.py), so
+        their globals take the new value too: top-level code, the memory
+        inspector and the functions see the same value.
+        """
+        for name, value in values.items():
+            if name in constants or name not in self.globals:
+                self.globals[name] = value
+
+    def active_functions(self):
+        """Names of the user functions with a frame on the call stack."""
+        return {frame.function.name for frame in self.frames if frame.function is not None}
+
+    def attr_cache_stats(self):
+        """Hit/miss counters of the attribute inline caches, summed over all sites."""
+        hits = misses = sites = 0
+        for caches in list(self.attr_caches.values()):
+            for cache in caches:
+                hits += cache.hits
+                misses += cache.misses
+                sites += 1
+        return {"hits": hits, "misses": misses, "sites": sites}
+
+    def quicken_stats(self):
+        """Number of type-feedback sites, how many run a specialized variant, and total deoptimizations."""
+        sites = list(self.type_sites)
+        specialized = sum(1 for site in sites if site.ops[site.index] > ADAPTIVE)
+        return {"sites": len(sites), "specialized": specialized, "deopts": sum(site.deopts for site in sites)}
+
+    def tier_stats(self):
+        """Counters of the tiered execution (see runtime/vm/tiers.py)."""
+        return self.tiering.stats()
+
+    def _decode(self, frame):
+        func = frame.function
+        chunk = func.chunk if func else self.chunk
+        entry = self._decoded.get(id(chunk))
+        if entry is None or entry[0] is not chunk:
+            entry = (chunk,) + decode_chunk(chunk, self)
+            self._decoded[id(chunk)] = entry
+            if func is not None and func not in self.tiering.functions:
+                # First call: the caller found no tier to count it on
+                tier = self.tiering.register(func, entry[1], entry[2])
+                if tier is not None:
+                    tier.calls += 1
+        return entry[1], entry[2]
+
+    def _over_budget(self, executed=0):
+        """True once the current slice has used up its instruction limit or time slice."""
+        if self.instruction_count + executed > self.instruction_limit:
+            return True
+        return self.time_slice is not None and time.perf_counter() - self._slice_start >= self.time_slice
+
+    def _slice_budget(self):
+        """Number of instructions the table engine may run before checking the budget again (0 = spent)."""
+        if self._over_budget(1):
+            return 0
+        remaining = self.instruction_limit - self.instruction_count
+        budget = sys.maxsize if remaining == float('inf') else int(remaining)
+        if self.time_slice is not None:
+            budget = min(budget, self.TIME_CHECK_INTERVAL)
+        return budget
+
+    def _execute_table(self):
+        frames = self.frames
+        stack = self.stack
+        # Not len(frames): a slice may have suspended inside a callee (yield, or at its entry once over budget)
+        start_frame_count = self._entry_depth
+        if self._dispatch is None:
+            self._dispatch = build_dispatch_table(self)
+            self._overtime_dispatch = build_overtime_table(self, self._dispatch)
+        
+        while True:
+            frame = frames[-1]
+            if frame.ip is None:
+                raise VMRuntimeError("Critical VM Error: frame.ip is None", line=self.get_current_line())
+            ops, args = self._decode(frame)
+            base = frame.stack_start
+            ip = frame.ip
+            
+            # While the slice has budget left, iterating a range both bounds and
+            # counts executed instructions (n is the number executed before the
+            # current one). Once it is spent, the overtime table runs until the
+            # next back-edge or function entry and suspends there.
+            budget = self._slice_budget()
+            if budget:
+                table = self._dispatch
+            else:
+                table = self._overtime_dispatch
+                budget = sys.maxsize
+            n = 0
             try:
-                self.instruction_count += 1
-                self.total_instruction_count += 1
-                
-                # Check limit only if it's not infinity
-                if self.instruction_limit != float('inf') and self.instruction_count > self.instruction_limit:
-                    self.is_yielded = True
-                    return None 
+                for n in range(budget):
+                    ip = table[ops[ip]](base, args[ip], ip + 1)
+                    if ip < 0:
+                        n += 1
+                        break
+                else:
+                    # Budget chunk used up: account for it and check the budget again
+                    frame.ip = ip
+                    self.instruction_count += budget
+                    self.total_instruction_count += budget
+                    continue
+            except VMRuntimeError:
+                self.instruction_count += n + 1
+                self.total_instruction_count += n + 1
+                raise
+            except Exception as e:
+                self.instruction_count += n + 1
+                self.total_instruction_count += n + 1
+                frame.ip = ip + 1
+                raise VMRuntimeError(str(e), line=self.get_current_line()) from e
+            
+            self.instruction_count += n
+            self.total_instruction_count += n
+            if ip == RELOAD:
+                if len(frames) < start_frame_count:
+                    return stack.pop()
+                continue
+            return None
+
+    def _execute_switch(self):
+        start_frame_count = self._entry_depth
+        # Counted locally and flushed on exit; the budget is only checked at
+        # back-edges and on entry to user functions
+        executed = 0
+        try:
+            while len(self.frames) >= start_frame_count:
+                try:
+                    executed += 1
 
-                frame = self.frames[-1]
-                if frame.ip is None:
-                    raise VMRuntimeError(f"Critical VM Error: frame.ip is None", line=self.get_current_line())
+                    frame = self.frames[-1]
+                    if frame.ip is None:
+                        raise VMRuntimeError("Critical VM Error: frame.ip is None", line=self.get_current_line())
                 
-                chunk = frame.function.chunk if frame.function else self.chunk
+                    chunk = frame.function.chunk if frame.function else self.chunk
                 
-                if frame.ip >= len(chunk.code):
-                    res, finished = self._finish_frame(None, start_frame_count)
-                    if finished: return res
-                    continue
+                    if frame.ip >= len(chunk.code):
+                        res, finished = self._finish_frame(None, start_frame_count)
+                        if finished: return res
+                        continue
                     
-                op, arg = chunk.code[frame.ip]
-                frame.ip += 1
+                    op, arg = chunk.code[frame.ip]
+                    frame.ip += 1
                 
-                if op == OpCode.PUSH_CONST:
-                    self.stack.append(chunk.constants[arg])
-                elif op == OpCode.PUSH_TRUE:
-                    self.stack.append(True)
-                elif op == OpCode.PUSH_FALSE:
-                    self.stack.append(False)
-                elif op == OpCode.POP:
-                    self.stack.pop()
-                elif op == OpCode.DEFINE_GLOBAL:
-                    name = chunk.constants[arg]
-                    self.globals[name] = self.stack.pop()
-                elif op == OpCode.GET_GLOBAL:
-                    name = chunk.constants[arg]
-                    if name in self.globals:
-                        self.stack.append(self.globals[name])
-                    elif name in self.functions:
-                        self.stack.append(self.functions[name])
-                    else:
-                        raise RuntimeError(f"Undefined variable '{name}'")
-                elif op == OpCode.SET_GLOBAL:
-                    name = chunk.constants[arg]
-                    if name not in self.globals:
-                        raise RuntimeError(f"Undefined variable '{name}'")
-                    self.globals[name] = self.stack[-1]
-                elif op == OpCode.SET_GLOBAL_POP:
-                    name = chunk.constants[arg]
-                    if name not in self.globals:
-                        raise RuntimeError(f"Undefined variable '{name}'")
-                    self.globals[name] = self.stack.pop()
-                elif op == OpCode.GET_LOCAL:
-                    idx = frame.stack_start + arg
-                    self.stack.append(self.stack[idx])
-                elif op == OpCode.SET_LOCAL:
-                    idx = frame.stack_start + arg
-                    self.stack[idx] = self.stack[-1]
-                elif op == OpCode.SET_LOCAL_POP:
-                    idx = frame.stack_start + arg
-                    self.stack[idx] = self.stack.pop()
-                elif op == OpCode.GET_ATTR:
-                    obj = self.stack.pop()
-                    name = chunk.constants[arg]
-                    val = getattr(obj, name)
-                    self.stack.append(val)
-                elif op == OpCode.SET_ATTR:
-                    obj = self.stack.pop()
-                    val = self.stack.pop()
-                    name = chunk.constants[arg]
-                    setattr(obj, name, val)
-                    self.stack.append(val)
-                elif op == OpCode.SET_ATTR_POP:
-                    obj = self.stack.pop()
-                    val = self.stack.pop()
-                    name = chunk.constants[arg]
-                    setattr(obj, name, val)
-                elif op == OpCode.ADD:
-                    b = self.stack.pop()
-                    a = self.stack.pop()
-                    self.stack.append(a + b)
-                elif op == OpCode.SUB:
-                    b = self.stack.pop()
-                    a = self.stack.pop()
-                    self.stack.append(a - b)
-                elif op == OpCode.MUL:
-                    b = self.stack.pop()
-                    a = self.stack.pop()
-                    self.stack.append(a * b)
-                elif op == OpCode.DIV:
-                    b = self.stack.pop()
-                    a = self.stack.pop()
-                    self.stack.append(a / b)
-                elif op == OpCode.EQUAL:
-                    b = self.stack.pop()
-                    a = self.stack.pop()
-                    self.stack.append(a == b)
-                elif op == OpCode.NOT_EQUAL:
-                    b = self.stack.pop()
-                    a = self.stack.pop()
-                    self.stack.append(a != b)
-                elif op == OpCode.GREATER:
-                    b = self.stack.pop()
-                    a = self.stack.pop()
-                    self.stack.append(a > b if a is not None and b is not None else False)
-                elif op == OpCode.GREATER_EQUAL:
-                    b = self.stack.pop()
-                    a = self.stack.pop()
-                    self.stack.append(a >= b if a is not None and b is not None else False)
-                elif op == OpCode.LESS:
-                    b = self.stack.pop()
-                    a = self.stack.pop()
-                    self.stack.append(a < b if a is not None and b is not None else False)
-                elif op == OpCode.LESS_EQUAL:
-                    b = self.stack.pop()
-                    a = self.stack.pop()
-                    self.stack.append(a <= b if a is not None and b is not None else False)
-                elif op == OpCode.NOT:
-                    self.stack.append(not self.stack.pop())
-                elif op == OpCode.NEGATE:
-                    self.stack.append(-self.stack.pop())
-                elif op == OpCode.JUMP:
-                    frame.ip = arg
-                elif op == OpCode.JUMP_IF_FALSE:
-                    if not self.stack[-1]: frame.ip = arg
-                elif op == OpCode.JUMP_IF_FALSE_POP:
-                    if not self.stack.pop(): frame.ip = arg
-                elif op == OpCode.JUMP_IF_TRUE:
-                    if self.stack[-1]: frame.ip = arg
-                elif op == OpCode.JUMP_IF_TRUE_POP:
-                    if self.stack.pop(): frame.ip = arg
-                elif op == OpCode.INC_GLOBAL:
-                    name = chunk.constants[arg]
-                    self.globals[name] = self.globals.get(name, 0) + 1
-                elif op == OpCode.ADD_GLOBAL:
-                    name = chunk.constants[arg]
-                    val = self.stack.pop()
-                    self.globals[name] = self.globals.get(name, 0) + val
-                elif op == OpCode.SET_ATTR_FAST:
-                    name = chunk.constants[arg]
-                    val = self.stack.pop()
-                    obj = self.stack.pop()
-                    setattr(obj, name, val)
-                elif op == OpCode.LOOP:
-                    frame.ip = arg
-                elif op == OpCode.BUILD_LIST:
-                    elements = [self.stack.pop() for _ in range(arg)][::-1]
-                    self.stack.append(elements)
-                elif op == OpCode.BUILD_MAP:
-                    mapping = {}
-                    for _ in range(arg):
-                        val = self.stack.pop()
-                        key = self.stack.pop()
-                        mapping[key] = val
-                    self.stack.append(mapping)
-                elif op == OpCode.GET_ITER:
-                    self.stack.append(iter(self.stack.pop()))
-                elif op == OpCode.FOR_ITER:
-                    iterator = self.stack[-1]
-                    try:
-                        self.stack.append(next(iterator))
-                    except StopIteration:
+                    if op == OpCode.PUSH_CONST:
+                        self.stack.append(chunk.constants[arg])
+                    elif op == OpCode.PUSH_TRUE:
+                        self.stack.append(True)
+                    elif op == OpCode.PUSH_FALSE:
+                        self.stack.append(False)
+                    elif op == OpCode.POP:
                         self.stack.pop()
+                    elif op == OpCode.DEFINE_GLOBAL:
+                        name = chunk.constants[arg]
+                        self.globals[name] = self.stack.pop()
+                    elif op == OpCode.GET_GLOBAL:
+                        name = chunk.constants[arg]
+                        if name in self.globals:
+                            self.stack.append(self.globals[name])
+                        elif name in self.functions:
+                            self.stack.append(self.functions[name])
+                        else:
+                            raise RuntimeError(f"Undefined variable '{name}'")
+                    elif op == OpCode.SET_GLOBAL:
+                        name = chunk.constants[arg]
+                        if name not in self.globals:
+                            raise RuntimeError(f"Undefined variable '{name}'")
+                        self.globals[name] = self.stack[-1]
+                    elif op == OpCode.SET_GLOBAL_POP:
+                        name = chunk.constants[arg]
+                        if name not in self.globals:
+                            raise RuntimeError(f"Undefined variable '{name}'")
+                        self.globals[name] = self.stack.pop()
+                    elif op == OpCode.GET_LOCAL:
+                        idx = frame.stack_start + arg
+                        self.stack.append(self.stack[idx])
+                    elif op == OpCode.SET_LOCAL:
+                        idx = frame.stack_start + arg
+                        self.stack[idx] = self.stack[-1]
+                    elif op == OpCode.SET_LOCAL_POP:
+                        idx = frame.stack_start + arg
+                        self.stack[idx] = self.stack.pop()
+                    elif op == OpCode.GET_ATTR:
+                        obj = self.stack.pop()
+                        name = chunk.constants[arg]
+                        val = getattr(obj, name)
+                        self.stack.append(val)
+                    elif op == OpCode.SET_ATTR:
+                        obj = self.stack.pop()
+                        val = self.stack.pop()
+                        name = chunk.constants[arg]
+                        setattr(obj, name, val)
+                        self.stack.append(val)
+                    elif op == OpCode.SET_ATTR_POP:
+                        obj = self.stack.pop()
+                        val = self.stack.pop()
+                        name = chunk.constants[arg]
+                        setattr(obj, name, val)
+                    elif op == OpCode.ADD:
+                        b = self.stack.pop()
+                        a = self.stack.pop()
+                        self.stack.append(a + b)
+                    elif op == OpCode.SUB:
+                        b = self.stack.pop()
+                        a = self.stack.pop()
+                        self.stack.append(a - b)
+                    elif op == OpCode.MUL:
+                        b = self.stack.pop()
+                        a = self.stack.pop()
+                        self.stack.append(a * b)
+                    elif op == OpCode.DIV:
+                        b = self.stack.pop()
+                        a = self.stack.pop()
+                        self.stack.append(a / b)
+                    elif op == OpCode.EQUAL:
+                        b = self.stack.pop()
+                        a = self.stack.pop()
+                        self.stack.append(a == b)
+                    elif op == OpCode.NOT_EQUAL:
+                        b = self.stack.pop()
+                        a = self.stack.pop()
+                        self.stack.append(a != b)
+                    elif op == OpCode.GREATER:
+                        b = self.stack.pop()
+                        a = self.stack.pop()
+                        self.stack.append(a > b if a is not None and b is not None else False)
+                    elif op == OpCode.GREATER_EQUAL:
+                        b = self.stack.pop()
+                        a = self.stack.pop()
+                        self.stack.append(a >= b if a is not None and b is not None else False)
+                    elif op == OpCode.LESS:
+                        b = self.stack.pop()
+                        a = self.stack.pop()
+                        self.stack.append(a < b if a is not None and b is not None else False)
+                    elif op == OpCode.LESS_EQUAL:
+                        b = self.stack.pop()
+                        a = self.stack.pop()
+                        self.stack.append(a <= b if a is not None and b is not None else False)
+                    elif op == OpCode.NOT:
+                        self.stack.append(not self.stack.pop())
+                    elif op == OpCode.NEGATE:
+                        self.stack.append(-self.stack.pop())
+                    elif op == OpCode.JUMP:
+                        backward = arg < frame.ip
                         frame.ip = arg
-                elif op == OpCode.INDEX_GET:
-                    index = self.stack.pop()
-                    obj = self.stack.pop()
-                    if isinstance(obj, dict): self.stack.append(obj[index])
-                    else: self.stack.append(obj[int(index)])
-                elif op == OpCode.INDEX_SET:
-                    index = self.stack.pop()
-                    obj = self.stack.pop()
-                    val = self.stack.pop()
-                    if isinstance(obj, dict): obj[index] = val
-                    else: obj[int(index)] = val
-                    self.stack.append(val)
-                elif op == OpCode.CALL:
-                    self._call_func(arg, {}, start_frame_count)
-                elif op == OpCode.CALL_KW:
-                    num_pos_args, kw_names = arg
-                    kwargs = {name: self.stack.pop() for name in reversed(kw_names)}
-                    self._call_func(num_pos_args, kwargs, start_frame_count)
-                elif op == OpCode.RETURN:
-                    res = self.stack.pop()
-                    res, finished = self._finish_frame(res, start_frame_count)
-                    if finished: return res
-                elif op == OpCode.RETURN_NONE:
-                    res, finished = self._finish_frame(None, start_frame_count)
-                    if finished: return res
-                elif op == OpCode.YIELD:
-                    self.is_yielded = True
-                    return None
-            except VMRuntimeError:
-                raise
-            except Exception as e:
-                raise VMRuntimeError(str(e), line=self.get_current_line()) from e
+                        if backward and self._over_budget(executed):
+                            self.is_yielded = True
+                            return None
+                    elif op == OpCode.JUMP_IF_FALSE:
+                        if not self.stack[-1]: frame.ip = arg
+                    elif op == OpCode.JUMP_IF_FALSE_POP:
+                        if not self.stack.pop(): frame.ip = arg
+                    elif op == OpCode.JUMP_IF_TRUE:
+                        if self.stack[-1]: frame.ip = arg
+                    elif op == OpCode.JUMP_IF_TRUE_POP:
+                        if self.stack.pop(): frame.ip = arg
+                    elif op == OpCode.INC_GLOBAL:
+                        name = chunk.constants[arg]
+                        self.globals[name] = self.globals.get(name, 0) + 1
+                    elif op == OpCode.ADD_GLOBAL:
+                        name = chunk.constants[arg]
+                        val = self.stack.pop()
+                        self.globals[name] = self.globals.get(name, 0) + val
+                    elif op == OpCode.SET_ATTR_FAST:
+                        name = chunk.constants[arg]
+                        val = self.stack.pop()
+                        obj = self.stack.pop()
+                        setattr(obj, name, val)
+                    elif op == OpCode.LOOP:
+                        frame.ip = arg
+                        if self._over_budget(executed):
+                            self.is_yielded = True
+                            return None
+                    elif op == OpCode.BUILD_LIST:
+                        elements = [self.stack.pop() for _ in range(arg)][::-1]
+                        self.stack.append(elements)
+                    elif op == OpCode.BUILD_MAP:
+                        mapping = {}
+                        for _ in range(arg):
+                            val = self.stack.pop()
+                            key = self.stack.pop()
+                            mapping[key] = val
+                        self.stack.append(mapping)
+                    elif op == OpCode.GET_ITER:
+                        self.stack.append(iter(self.stack.pop()))
+                    elif op == OpCode.FOR_ITER:
+                        iterator = self.stack[-1]
+                        try:
+                            self.stack.append(next(iterator))
+                        except StopIteration:
+                            self.stack.pop()
+                            frame.ip = arg
+                    elif op == OpCode.CALL_RANGE:
+                        func = self.stack[-arg - 1]
+                        if func is range_of:
+                            try:
+                                counter = RangeLoop(self.stack[-arg:])
+                            except Exception as e:
+                                raise RuntimeError(f"Error calling native function {func}: {e}")
+                            del self.stack[-arg - 1:]
+                            self.stack.append(counter)
+                        else:
+                            depth = len(self.frames)
+                            self._call_func(arg, {}, start_frame_count)
+                            if len(self.frames) > depth and self._over_budget(executed):
+                                self.is_yielded = True
+                                return None
+                    elif op == OpCode.FOR_RANGE or op == OpCode.FOR_RANGE_GLOBAL:
+                        try:
+                            value = next(self.stack[-1])
+                        except StopIteration:
+                            self.stack.pop()
+                            frame.ip = arg[1]
+                        else:
+                            if op == OpCode.FOR_RANGE:
+                                self.stack[frame.stack_start + arg[0]] = value
+                            else:
+                                self.globals[chunk.constants[arg[0]]] = value
+                    elif op == OpCode.INDEX_GET:
+                        index = self.stack.pop()
+                        obj = self.stack.pop()
+                        if isinstance(obj, dict): self.stack.append(obj[index])
+                        else: self.stack.append(obj[int(index)])
+                    elif op == OpCode.INDEX_SET:
+                        index = self.stack.pop()
+                        obj = self.stack.pop()
+                        val = self.stack.pop()
+                        if isinstance(obj, dict): obj[index] = val
+                        else: obj[int(index)] = val
+                        self.stack.append(val)
+                    elif op == OpCode.CALL:
+                        depth = len(self.frames)
+                        self._call_func(arg, {}, start_frame_count)
+                        if len(self.frames) > depth and self._over_budget(executed):
+                            self.is_yielded = True
+                            return None
+                    elif op == OpCode.CALL_KW:
+                        num_pos_args, kw_names = arg
+                        kwargs = {name: self.stack.pop() for name in reversed(kw_names)}
+                        depth = len(self.frames)
+                        self._call_func(num_pos_args, kwargs, start_frame_count)
+                        if len(self.frames) > depth and self._over_budget(executed):
+                            self.is_yielded = True
+                            return None
+                    elif op == OpCode.RETURN:
+                        res = self.stack.pop()
+                        res, finished = self._finish_frame(res, start_frame_count)
+                        if finished: return res
+                    elif op == OpCode.RETURN_NONE:
+                        res, finished = self._finish_frame(None, start_frame_count)
+                        if finished: return res
+                    elif op == OpCode.YIELD:
+                        self.is_yielded = True
+                        return None
+                    # Superinstructions
+                    elif op == OpCode.GET_GLOBAL_ATTR:
+                        name = chunk.constants[arg[0]]
+                        if name in self.globals:
+                            obj = self.globals[name]
+                        elif name in self.functions:
+                            obj = self.functions[name]
+                        else:
+                            raise RuntimeError(f"Undefined variable '{name}'")
+                        self.stack.append(getattr(obj, chunk.constants[arg[1]]))
+                    elif op == OpCode.CALL_ATTR:
+                        obj = self.stack.pop()
+                        self.stack.append(getattr(obj, chunk.constants[arg]))
+                        depth = len(self.frames)
+                        self._call_func(0, {}, start_frame_count)
+                        if len(self.frames) > depth and self._over_budget(executed):
+                            self.is_yielded = True
+                            return None
+                    elif op == OpCode.CALL_POP:
+                        depth = len(self.frames)
+                        self._call_func(arg, {}, start_frame_count, discard_result=True)
+                        if len(self.frames) > depth and self._over_budget(executed):
+                            self.is_yielded = True
+                            return None
+                    elif op == OpCode.BINARY_CONST:
+                        binop, const_idx = arg
+                        a = self.stack.pop()
+                        self.stack.append(BINARY_FUNCS[binop](a, chunk.constants[const_idx]))
+                    elif op == OpCode.BINARY_LOCALS:
+                        binop, a, b = arg
+                        start = frame.stack_start
+                        self.stack.append(BINARY_FUNCS[binop](self.stack[start + a], self.stack[start + b]))
+                    elif op == OpCode.COMPARE_JUMP_IF_FALSE:
+                        cmp, target = arg
+                        b = self.stack.pop()
+                        a = self.stack.pop()
+                        if not compare(cmp, a, b): frame.ip = target
+                    elif op == OpCode.COMPARE_CONST_JUMP_IF_FALSE:
+                        cmp, const_idx, target = arg
+                        a = self.stack.pop()
+                        if not compare(cmp, a, chunk.constants[const_idx]): frame.ip = target
+                except VMRuntimeError:
+                    raise
+                except Exception as e:
+                    raise VMRuntimeError(str(e), line=self.get_current_line()) from e
+        finally:
+            self.instruction_count += executed
+            self.total_instruction_count += executed
         return None
 
     def resume(self):
@@ -346,10 +642,12 @@ class VM:
             return None
         self.is_yielded = False
         self.instruction_count = 0
+        self._slice_start = time.perf_counter()
         return self._execute()
 
     def call_function(self, name, *args):
         self.instruction_count = 0
+        self._slice_start = time.perf_counter()
         if name in self.globals:
             func = self.globals[name]
         elif name in self.functions:
@@ -362,11 +660,26 @@ class VM:
             
         self.stack.append(func)
         stack_start = len(self.stack)
-        for arg in args:
-            self.stack.append(arg)
-            
-        for _ in range(func.arity, func.locals_count):
-            self.stack.append(None)
-            
-        self.frames.append(CallFrame(func, 0, stack_start))
-        return self._execute()
+        self.stack.extend(func.calling_convention().bind_loose(args))
+
+        # Entry points such as on_tick are counted like calls from code
+        entry = 0
+        tier = self.tiering.functions.get(func)
+        if tier is not None:
+            tier.calls += 1
+            if tier.calls >= self.tiering.hot_calls:
+                self.tiering.promote(tier, "calls")
+            entry = tier.entry
+        self.frames.append(CallFrame(func, entry, stack_start))
+        # A hook may run while an earlier entry point is suspended; that one resumes at its own depth afterwards
+        outer_depth = self._entry_depth
+        self._entry_depth = len(self.frames)
+        try:
+            result = self._execute()
+        except BaseException:
+            self._entry_depth = outer_depth
+            raise
+        if len(self.frames) < self._entry_depth:
+            # Finished rather than suspended
+            self._entry_depth = outer_depth
+        return result
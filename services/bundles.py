@@ -0,0 +1,54 @@
+import hashlib
+import os
+from compiler import bytecode_format
+from compiler.bytecode_format import FormatError
+
+# Ahead-of-time compiled macros: `examples/foo.tml` is compiled by
+# precompile.py into the bundle `examples/foo.tmlc` beside it, a compiled
+# program file (compiler/bytecode_format.py) whose info records the hash of
+# the source and the compile options. A runtime started on the source loads
+# a fresh bundle instead of running the lexer, parser, analyzer and compiler.
+
+EXTENSION = ".tmlc"
+MACROS_DIR = "examples"
+
+def bundle_path(path):
+    return os.path.splitext(path)[0] + EXTENSION
+
+def source_hash(source):
+    return hashlib.md5(source.encode("utf-8")).hexdigest()
+
+def find_macro(filename, root=MACROS_DIR):
+    """Path of the macro `filename` (relative to `root`, or a bare name searched below it), or None."""
+    path = os.path.join(root, filename)
+    if os.path.exists(path):
+        return path
+    for folder, dirs, files in os.walk(root):
+        if filename in files:
+            return os.path.join(folder, filename)
+    return None
+
+def _info(source, options):
+    return {"source_hash": source_hash(source), "options": repr(sorted((options or {}).items()))}
+
+def save(path, source, chunk, functions, options=None):
+    """Writes the bundle of `source` compiled with `options` (see BytecodeCache); returns its size."""
+    return bytecode_format.save(path, chunk, functions, _info(source, options))
+
+def is_fresh(path, source, options=None):
+    """True if the bundle at `path` holds `source` compiled with `options` by this compiler."""
+    try:
+        return bytecode_format.read_info(path) == _info(source, options)
+    except (OSError, ValueError):
+        # Missing, empty, damaged, or written by another compiler (StaleFile)
+        return False
+
+def load(path, source, options=None):
+    """(chunk, functions, size) of the bundle at `path` if it is fresh for `source` and `options`, else None."""
+    if not is_fresh(path, source, options):
+        return None
+    try:
+        chunk, functions = bytecode_format.load(path)
+        return chunk, functions, os.path.getsize(path)
+    except (OSError, FormatError):
+        return None
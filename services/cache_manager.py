@@ -1,59 +1,272 @@
-import pickle
 import hashlib
 import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from compiler import bytecode_format
+from compiler.bytecode_format import FormatError, StaleFile
+
+MEMORY_LIMIT = 32 * 1024 * 1024 # bytes of .tmlc data of the programs kept in memory
+DISK_LIMIT = 128 * 1024 * 1024  # bytes of .tmlc files in the cache directory
 
 class BytecodeCache:
-    def __init__(self, cache_dir=".cache"):
+    """
+    Compiled programs in `cache_dir`, one .tmlc file (compiler/bytecode_format.py)
+    per source text, compiler version and set of compile options.
+
+    The programs loaded or stored recently are also kept in memory, least
+    recently used dropped first once their file sizes add up to more than
+    `memory_limit`, so a macro started again is not read from disk. A
+    program stays shared while any runtime still runs it, even once it left
+    that LRU: runtimes of the same source and options run one Chunk and one
+    set of FunctionObjects, which the VM never changes (its per-program
+    state lives in side tables keyed by them).
+
+    Files are dropped by last use (their modification time, which get()
+    renews) once the directory holds more than `disk_limit` bytes, or after
+    `max_age_days` in cleanup(). `counters` holds memory, disk and bundle
+    hits, misses and evictions of both tiers.
+    """
+    EXTENSION = ".tmlc"
+
+    def __init__(self, cache_dir=".cache", memory_limit=MEMORY_LIMIT, disk_limit=DISK_LIMIT):
         self.cache_dir = cache_dir
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self.memory = OrderedDict() # hash -> (chunk, functions, size)
+        self.memory_size = 0
+        # Programs still referenced by a runtime: hash -> main chunk, and main chunk -> (functions, size)
+        self.live = weakref.WeakValueDictionary()
+        self.live_programs = weakref.WeakKeyDictionary()
+        self.compiling = {} # hash -> Lock held while one thread compiles that program
+        self.disk_size = None # known after the first cleanup()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "bundle_hits": 0, "misses": 0, "evictions": 0,
+                         "disk_evictions": 0}
+        self.lock = threading.Lock()
+        self._cleanup_thread = None
         if not os.path.exists(cache_dir):
             os.makedirs(cache_dir)
 
-    def _get_hash(self, source):
-        return hashlib.md5(source.encode('utf-8')).hexdigest()
+    def _get_hash(self, source, options=None):
+        # Compiler options that change the bytecode (e.g. {"opt": 0}) get their own cache entry, and so does
+        # every compiler and file format version, so bytecode of an older compiler is never served
+        key = f"{bytecode_format.FORMAT_VERSION}\0{bytecode_format.compiler_version().hex()}\0{source}"
+        if options:
+            key += "\0" + repr(sorted(options.items()))
+        return hashlib.md5(key.encode('utf-8')).hexdigest()
+
+    def _file(self, source_hash):
+        return os.path.join(self.cache_dir, source_hash + self.EXTENSION)
+
+    def _path(self, source, options):
+        return self._file(self._get_hash(source, options))
+
+    def get(self, source, options=None):
+        """
+        (chunk, functions) of the compiled program, or (None, None). The
+        program may be shared with other runtimes and must not be changed;
+        the functions dict is a copy of its own.
+        """
+        program = self._lookup(self._get_hash(source, options))
+        if program is None:
+            with self.lock:
+                self.counters["misses"] += 1
+            return None, None
+        return program
+
+    def get_or_compile(self, source, compile, options=None, load=None):
+        """
+        (chunk, functions, cached): the program from the cache, or else from
+        compile() (returning chunk, functions), which is then stored. Threads
+        asking for the same uncompiled program at once wait for the first
+        one's compile and share its result. `load()`, if given, is tried
+        before compiling: it returns the program from a file of its own (a
+        bundle, see services/bundles.py) as (chunk, functions, size), or
+        None. Such a program is kept in memory but not written to the cache.
+        """
+        source_hash = self._get_hash(source, options)
+        program = self._lookup(source_hash)
+        if program is not None:
+            return program + (True,)
+        with self.lock:
+            pending = self.compiling.setdefault(source_hash, threading.Lock())
+        try:
+            with pending:
+                program = self._lookup(source_hash)
+                if program is not None:
+                    return program + (True,)
+                program = load() if load is not None else None
+                if program is not None:
+                    chunk, functions, size = program
+                    self._remember(source_hash, chunk, dict(functions), size)
+                    with self.lock:
+                        self.counters["bundle_hits"] += 1
+                    return chunk, functions, True
+                with self.lock:
+                    self.counters["misses"] += 1
+                chunk, functions = compile()
+                self._store(source_hash, chunk, functions)
+                return chunk, functions, False
+        finally:
+            with self.lock:
+                if self.compiling.get(source_hash) is pending:
+                    del self.compiling[source_hash]
+
+    def _lookup(self, source_hash):
+        """(chunk, functions copy) from memory, a running program or the disk, counting the hit; else None."""
+        cache_file = self._file(source_hash)
+        with self.lock:
+            entry = self.memory.get(source_hash)
+            if entry is not None:
+                self.memory.move_to_end(source_hash)
+            else:
+                chunk = self.live.get(source_hash)
+                shared = self.live_programs.get(chunk) if chunk is not None else None
+                if shared is not None:
+                    entry = (chunk,) + shared
+            if entry is not None:
+                self.counters["memory_hits"] += 1
+        if entry is not None:
+            if source_hash not in self.memory:
+                self._remember(source_hash, *entry)
+            self._touch(cache_file)
+            return entry[0], dict(entry[1])
 
-    def get(self, source):
-        source_hash = self._get_hash(source)
-        cache_file = os.path.join(self.cache_dir, f"{source_hash}.bin")
-        
         if os.path.exists(cache_file):
             try:
-                with open(cache_file, "rb") as f:
-                    data = pickle.load(f)
-                    return data['chunk'], data['functions']
+                chunk, functions = bytecode_format.load(cache_file)
+                self._touch(cache_file)
+                self._remember(source_hash, chunk, functions, os.path.getsize(cache_file))
+                with self.lock:
+                    self.counters["disk_hits"] += 1
+                return chunk, dict(functions)
+            except StaleFile:
+                self._remove(cache_file)
             except Exception as e:
                 print(f"Cache read error: {e}")
-        return None, None
+        return None
+
+    def set(self, source, chunk, functions, options=None):
+        self._store(self._get_hash(source, options), chunk, functions)
 
-    def set(self, source, chunk, functions):
-        source_hash = self._get_hash(source)
-        cache_file = os.path.join(self.cache_dir, f"{source_hash}.bin")
-        
+    def _store(self, source_hash, chunk, functions):
+        path = self._file(source_hash)
         try:
-            with open(cache_file, "wb") as f:
-                pickle.dump({
-                    'chunk': chunk,
-                    'functions': functions
-                }, f)
+            # A stale or damaged file under the same name is replaced, not added
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        try:
+            size = bytecode_format.save(path, chunk, functions)
+        except FormatError as e:
+            print(f"Cache write skipped: {e}")
+            return
         except Exception as e:
             print(f"Cache write error: {e}")
+            return
+        # The caller keeps running on `functions` and a hot reload changes the dict, so memory gets a copy
+        self._remember(source_hash, chunk, dict(functions), size)
+        with self.lock:
+            over = self.disk_size is not None and self.disk_size + size - replaced > self.disk_limit
+            if self.disk_size is not None:
+                self.disk_size += size - replaced
+        if over:
+            self.start_cleanup()
+
+    def _remember(self, source_hash, chunk, functions, size):
+        with self.lock:
+            self.live[source_hash] = chunk
+            self.live_programs[chunk] = (functions, size)
+            if size > self.memory_limit:
+                return
+            old = self.memory.pop(source_hash, None)
+            if old is not None:
+                self.memory_size -= old[2]
+            self.memory[source_hash] = (chunk, functions, size)
+            self.memory_size += size
+            while self.memory_size > self.memory_limit:
+                _, (_, _, dropped) = self.memory.popitem(last=False)
+                self.memory_size -= dropped
+                self.counters["evictions"] += 1
+
+    def _touch(self, path):
+        # Marks the file as used for the disk LRU and for the age limit
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _remove(self, path):
+        # A file still mapped by a running macro cannot be removed on Windows; it goes on a later cleanup
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats.update(memory_entries=len(self.memory), memory_bytes=self.memory_size, disk_bytes=self.disk_size,
+                         live_programs=len(self.live))
+        return stats
 
     def clear(self):
+        with self.lock:
+            self.memory.clear()
+            self.memory_size = 0
+            self.live.clear()
+            self.live_programs.clear()
         for file in os.listdir(self.cache_dir):
-            os.remove(os.path.join(self.cache_dir, file))
+            self._remove(os.path.join(self.cache_dir, file))
+        self.disk_size = None
+
+    def start_cleanup(self, max_age_days=7):
+        """Runs cleanup() on a background thread, unless one is running already."""
+        with self.lock:
+            if self._cleanup_thread is not None and self._cleanup_thread.is_alive():
+                return
+            thread = self._cleanup_thread = threading.Thread(
+                target=self.cleanup, args=(max_age_days,), name="TML-Cache-Cleanup", daemon=True)
+        thread.start()
 
     def cleanup(self, max_age_days=7):
-        """Removes cache files older than max_age_days."""
-        import time
+        """
+        Removes cache files older than max_age_days, then the least recently
+        used ones until the directory fits in disk_limit.
+        """
         now = time.time()
         max_age_seconds = max_age_days * 24 * 60 * 60
-        
+
         count = 0
-        for filename in os.listdir(self.cache_dir):
-            file_path = os.path.join(self.cache_dir, filename)
-            if os.path.isfile(file_path):
-                file_age = now - os.path.getmtime(file_path)
-                if file_age > max_age_seconds:
-                    os.remove(file_path)
+        kept = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_file():
+                continue
+            try:
+                info = entry.stat()
+            except OSError:
+                continue
+            # Pickled caches of earlier versions (.bin) are never read again
+            stale = not entry.name.endswith((self.EXTENSION, ".tmp"))
+            if now - info.st_mtime > max_age_seconds or stale:
+                if self._remove(entry.path):
                     count += 1
-        if count > 0:
-            print(f"Cleaned up {count} old cache files.")
+                    continue
+            kept.append((info.st_mtime, info.st_size, entry.path))
+
+        kept.sort()
+        total = sum(size for _, size, _ in kept)
+        evicted = 0
+        for _, size, path in kept:
+            if total <= self.disk_limit:
+                break
+            if self._remove(path):
+                total -= size
+                evicted += 1
+        with self.lock:
+            self.disk_size = total
+            self.counters["disk_evictions"] += evicted
+        if count or evicted:
+            print(f"Cleaned up {count + evicted} old cache files.")
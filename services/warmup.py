@@ -0,0 +1,104 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PyQt6.QtCore import QObject, pyqtSignal
+from services import bundles
+from services.config_manager import ConfigManager
+
+class WarmupService(QObject):
+    """
+    Compiles the macro library into the bytecode cache in the background, so
+    the first start of a macro after launch takes it from memory instead of
+    compiling (see MacroRuntime.precompile). Macros bound to hotkeys in
+    config.json go first. A watcher thread rescans the folder every
+    POLL_INTERVAL seconds and warms up macros that were added or edited;
+    nothing runs on the UI thread.
+    """
+    progress = pyqtSignal(int, int, str) # done, total, macro just warmed up
+
+    WORKERS = 2
+    POLL_INTERVAL = 2.0
+
+    def __init__(self, controller, root=bundles.MACROS_DIR, workers=WORKERS):
+        super().__init__()
+        self.controller = controller
+        self.root = root
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="TML-Warmup")
+        self.mtimes = {} # path -> modification time of the version queued last
+        self.lock = threading.Lock()
+        self.done = 0
+        self.total = 0
+        self.compiled = 0
+        self.stop_event = threading.Event()
+        self.watcher = None
+
+    def start(self):
+        if self.watcher is None:
+            self.watcher = threading.Thread(target=self._watch, name="TML-Warmup-Watch", daemon=True)
+            self.watcher.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _watch(self):
+        while not self.stop_event.is_set():
+            try:
+                self.scan()
+            except Exception as e:
+                print(f"[Warmup] Scan failed: {e}")
+            self.stop_event.wait(self.POLL_INTERVAL)
+
+    def _name(self, path):
+        # The name the manager and the hotkeys give the macro
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def scan(self):
+        """Queues the macros that are new or changed since the last scan, hotkey-bound ones first."""
+        changed = []
+        seen = set()
+        for folder, dirs, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith(".tml"):
+                    continue
+                path = os.path.join(folder, name)
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    continue
+                seen.add(path)
+                if self.mtimes.get(path) != mtime:
+                    self.mtimes[path] = mtime
+                    changed.append(path)
+        for path in [path for path in self.mtimes if path not in seen]:
+            del self.mtimes[path]
+        if not changed:
+            return 0
+
+        bound = set(ConfigManager.load().get("hotkeys", {}))
+        changed.sort(key=lambda path: (self._name(path) not in bound, path))
+        with self.lock:
+            if self.done == self.total:
+                self.done = self.total = self.compiled = 0
+            self.total += len(changed)
+        for path in changed:
+            self.pool.submit(self._warm, path)
+        return len(changed)
+
+    def _warm(self, path):
+        name = self._name(path)
+        compiled = False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                source = f.read()
+            compiled = self.controller.precompile(name, source, bundles.bundle_path(path))
+        except Exception as e:
+            # The macro shows the same error when started; it is retried once the file changes
+            print(f"[Warmup] {name}: {e}")
+        with self.lock:
+            self.done += 1
+            self.compiled += compiled
+            done, total, count = self.done, self.total, self.compiled
+        if done == total:
+            print(f"[Warmup] {total} macros ready, {count} compiled.")
+        self.progress.emit(done, total, name)
@@ -137,7 +137,12 @@ class ConsoleWidget(QFrame):
                 if frame.function:
                     func_name = frame.function.name
                     local_names = getattr(frame.function, "local_names", [])
-                    
+                else:
+                    # Top-level code compiled with @meta toplevel_locals keeps its variables in slots too
+                    func_name = "<main>"
+                    local_names = getattr(runtime.vm.chunk, "local_names", [])
+
+                if local_names:
                     for i, name in enumerate(local_names):
                         stack_idx = frame.stack_start + i
                         if stack_idx < len(runtime.vm.stack):
@@ -1,35 +1,107 @@
-from PyQt6.Qsci import QsciScintilla, QsciLexerPython, QsciAPIs
+from PyQt6.Qsci import QsciScintilla, QsciLexerCustom, QsciAPIs, QsciStyle
 from PyQt6.QtGui import QFont, QColor
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer
+from compiler.incremental import (IncrementalDocument, STYLE_DEFAULT, STYLE_KEYWORD, STYLE_BUILTIN,
+                                  STYLE_FUNCTION, STYLE_STRING, STYLE_NUMBER, STYLE_COMMENT,
+                                  STYLE_OPERATOR, STYLE_IDENTIFIER, STYLE_META, STYLE_ERROR)
 
-class TMLLexer(QsciLexerPython):
+# Modules and core objects, highlighted as built-ins
+MODULES = ["keyboard", "mouse", "time", "math", "random", "window", "screen", "system", "net", "tick",
+           "macro", "sound", "storage", "ui", "Vector"]
+
+# Scintilla modification flags (SCN_MODIFIED)
+SC_MOD_INSERTTEXT = 0x1
+SC_MOD_DELETETEXT = 0x2
+SC_FOLDLEVELBASE = 0x400
+SC_FOLDLEVELHEADERFLAG = 0x2000
+
+# Idle time before the diagnostics are refreshed after an edit
+DIAGNOSTICS_DELAY_MS = 300
+
+def _utf8_len(text):
+    return len(text.encode("utf-8"))
+
+class TMLLexer(QsciLexerCustom):
     """
-    Custom Lexer for TML based on Python lexer.
-    Forces specific keywords to be highlighted by injecting them into the keyword list.
+    Highlights TML with the compiler's own tokens. The editor keeps an
+    IncrementalDocument in sync with its text, and styleText colours each
+    line from the document's cached spans.
     """
-    def __init__(self, parent=None):
+    # Monokai palette
+    STYLES = {
+        STYLE_DEFAULT: ("Default", "#f8f8f2"),
+        STYLE_KEYWORD: ("Keyword", "#f92672"),
+        STYLE_BUILTIN: ("Built-in", "#66d9ef"),
+        STYLE_FUNCTION: ("Function", "#a6e22e"),
+        STYLE_STRING: ("String", "#e6db74"),
+        STYLE_NUMBER: ("Number", "#ae81ff"),
+        STYLE_COMMENT: ("Comment", "#75715e"),
+        STYLE_OPERATOR: ("Operator", "#f92672"),
+        STYLE_IDENTIFIER: ("Identifier", "#fd971f"),
+        STYLE_META: ("Meta", "#66d9ef"),
+        STYLE_ERROR: ("Error", "#f8f8f0"),
+    }
+
+    def __init__(self, parent, document, font):
         super().__init__(parent)
-        
-    def keywords(self, set_idx):
-        # Set 1 is the standard keyword set for Python lexer (Control Flow)
-        if set_idx == 1:
-            python_keywords = super().keywords(1) or ""
-            tml_control = "let func set if else while break return function async await try catch finally"
-            return f"{python_keywords} {tml_control}"
-        
-        # Set 2 is for Built-ins/Modules in QsciLexerPython (usually highlighted differently)
-        if set_idx == 2:
-            # We use this for modules and core objects
-            tml_modules = "keyboard mouse time math random window screen system net tick macro Vector"
-            return tml_modules
-            
-        return super().keywords(set_idx)
+        self.document = document
+        self.setDefaultFont(font)
+        self.setDefaultPaper(QColor("#272822"))
+        self.setDefaultColor(QColor("#f8f8f2"))
+        for style, (_, color) in self.STYLES.items():
+            self.setColor(QColor(color), style)
+            self.setPaper(QColor("#272822"), style)
+            self.setFont(font, style)
+        self.setPaper(QColor("#f92672"), STYLE_ERROR)
+
+    def language(self):
+        return "TML"
+
+    def description(self, style):
+        return self.STYLES.get(style, ("",))[0]
+
+    def styleText(self, start, end):
+        editor = self.editor()
+        if editor is None:
+            return
+        lines = self.document.lines
+        first = editor.SendScintilla(QsciScintilla.SCI_LINEFROMPOSITION, start)
+        last = min(editor.SendScintilla(QsciScintilla.SCI_LINEFROMPOSITION, end), len(lines) - 1)
+        for line in range(first, last + 1):
+            self.startStyling(editor.SendScintilla(QsciScintilla.SCI_POSITIONFROMLINE, line))
+            text = lines[line]
+            done = 0 # characters styled so far
+            for span_start, span_end, style in self.document.line_spans(line):
+                span_start = max(span_start, done)
+                if span_end <= span_start:
+                    continue
+                if span_start > done:
+                    self.setStyling(_utf8_len(text[done:span_start]), STYLE_DEFAULT)
+                self.setStyling(_utf8_len(text[span_start:span_end]), style)
+                done = span_end
+            # The rest of the line and its line break
+            rest = editor.lineLength(line) - _utf8_len(text[:done])
+            if rest > 0:
+                self.setStyling(rest, STYLE_DEFAULT)
+
+        # Fold points from the indent stacks, the line before the range included (it may have become a header)
+        infos = self.document.infos
+        for line in range(max(first - 1, 0), last + 1):
+            depth = len(infos[line].end[0]) - 1
+            level = SC_FOLDLEVELBASE + depth
+            if line + 1 < len(infos) and len(infos[line + 1].end[0]) - 1 > depth:
+                level |= SC_FOLDLEVELHEADERFLAG
+            editor.SendScintilla(QsciScintilla.SCI_SETFOLDLEVEL, line, level)
 
 class TMLScintilla(QsciScintilla):
     def __init__(self, parent=None):
         super().__init__(parent)
+        # Tokens, highlighting and diagnostics, updated line by line as the text changes
+        self.document = IncrementalDocument(builtins=MODULES)
         self.setup_editor()
         self.setup_autocomplete()
+        self.setup_diagnostics()
+        self.SCN_MODIFIED.connect(self.on_modified)
 
     def setup_editor(self):
         # Font
@@ -65,23 +137,8 @@ class TMLScintilla(QsciScintilla):
         self.setSelectionBackgroundColor(QColor("#49483e"))
         self.setSelectionForegroundColor(QColor("#f8f8f2"))
 
-        # Lexer (Customized TML Lexer)
-        self.lexer = TMLLexer(self)
-        self.lexer.setDefaultFont(font)
-        self.lexer.setDefaultPaper(QColor("#272822"))
-        self.lexer.setDefaultColor(QColor("#f8f8f2"))
-        
-        # Monokai Palette
-        self.lexer.setColor(QColor("#f92672"), QsciLexerPython.Keyword) 
-        self.lexer.setColor(QColor("#66d9ef"), 14)
-        self.lexer.setColor(QColor("#66d9ef"), QsciLexerPython.ClassName)
-        self.lexer.setColor(QColor("#a6e22e"), QsciLexerPython.FunctionMethodName)
-        self.lexer.setColor(QColor("#e6db74"), QsciLexerPython.DoubleQuotedString)
-        self.lexer.setColor(QColor("#e6db74"), QsciLexerPython.SingleQuotedString)
-        self.lexer.setColor(QColor("#75715e"), QsciLexerPython.Comment)
-        self.lexer.setColor(QColor("#ae81ff"), QsciLexerPython.Number)
-        self.lexer.setColor(QColor("#f92672"), QsciLexerPython.Operator)
-        self.lexer.setColor(QColor("#fd971f"), QsciLexerPython.Identifier)
+        # Lexer (the compiler's tokens via the incremental document)
+        self.lexer = TMLLexer(self, self.document, font)
         
         # Brace matching
         self.setBraceMatching(QsciScintilla.BraceMatch.SloppyBraceMatch)
@@ -107,8 +164,7 @@ class TMLScintilla(QsciScintilla):
         keywords = ["if", "else", "while", "break", "return", "function", "async", "await", "try", "catch", "finally", "let", "func", "set"]
         for k in keywords: self.api.add(k)
         
-        modules = ["keyboard", "mouse", "time", "math", "random", "window", "screen", "system", "net", "tick", "macro", "sound", "storage", "ui"]
-        for m in modules: self.api.add(m)
+        for m in MODULES: self.api.add(m)
         
         tml_api = [
             "math.sin", "math.cos", "math.tan", "math.sqrt", "math.abs", "math.floor", 
@@ -145,6 +201,51 @@ class TMLScintilla(QsciScintilla):
         self.setAutoCompletionCaseSensitivity(False)
         self.setAutoCompletionReplaceWord(True)
 
+    def setup_diagnostics(self):
+        # Lexer and syntax errors: a squiggle under the line and the message boxed below it
+        self.error_indicator = self.indicatorDefine(QsciScintilla.IndicatorStyle.SquiggleIndicator)
+        self.setIndicatorForegroundColor(QColor("#f92672"), self.error_indicator)
+        self.setAnnotationDisplay(QsciScintilla.AnnotationDisplay.AnnotationBoxed)
+        self.diagnostic_style = QsciStyle(-1, "Diagnostic", QColor("#f92672"), QColor("#3e3d32"), QFont("Consolas", 10))
+
+        self.diagnostics_timer = QTimer(self)
+        self.diagnostics_timer.setSingleShot(True)
+        self.diagnostics_timer.setInterval(DIAGNOSTICS_DELAY_MS)
+        self.diagnostics_timer.timeout.connect(self.show_diagnostics)
+
+    def line_text(self, line):
+        return self.text(line).rstrip("\r\n")
+
+    def on_modified(self, position, modification_type, text, length, lines_added, *rest):
+        if not modification_type & (SC_MOD_INSERTTEXT | SC_MOD_DELETETEXT):
+            return
+        # Notified after the change: an insert turned one line into 1 + lines_added, a delete merged 1 - lines_added into one
+        first = self.SendScintilla(QsciScintilla.SCI_LINEFROMPOSITION, position)
+        if modification_type & SC_MOD_INSERTTEXT:
+            removed, added = 1, 1 + lines_added
+        else:
+            removed, added = 1 - lines_added, 1
+        self.document.edit(first, removed, [self.line_text(line) for line in range(first, first + added)])
+        if len(self.document.lines) != self.lines():
+            # Out of step (should not happen): start over from the full text
+            self.document.set_text("\n".join(self.line_text(line) for line in range(self.lines())))
+        self.diagnostics_timer.start()
+
+    def show_diagnostics(self):
+        self.clearAnnotations()
+        last = self.lines() - 1
+        self.clearIndicatorRange(0, 0, last, self.lineLength(last), self.error_indicator)
+        messages = {}
+        for line, column, message in self.document.diagnostics():
+            index = line - 1
+            if index > last:
+                continue
+            text = self.line_text(index)
+            self.fillIndicatorRange(index, column - 1 if column else 0, index, max(len(text), 1), self.error_indicator)
+            messages.setdefault(index, []).append(f"{message} (column {column})" if column else message)
+        for index, lines in messages.items():
+            self.annotate(index, "\n".join(lines), self.diagnostic_style)
+
     def keyPressEvent(self, event):
         char = event.text()
         pairs = {'(': ')', '[': ']', '{': '}', '"': '"', "'": "'"}
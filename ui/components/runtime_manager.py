@@ -5,7 +5,7 @@ from PyQt6.QtWidgets import QMessageBox
 from ui.overlay import HUDOverlay
 
 class RuntimeManager(QObject):
-    stats_updated = pyqtSignal(int, int) # ips, total
+    stats_updated = pyqtSignal(int, int, dict) # ips, total, vm and bytecode cache counters
     status_updated = pyqtSignal(str, str) # text, color
     error_occurred = pyqtSignal(str)
     
@@ -15,6 +15,7 @@ class RuntimeManager(QObject):
         self.window = parent_window
         self.last_total_instr = 0
         self.last_stats_time = time.time()
+        self.last_tier_event = time.time()
         
     def run_macro(self, current_file, source, limit):
         if not current_file or not source.strip():
@@ -38,6 +39,14 @@ class RuntimeManager(QObject):
         # Set initial limit for the new runtime
         QTimer.singleShot(100, lambda: self.apply_initial_speed(current_file, limit))
 
+    def hot_reload(self, current_file, source):
+        if not current_file or not source.strip():
+            return
+        if self.controller.hot_reload(current_file, source):
+            self.window.console_widget.console.append(f"[Editor] Hot-reloading {current_file}...")
+        else:
+            self.window.console_widget.console.append(f"[Editor] {current_file} is not running, nothing to reload.")
+
     def apply_initial_speed(self, current_file, limit):
         with self.controller.lock:
             if current_file in self.controller.runtimes:
@@ -69,14 +78,30 @@ class RuntimeManager(QObject):
         elapsed = now - self.last_stats_time
         if elapsed >= 0.5:
             total_instr = 0
+            counters = {"attr_hits": 0, "attr_misses": 0, "hot": 0, "native_time": 0.0, "interp_time": 0.0}
+            events = []
             with self.controller.lock:
                 for r in self.controller.runtimes.values():
                     total_instr += r.vm.total_instruction_count
+                    cache = r.vm.attr_cache_stats()
+                    counters["attr_hits"] += cache["hits"]
+                    counters["attr_misses"] += cache["misses"]
+                    tiers = r.vm.tier_stats()
+                    counters["hot"] += tiers["hot"]
+                    counters["native_time"] += tiers["time"]["native"]
+                    counters["interp_time"] += tiers["time"]["interpreter"]
+                    events.extend(e for e in list(r.vm.tiering.events) if e[0] > self.last_tier_event)
+
+            for stamp, name, action, reason in sorted(events):
+                color = "#4CAF50" if action == "promote" else "#FF9800"
+                self.window.console_widget.console.append(f"<span style='color: {color};'>[Tier] {action} {name}: {reason}</span>")
+                self.last_tier_event = max(self.last_tier_event, stamp)
             
+            counters["code_cache"] = self.controller.cache_stats()
             delta_instr = total_instr - self.last_total_instr
             ips = int(delta_instr / elapsed)
             
-            self.stats_updated.emit(ips, total_instr)
+            self.stats_updated.emit(ips, total_instr, counters)
             self.last_total_instr = total_instr
             self.last_stats_time = now
 
@@ -234,6 +234,9 @@ class MacroEditorWindow(QMainWindow):
         self.goto_line_shortcut = QShortcut(QKeySequence("Ctrl+G"), self)
         self.goto_line_shortcut.activated.connect(self.on_goto_line)
         
+        self.hot_reload_shortcut = QShortcut(QKeySequence("Ctrl+Shift+R"), self)
+        self.hot_reload_shortcut.activated.connect(self.on_hot_reload)
+
         self.clear_console_shortcut = QShortcut(QKeySequence("Ctrl+L"), self)
         self.clear_console_shortcut.activated.connect(self.console_widget.clear)
 
@@ -494,6 +497,12 @@ class MacroEditorWindow(QMainWindow):
     def on_stop(self):
         self.runtime_manager.stop_macro(self.current_file)
 
+    def on_hot_reload(self):
+        editor = self.get_current_editor()
+        if not self.current_file or not editor or isinstance(editor, QTextBrowser):
+            return
+        self.runtime_manager.hot_reload(self.current_file, editor.text())
+
     def on_speed_changed(self, index):
         speed_map = {0: 5, 1: 50, 2: 100, 3: 250, 4: 500, 5: 1000, 6: 2000, 7: 5000, 8: 1000000}
         limit = speed_map.get(index, 1000)
@@ -503,8 +512,19 @@ class MacroEditorWindow(QMainWindow):
         
         self.console_widget.console.append(f"[Editor] Execution speed set to {self.speed_combo.currentText()}")
 
-    def on_stats_updated(self, ips, total_instr):
-        self.lbl_status_stats.setText(f"IPS: {ips:,} | Total: {total_instr:,}")
+    def on_stats_updated(self, ips, total_instr, counters):
+        text = f"IPS: {ips:,} | Total: {total_instr:,}"
+        lookups = counters["attr_hits"] + counters["attr_misses"]
+        if lookups:
+            text += f" | Attr cache: {counters['attr_hits'] / lookups:.1%}"
+        run_time = counters["native_time"] + counters["interp_time"]
+        if counters["hot"] and run_time:
+            text += f" | Tiers: {counters['hot']} hot, {counters['native_time'] / run_time:.0%} native"
+        code_cache = counters.get("code_cache")
+        if code_cache and code_cache["memory_hits"] + code_cache["disk_hits"] + code_cache["bundle_hits"]:
+            text += (f" | Code cache: {code_cache['memory_hits']} memory, {code_cache['disk_hits']} disk, "
+                     f"{code_cache['bundle_hits']} bundle hits")
+        self.lbl_status_stats.setText(text)
 
     def on_bind(self):
         if not self.current_file:
@@ -6,6 +6,7 @@ from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
 from PyQt6.QtCore import Qt, QTimer, QThread, pyqtSignal
 from PyQt6.QtGui import QFont, QColor
 from services.config_manager import ConfigManager
+from services import bundles
 import time
 
 class MacroManagerWindow(QMainWindow):
@@ -66,6 +67,10 @@ class MacroManagerWindow(QMainWindow):
         header.addWidget(title)
         header.addStretch()
         
+        self.warmup_label = QLabel("")
+        self.warmup_label.setStyleSheet("color: #858585; font-size: 11px;")
+        header.addWidget(self.warmup_label)
+        
         self.status_dot = QLabel("●")
         self.status_dot.setStyleSheet("color: #a6e22e; font-size: 14px;") # Green for active
         header.addWidget(self.status_dot)
@@ -132,6 +137,15 @@ class MacroManagerWindow(QMainWindow):
                         item.setData(Qt.ItemDataRole.UserRole, rel_path)
                         self.macro_list.addItem(item)
 
+    def on_warmup_progress(self, done, total, name):
+        """Progress of the background compile of the macro library (services/warmup.py)."""
+        if done < total:
+            self.warmup_label.setText(f"Compiling {done}/{total}")
+            self.warmup_label.setToolTip(name)
+        else:
+            self.warmup_label.setText("")
+            self.warmup_label.setToolTip("")
+
     def update_ui_status(self):
         # 0. Cleanup finished runtimes
         self.controller.cleanup_finished()
@@ -166,15 +180,8 @@ class MacroManagerWindow(QMainWindow):
         menu.exec(self.macro_list.mapToGlobal(pos))
 
     def run_macro(self, filename):
-        path = os.path.join("examples", filename)
-        if not os.path.exists(path):
-            # Try recursive search if not found in root examples
-            for root, dirs, files in os.walk("examples"):
-                if filename in files:
-                    path = os.path.join(root, filename)
-                    break
-
-        if os.path.exists(path):
+        path = bundles.find_macro(filename)
+        if path is not None:
             try:
                 with open(path, "r", encoding="utf-8") as f:
                     source = f.read()
@@ -184,7 +191,8 @@ class MacroManagerWindow(QMainWindow):
                 overlay = HUDOverlay()
                 self.controller.set_overlay(filename, overlay)
                 
-                self.controller.add_runtime(filename, source)
+                # A fresh precompiled bundle beside the source skips compiling (python precompile.py)
+                self.controller.add_runtime(filename, source, bundle=bundles.bundle_path(path))
             except Exception as e:
                 print(f"Error running macro {filename}: {e}")
 
@@ -0,0 +1,329 @@
+"""
+Conformance check of the Python backend (@meta {"backend": "py"}), of
+tiered execution, of the optimization levels (opt 0 and 2), of the
+switch engine, of toplevel_locals and of quickening against the bytecode
+interpreter.
+
+Every example is compiled once per backend and run with the same
+hook sequence the runtime uses (top-level code, on_init, a few on_tick
+calls, on_hotkey). The stdlib objects are replaced by recorders, so no
+input is sent to the real mouse or keyboard and results are deterministic.
+Output, errors and final globals must match; with toplevel_locals, the
+globals that escape the top-level code. The tiered run uses low
+hotness thresholds, so functions are promoted while the macro runs. Macros that are still
+suspended by their instruction budget at the end only have to agree on
+the output both runs produced: backends and optimization levels split
+time slices at different points, so the length of that output may differ.
+
+Separately, programs that call functions inside long loops are run to
+the end on both VM engines with every instruction limit around the
+default, so that slices suspend at every point of the loop, including
+the entry of a callee. The whole output must equal an unlimited run.
+Last, `range` values and top-level for loops (which define their loop
+variable) are run on both backends and engines.
+
+Usage: python verify_backends.py [file_or_directory ...]
+"""
+import os
+import sys
+from compiler.lexer import Lexer
+from compiler.parser import Parser
+from compiler.compiler import Compiler
+from runtime.vm.vm import VM
+from runtime.vm.base import range_of
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "examples")
+MODULES = ["mouse", "key", "keyboard", "time", "math", "random", "window", "win", "screen",
+           "system", "net", "sound", "storage", "ui", "macro", "Key"]
+KEY_NAMES = ([chr(c) for c in range(ord("A"), ord("Z") + 1)] + [str(d) for d in range(10)] +
+             [f"F{i}" for i in range(1, 13)] +
+             ["ENTER", "ESC", "SPACE", "TAB", "BACKSPACE", "DELETE", "INSERT", "HOME", "END",
+              "PAGE_UP", "PAGE_DOWN", "UP", "DOWN", "LEFT", "RIGHT", "SHIFT", "CTRL", "ALT", "CAPS_LOCK"])
+BUDGET_OPTIONS = ("no_limit", "instruction_limit", "time_slice_ms")
+INSTRUCTION_LIMIT = 3000
+MAX_RESUMES = 20
+TICKS = 15
+# Thresholds of the tiered run: promotes on_tick and loop-heavy functions mid-run
+TIERED_OPTIONS = {"hot_calls": 3, "hot_loops": 200}
+# Interpreter runs checked against the default one: the optimizer's levels, the other
+# engine, top-level code in frame slots (compiler/escape.py) and quickening
+VARIANTS = {"opt 0": {"opt": 0}, "opt 2": {"opt": 2}, "switch": {"engine": "switch"},
+            "toplevel_locals": {"toplevel_locals": True}, "quicken": {"quicken": True}}
+
+class Recorder:
+    """Stands in for a stdlib object: every method call is appended to the log."""
+    def __init__(self, name, log):
+        self._name = name
+        self._log = log
+
+    def __getattr__(self, attr):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        if attr in ("x", "y", "delta", "active"):
+            return 1.5
+        def method(*args, **kwargs):
+            self._log.append((self._name, attr, repr(args), repr(sorted(kwargs.items()))))
+            if attr.startswith("is_"):
+                return False
+            if attr.startswith("get") or attr.startswith("time"):
+                return 7.0
+            return None
+        return method
+
+    def __repr__(self):
+        return f"<{self._name}>"
+
+def make_globals(log):
+    g = {name: Recorder(name, log) for name in MODULES}
+    g.update({f"K_{name}": f"K_{name}" for name in KEY_NAMES})
+    g.update({
+        "left": "left", "right": "right", "middle": "middle",
+        "tick": Recorder("tick", log),
+        "exit": lambda: log.append(("exit",)),
+        "stop": lambda: log.append(("exit",)),
+        "sleep": lambda s: log.append(("sleep", s)),
+        "print": lambda *args: log.append(("print", repr(args))),
+        "int": int, "float": float, "str": str, "len": len, "type": type, "range": range_of, "None": None,
+    })
+    return g
+
+def drive(vm, log, func_name=None, *args):
+    """Runs one entry point to completion (or MAX_RESUMES slices) and records the outcome."""
+    try:
+        if func_name is None:
+            result = vm.run(*args)
+        else:
+            result = vm.call_function(func_name, *args)
+        resumes = 0
+        while vm.is_yielded and resumes < MAX_RESUMES:
+            vm.resume()
+            resumes += 1
+        log.append(("result", repr(result)))
+    except Exception as e:
+        log.append(("error", str(e), getattr(e, "line", None)))
+        vm.frames.clear()
+        vm.stack.clear()
+        vm.is_yielded = False
+
+def run(source, backend, load=None, engine=None, quicken=None, **options):
+    """
+    Runs the hook sequence; `load(chunk, functions)` may replace the compiled
+    program (see verify_cache.py). `engine` and `quicken` override the VM's
+    @meta settings, and `options` are passed on to the Compiler (e.g. opt).
+    """
+    log = []
+    host = make_globals(log)
+    # The host names, as MacroRuntime passes them: a `let` of one of them stays a global
+    compiler = Compiler(backend=backend, builtins=tuple(host), **options)
+    chunk = compiler.compile(Parser(Lexer(source).tokenize()).parse())
+    functions = compiler.functions
+    if load is not None:
+        chunk, functions = load(chunk, functions)
+    # A fixed instruction budget, so macros that loop forever still end
+    chunk.metadata = {k: v for k, v in chunk.metadata.items() if k not in BUDGET_OPTIONS}
+    chunk.metadata["backend"] = backend
+    if backend == "tiered":
+        chunk.metadata.update(TIERED_OPTIONS)
+    if engine is not None:
+        chunk.metadata["engine"] = engine
+    if quicken is not None:
+        chunk.metadata["quicken"] = quicken
+
+    vm = VM(globals=host)
+    vm.instruction_limit = INSTRUCTION_LIMIT
+    drive(vm, log, None, chunk, functions)
+    suspended = vm.is_yielded
+    hooks = [("on_init", ()), ("on_s1", ())] + [("on_tick", (0.016,))] * TICKS + [("on_hotkey", ("K_F7",))]
+    for name, args in hooks:
+        if name in functions:
+            log.append(("call", name))
+            drive(vm, log, name, *args)
+            suspended = suspended or vm.is_yielded
+
+    g = {name: repr(value) for name, value in vm.globals.items()
+         if not callable(value) and not isinstance(value, Recorder)}
+    return {"log": log, "globals": g, "suspended": suspended, "fallbacks": compiler.native_fallbacks,
+            "promotions": vm.tiering.promotions, "locals": set(chunk.local_names)}
+
+def compare(path):
+    with open(path, "r", encoding="utf-8") as f:
+        source = f.read()
+    try:
+        reference = run(source, "bytecode")
+        results = {backend: run(source, backend) for backend in ("py", "tiered")}
+        results.update({name: run(source, "bytecode", **options) for name, options in VARIANTS.items()})
+    except Exception as e:
+        return False, f"compile error: {e}"
+
+    notes = [f"interpreted: {name} ({reason})" for name, reason in results["py"]["fallbacks"].items()]
+    notes.append(f"tiered: {results['tiered']['promotions']} promoted")
+    ok = True
+    for backend, result in results.items():
+        if not conforms(reference, dict(result), backend, notes):
+            ok = False
+    return ok, "; ".join(notes)
+
+def conforms(reference, native, backend, notes):
+    reference = dict(reference)
+    if native["locals"]:
+        # Top-level variables nothing outside the top-level code reads are frame slots, not globals
+        reference["globals"] = {name: value for name, value in reference["globals"].items()
+                                if name not in native["locals"]}
+    if reference["suspended"] or native["suspended"]:
+        # Where an entry point returned depends on the slice split, so only output is compared
+        reference["log"] = [e for e in reference["log"] if e[0] not in ("result", "call")]
+        native["log"] = [e for e in native["log"] if e[0] not in ("result", "call")]
+        n = min(len(reference["log"]), len(native["log"]))
+        ok = reference["log"][:n] == native["log"][:n]
+        notes.append(f"{backend}: budget-bound, compared {n} events")
+    else:
+        ok = reference["log"] == native["log"] and reference["globals"] == native["globals"]
+
+    if not ok:
+        for i, (a, b) in enumerate(zip(reference["log"], native["log"])):
+            if a != b:
+                notes.append(f"event {i}: bytecode {a!r} != {backend} {b!r}")
+                break
+        else:
+            if reference["globals"] != native["globals"]:
+                notes.append(f"{backend}: globals differ")
+            else:
+                notes.append(f"{backend}: event count {len(reference['log'])} != {len(native['log'])}")
+    return ok
+
+# Calls at top level and in a hook, one of them into a function that yields
+SLICING_SOURCE = """
+func f(x):
+    return x + 1
+func g(x):
+    yield
+    return x * 2
+func on_tick(delta):
+    let j = 0
+    let s = 0
+    while j < 300:
+        set s = f(s)
+        set j = j + 1
+    print("tick", s, g(s))
+let t = 0
+let i = 0
+while i < 2000:
+    set t = f(t)
+    set i = i + 1
+print(t)
+"""
+
+def run_sliced(source, engine, limit):
+    """Output and final suspension state of top-level code and one on_tick, resumed until they finish."""
+    log = []
+    compiler = Compiler(opt=1) # f is not inlined, so every iteration calls it
+    chunk = compiler.compile(Parser(Lexer(source).tokenize()).parse())
+    chunk.metadata["instruction_limit"] = limit
+    vm = VM(globals=make_globals(log), engine=engine)
+    for entry in (None, "on_tick"):
+        if entry is None:
+            vm.run(chunk, compiler.functions)
+        else:
+            vm.call_function(entry, 0.016)
+        resumes = 0
+        while vm.is_yielded and resumes < 1000:
+            vm.resume()
+            resumes += 1
+    return printed_log(log), vm.is_yielded, len(vm.frames)
+
+def printed_log(log):
+    return [entry for entry in log if entry[0] == "print"]
+
+def check_slicing():
+    """List of problems with programs split into slices by the instruction budget."""
+    problems = []
+    for engine in VM.ENGINES:
+        expected = run_sliced(SLICING_SOURCE, engine, -1)
+        if len(expected[0]) != 2:
+            problems.append(f"{engine}: unlimited run printed {expected[0]}")
+        for limit in range(990, 1011):
+            result = run_sliced(SLICING_SOURCE, engine, limit)
+            if result != expected:
+                problems.append(f"{engine}, instruction_limit {limit}: {result} != {expected}")
+                break
+    return problems
+
+def check_time_slice():
+    """List of problems with @meta time_slice_ms, which replaces the instruction limit."""
+    problems = []
+    source = "let i = 0\nwhile i < 2000:\n    set i = i + 1\nprint(i)\n"
+    for engine in VM.ENGINES:
+        for meta, suspends in (({"time_slice_ms": 10000}, False),
+                               ({"time_slice_ms": 10000, "instruction_limit": 1000}, True)):
+            log = []
+            compiler = Compiler()
+            chunk = compiler.compile(Parser(Lexer(source).tokenize()).parse())
+            chunk.metadata.update(meta)
+            vm = VM(globals=make_globals(log), engine=engine)
+            vm.run(chunk, compiler.functions)
+            # Far more than 1000 instructions fit in one 10 s slice
+            if vm.is_yielded != suspends or (not suspends and vm.total_instruction_count <= 1000):
+                problems.append(f"{engine}, {meta}: suspended {vm.is_yielded} after "
+                                f"{vm.total_instruction_count} instructions")
+    return problems
+
+# Loop variables defined by top-level loops, and range values outside a for head
+RANGE_SOURCE = """
+let r = range(1, 4)
+for i in range(10, 0, -4):
+    print(i)
+for x in [1, 2]:
+    print(x)
+func f(n):
+    let s = []
+    for j in range(n):
+        s.append(j)
+    for j in r:
+        s.append(j)
+    return s
+print(i, x, len(r), f(2))
+"""
+RANGE_OUTPUT = [("print", "(10,)"), ("print", "(6,)"), ("print", "(2,)"), ("print", "(1.0,)"),
+                ("print", "(2.0,)"), ("print", "(2, 2.0, 3, [0, 1, 1, 2, 3])")]
+
+def check_ranges():
+    """List of problems with `range` and top-level for loops on every backend and engine."""
+    problems = []
+    for backend in ("bytecode", "py"):
+        for engine in VM.ENGINES:
+            log = []
+            compiler = Compiler(backend=backend)
+            chunk = compiler.compile(Parser(Lexer(RANGE_SOURCE).tokenize()).parse())
+            vm = VM(globals=make_globals(log), engine=engine)
+            drive(vm, log, None, chunk, compiler.functions)
+            if printed_log(log) != RANGE_OUTPUT:
+                problems.append(f"{backend}, {engine}: {log}")
+    return problems
+
+def collect(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, n) for n in names if n.endswith(".tml"))
+        else:
+            files.append(path)
+    return sorted(files)
+
+if __name__ == "__main__":
+    files = collect(sys.argv[1:] or [EXAMPLES_DIR])
+    failed = 0
+    for path in files:
+        ok, notes = compare(path)
+        failed += not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {os.path.relpath(path)}" + (f"  [{notes}]" if notes else ""))
+    print(f"{len(files) - failed}/{len(files)} examples conform")
+    problems = check_slicing() + check_time_slice()
+    for problem in problems:
+        print(f"FAIL slicing: {problem}")
+    print("budget slicing " + ("FAIL" if problems else "OK"))
+    range_problems = check_ranges()
+    for problem in range_problems:
+        print(f"FAIL ranges: {problem}")
+    print("range loops " + ("FAIL" if range_problems else "OK"))
+    sys.exit(1 if failed or problems or range_problems else 0)
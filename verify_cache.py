@@ -0,0 +1,295 @@
+"""
+Check of the compiled program format (compiler/bytecode_format.py) and of
+the bytecode cache built on it (services/cache_manager.py).
+
+1. Every example is compiled with several option sets, written to a .tmlc
+   file and loaded back, both lazily and with every body decoded up front.
+   Code, constants, line tables, metadata, signatures and Python backend
+   source must equal the compiled program's.
+2. Every example runs on each backend from the loaded file, with the hook
+   sequence and recorders of verify_backends.py. Output, errors and globals
+   must equal a run of the freshly compiled program.
+3. The cache keeps separate entries per compile options, and a file of
+   another compiler version, or a damaged one, is never loaded.
+4. The in-memory tier serves repeated loads, hands out functions dicts of
+   their own and evicts by size; the directory is trimmed to its size cap
+   least recently used first, on a background thread.
+5. Runtimes of one source share the compiled program: every example runs
+   twice on each backend from one cached program, with the same results as
+   a fresh compile, and the runs leave the program unchanged. A program in
+   use stays shared after it left the memory tier, and runtimes starting
+   the same uncompiled source at once compile it once.
+6. A precompiled bundle (services/bundles.py) loads only for the source
+   and compile options it was built from, and a runtime's cache serves it
+   without compiling or writing a cache file.
+
+Usage: python verify_cache.py [file_or_directory ...]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from compiler.lexer import Lexer
+from compiler.parser import Parser
+from compiler.compiler import Compiler
+from compiler import bytecode_format
+from compiler.bytecode_format import FormatError, StaleFile
+from services.cache_manager import BytecodeCache
+from services import bundles
+from verify_backends import EXAMPLES_DIR, run, collect
+
+CONFIGS = ({}, {"opt": 0}, {"backend": "bytecode"}, {"toplevel_locals": True})
+BACKENDS = ("bytecode", "tiered", "py")
+
+def program_state(chunk, functions):
+    signatures = {name: (func.name, func.arity, func.defaults, func.kwargs_param, func.locals_count,
+                         list(func.local_names), func.content_key, func.native_source, func.native_lines,
+                         func.chunk.code, func.chunk.constants, func.chunk.lines, func.chunk.metadata,
+                         list(func.chunk.local_names))
+                  for name, func in functions.items()}
+    return chunk.code, chunk.constants, chunk.lines, chunk.metadata, list(chunk.local_names), signatures
+
+def new_file(folder):
+    # Each program gets its own file: on Windows a file still mapped by a loaded program cannot be replaced
+    fd, path = tempfile.mkstemp(suffix=".tmlc", dir=folder)
+    os.close(fd)
+    return path
+
+def round_trip(folder):
+    """A `load` for verify_backends.run that passes the program through a .tmlc file."""
+    def load(chunk, functions):
+        path = new_file(folder)
+        bytecode_format.save(path, chunk, functions)
+        return bytecode_format.load(path)
+    return load
+
+def check_example(path, folder):
+    """List of problems with `path`."""
+    with open(path, "r", encoding="utf-8") as f:
+        source = f.read()
+    problems = []
+    for options in CONFIGS:
+        try:
+            compiler = Compiler(**options)
+            chunk = compiler.compile(Parser(Lexer(source).tokenize(), report_errors=False).parse())
+        except Exception:
+            continue
+        expected = program_state(chunk, compiler.functions)
+        file_path = new_file(folder)
+        bytecode_format.save(file_path, chunk, compiler.functions)
+        for lazy in (True, False):
+            if program_state(*bytecode_format.load(file_path, lazy)) != expected:
+                problems.append(f"{options} {'lazy' if lazy else 'eager'} load differs")
+
+    for backend in BACKENDS:
+        try:
+            reference = run(source, backend)
+        except Exception:
+            continue
+        loaded = run(source, backend, round_trip(folder))
+        if loaded["log"] != reference["log"] or loaded["globals"] != reference["globals"]:
+            problems.append(f"{backend}: run from the file differs")
+    return problems
+
+def check_cache(folder):
+    """List of problems with BytecodeCache keys and stale or damaged files."""
+    problems = []
+    cache = BytecodeCache(os.path.join(folder, "cache"))
+    source = "func double(x):\n    return x * 2\nlet y = double(21)\n"
+    compiler = Compiler()
+    chunk = compiler.compile(Parser(Lexer(source).tokenize()).parse())
+    cache.set(source, chunk, compiler.functions)
+    if cache.get(source)[0] is None or cache.get(source, {"opt": 0})[0] is not None:
+        problems.append("options do not separate cache entries")
+
+    entry = cache._path(source, None)
+    with open(entry, "rb") as f:
+        data = bytearray(f.read())
+    stale = bytearray(data)
+    header = bytecode_format.HEADER
+    fields = list(header.unpack_from(stale, 0))
+    fields[3] = bytes(16) # another compiler version
+    header.pack_into(stale, 0, *fields)
+    try:
+        bytecode_format.loads(bytes(stale))
+        problems.append("a file of another compiler version loads")
+    except StaleFile:
+        pass
+    with open(entry, "wb") as f:
+        f.write(stale)
+    # A new process (no programs in memory yet) finds the file of an older compiler
+    if BytecodeCache(cache.cache_dir).get(source)[0] is not None or os.path.exists(entry):
+        problems.append("the cache serves or keeps a stale file")
+
+    for damaged in (data[:header.size - 1], data[:len(data) - 3]):
+        try:
+            bytecode_format.loads(bytes(damaged))
+            problems.append("a damaged file loads")
+        except FormatError:
+            pass
+    return problems
+
+def check_limits(folder):
+    """List of problems with the memory tier, the disk cap and the counters."""
+    problems = []
+    programs = []
+    for i in range(4):
+        source = f"func f{i}(x):\n    return x + {i}\nlet y = f{i}(1)\n"
+        compiler = Compiler()
+        programs.append((source, compiler.compile(Parser(Lexer(source).tokenize()).parse()), compiler.functions))
+    size = len(bytecode_format.dumps(programs[0][1], programs[0][2]))
+
+    cache = BytecodeCache(os.path.join(folder, "limits"), memory_limit=size * 2 + size // 2, disk_limit=size * 3)
+    for source, chunk, functions in programs[:2]:
+        cache.set(source, chunk, functions)
+    chunk, functions = cache.get(programs[0][0])
+    if chunk is not programs[0][1] or cache.counters["memory_hits"] != 1:
+        problems.append("a stored program is not served from memory")
+    functions.clear() # what a hot reload may do to the dict it runs on
+    if not cache.get(programs[0][0])[1]:
+        problems.append("the functions dict is shared with the caller")
+
+    cache.set(*programs[2][:3])
+    if cache.counters["evictions"] != 1:
+        problems.append(f"memory evictions {cache.counters['evictions']}, expected 1")
+    # Evicted from memory, but `programs` still holds it, as a running macro would: shared, not read again
+    if cache.get(programs[1][0])[0] is not programs[1][1] or cache.counters["disk_hits"] != 0:
+        problems.append("an evicted program in use is not shared")
+
+    # Program 1 and 2 were used last; storing a fourth goes over the cap and drops program 0
+    old = time.time() - 60
+    os.utime(cache._path(programs[0][0], None), (old, old))
+    cache.cleanup()
+    cache.set(*programs[3][:3])
+    if cache._cleanup_thread is not None:
+        cache._cleanup_thread.join(10)
+    kept = [os.path.exists(cache._path(source, None)) for source, _, _ in programs]
+    if kept != [False, True, True, True] or cache.counters["disk_evictions"] != 1:
+        problems.append(f"files kept {kept}, disk evictions {cache.counters['disk_evictions']}")
+    # Rewriting a file replaces its size in the folder total rather than adding to it
+    disk_size = cache.disk_size
+    cache.set(*programs[3][:3])
+    if cache.disk_size != disk_size:
+        problems.append(f"disk size {cache.disk_size} after rewriting a file, expected {disk_size}")
+    if cache.get("let z = 1\n") != (None, None) or cache.counters["misses"] != 1:
+        problems.append("misses are not counted")
+    return problems
+
+def check_sharing(path, folder):
+    """List of problems with runs of `path` from one program shared through the cache."""
+    with open(path, "r", encoding="utf-8") as f:
+        source = f.read()
+    problems = []
+    for backend in BACKENDS:
+        try:
+            reference = run(source, backend)
+        except Exception:
+            continue
+        cache = BytecodeCache(os.path.join(folder, "shared"))
+        programs = []
+
+        def shared(chunk, functions):
+            if not programs:
+                cache.set(source, chunk, functions, {"backend": backend})
+            programs.append(cache.get(source, {"backend": backend}))
+            return programs[-1]
+
+        first = run(source, backend, shared)
+        state = program_state(*programs[0])
+        second = run(source, backend, shared)
+        if programs[0][0] is not programs[1][0]:
+            problems.append(f"{backend}: the program is not shared")
+        for result in (first, second):
+            if result["log"] != reference["log"] or result["globals"] != reference["globals"]:
+                problems.append(f"{backend}: a run of the shared program differs")
+                break
+        if program_state(*programs[1]) != state:
+            problems.append(f"{backend}: running changed the shared program")
+    return problems
+
+def check_live(folder):
+    """List of problems with programs shared while in use and with concurrent compiles."""
+    problems = []
+    cache = BytecodeCache(os.path.join(folder, "live"), memory_limit=0)
+    source = "func double(x):\n    return x * 2\nlet y = double(21)\n"
+    compiles = []
+
+    def compile():
+        compiles.append(1)
+        time.sleep(0.05) # the other threads arrive meanwhile
+        compiler = Compiler()
+        return compiler.compile(Parser(Lexer(source).tokenize()).parse()), compiler.functions
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compile(source, compile)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    if len(compiles) != 1 or len({id(chunk) for chunk, _, _ in results}) != 1:
+        problems.append(f"8 concurrent starts compiled {len(compiles)} times")
+    if [cached for _, _, cached in results].count(False) != 1 or cache.counters["misses"] != 1:
+        problems.append("concurrent starts are not counted as one miss")
+
+    # Nothing fits in memory, but a program a runtime still holds is handed out again
+    chunk = results[0][0]
+    if cache.get(source)[0] is not chunk:
+        problems.append("a program in use is not shared")
+    del results[:], chunk
+    if cache.get(source)[0] is None or cache.counters["disk_hits"] != 1:
+        problems.append("a program no longer in use is not read from its file")
+    return problems
+
+def check_bundles(folder):
+    """List of problems with precompiled bundles."""
+    problems = []
+    source = "func double(x):\n    return x * 2\nlet y = double(21)\n"
+    options = {"opt": None, "builtins": ("print",)}
+    compiler = Compiler()
+    chunk = compiler.compile(Parser(Lexer(source).tokenize()).parse())
+    path = os.path.join(folder, "macro.tmlc")
+    bundles.save(path, source, chunk, compiler.functions, options)
+
+    program = bundles.load(path, source, options)
+    if program is None or program_state(*program[:2]) != program_state(chunk, compiler.functions):
+        problems.append("a fresh bundle does not load the compiled program")
+    if bundles.load(path, source + "\n", options) is not None or bundles.load(path, source, {"opt": 0}) is not None:
+        problems.append("a bundle loads for another source or other options")
+    if bundles.load(os.path.join(folder, "missing.tmlc"), source, options) is not None:
+        problems.append("a missing bundle loads")
+
+    def compile():
+        problems.append("a fresh bundle is compiled again")
+        return chunk, compiler.functions
+
+    cache = BytecodeCache(os.path.join(folder, "bundled"))
+    load = lambda: bundles.load(path, source, options)
+    _, _, cached = cache.get_or_compile(source, compile, options, load)
+    if not cached or cache.counters["bundle_hits"] != 1 or os.listdir(cache.cache_dir):
+        problems.append("the cache does not serve the bundle as it is")
+    return problems
+
+def main(args):
+    folder = tempfile.mkdtemp(prefix="tmlc-")
+    try:
+        files = collect(args or [EXAMPLES_DIR])
+        failed = 0
+        for path in files:
+            problems = check_example(path, folder) + check_sharing(path, folder)
+            if problems:
+                failed += 1
+                print(f"FAIL {os.path.relpath(path)}: {'; '.join(problems)}")
+        print(f"{len(files) - failed}/{len(files)} examples load identically from .tmlc files")
+        problems = check_cache(folder) + check_limits(folder) + check_live(folder) + check_bundles(folder)
+        for problem in problems:
+            print(f"FAIL cache: {problem}")
+        print("cache keys, version checks, limits, sharing and bundles " + ("FAIL" if problems else "OK"))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    return 1 if failed or problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
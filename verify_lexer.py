@@ -0,0 +1,400 @@
+"""
+Differential check of the lexer (compiler/lexer.py) against the original
+character-by-character lexer, kept here as ReferenceLexer.
+
+Both lexers run over every example and over randomly generated sources
+built from TML fragments, odd whitespace, unicode letters and digits,
+unbalanced quotes and @meta blocks. The token streams (type, value, line,
+column) or the raised errors must be identical.
+
+The incremental front end of the editor (compiler/incremental.py) is
+checked too: its token stream must match Lexer's wherever the two are
+meant to agree (no line break other than "\n", no @meta block spanning
+lines), and a document taken through random line edits must end up with
+the tokens, highlighting, diagnostics and metadata of the same text
+loaded from scratch.
+
+Usage: python verify_lexer.py [file_or_directory ...] [--fuzz N] [--seed S]
+"""
+import os
+import random
+import re
+import sys
+from compiler.lexer import Lexer, Token, TokenType
+from compiler.incremental import IncrementalDocument
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "examples")
+FUZZ_CASES = 5000
+EDIT_CASES = 1000
+# Line breaks of str.splitlines that the editor and IncrementalDocument keep inside a line
+OTHER_LINE_BREAKS = "\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+
+class ReferenceLexer(Lexer):
+    """The lexer as it was before the single-pass scanner, unchanged."""
+
+    def tokenize(self):
+        # Pre-process multiline @meta
+        source = self.source
+        meta_pattern = r'@meta\s*\{'
+        meta_matches = list(re.finditer(meta_pattern, source))
+        
+        # We'll replace @meta blocks with placeholders to not interfere with line-by-line tokenization
+        # then inject META tokens at correct positions
+        meta_tokens_to_inject = []
+        
+        for match in reversed(meta_matches):
+            start_pos = match.start()
+            # Find matching brace
+            brace_count = 0
+            found_end = False
+            for i in range(match.end() - 1, len(source)):
+                if source[i] == '{': brace_count += 1
+                elif source[i] == '}':
+                    brace_count -= 1
+                    if brace_count == 0:
+                        meta_full_content = source[start_pos:i+1]
+                        # Calculate line/col
+                        prefix = source[:start_pos]
+                        line = prefix.count('\n') + 1
+                        last_nl = prefix.rfind('\n')
+                        col = start_pos - last_nl if last_nl != -1 else start_pos + 1
+                        
+                        meta_tokens_to_inject.append((line, col, meta_full_content))
+                        
+                        # Replace with spaces to maintain line/col for other tokens
+                        replacement = ' ' * len(meta_full_content)
+                        source = source[:start_pos] + replacement + source[i+1:]
+                        found_end = True
+                        break
+            if not found_end:
+                # Let it fail during normal tokenization if not found
+                pass
+
+        lines = source.splitlines()
+        for i, line_content in enumerate(lines):
+            self.line = i + 1
+            self.column = 1
+            self.current = 0
+            
+            # Inject META tokens for this line
+            for m_line, m_col, m_content in [t for t in meta_tokens_to_inject if t[0] == self.line]:
+                self.tokens.append(Token(TokenType.META, m_content, m_line, m_col))
+            
+            # Handle indentation at the start of the line
+            # If the line is now all spaces (because of @meta replacement), skip it
+            if not line_content.strip() or line_content.strip().startswith("#"):
+                continue
+            
+            indent = 0
+            for char in line_content:
+                if char == ' ':
+                    indent += 1
+                elif char == '\t':
+                    indent += 4 # Assume 4 spaces for tab
+                else:
+                    break
+            
+            if indent > self.indent_stack[-1]:
+                self.indent_stack.append(indent)
+                self.tokens.append(Token(TokenType.INDENT, indent, self.line, 1))
+            elif indent < self.indent_stack[-1]:
+                while indent < self.indent_stack[-1]:
+                    self.indent_stack.pop()
+                    self.tokens.append(Token(TokenType.DEDENT, indent, self.line, 1))
+                if indent != self.indent_stack[-1]:
+                    raise SyntaxError(f"Invalid indentation at line {self.line}")
+
+            self.tokenize_line(line_content[indent:], indent + 1)
+            self.tokens.append(Token(TokenType.NEWLINE, "\n", self.line, len(line_content) + 1))
+
+        # Close any remaining indents
+        while len(self.indent_stack) > 1:
+            self.indent_stack.pop()
+            self.tokens.append(Token(TokenType.DEDENT, 0, self.line + 1, 1))
+            
+        self.tokens.append(Token(TokenType.EOF, "", self.line + 1, 1))
+        return self.tokens
+
+    def tokenize_line(self, content, start_col):
+        i = 0
+        while i < len(content):
+            char = content[i]
+            col = start_col + i
+            
+            if char.isspace():
+                i += 1
+                continue
+                
+            if char == '#': # Comment
+                break
+                
+            if char == '(':
+                self.tokens.append(Token(TokenType.LPAREN, "(", self.line, col))
+                i += 1
+            elif char == ')':
+                self.tokens.append(Token(TokenType.RPAREN, ")", self.line, col))
+                i += 1
+            elif char == ':':
+                self.tokens.append(Token(TokenType.COLON, ":", self.line, col))
+                i += 1
+            elif char == ',':
+                self.tokens.append(Token(TokenType.COMMA, ",", self.line, col))
+                i += 1
+            elif char == '.':
+                self.tokens.append(Token(TokenType.DOT, ".", self.line, col))
+                i += 1
+            elif char == '[':
+                self.tokens.append(Token(TokenType.LBRACKET, "[", self.line, col))
+                i += 1
+            elif char == ']':
+                self.tokens.append(Token(TokenType.RBRACKET, "]", self.line, col))
+                i += 1
+            elif char == '{':
+                self.tokens.append(Token(TokenType.LBRACE, "{", self.line, col))
+                i += 1
+            elif char == '}':
+                self.tokens.append(Token(TokenType.RBRACE, "}", self.line, col))
+                i += 1
+            elif char == '+':
+                if i + 1 < len(content) and content[i+1] == '+':
+                    self.tokens.append(Token(TokenType.PLUS_PLUS, "++", self.line, col))
+                    i += 2
+                elif i + 1 < len(content) and content[i+1] == '=':
+                    self.tokens.append(Token(TokenType.PLUS_EQUAL, "+=", self.line, col))
+                    i += 2
+                else:
+                    self.tokens.append(Token(TokenType.PLUS, "+", self.line, col))
+                    i += 1
+            elif char == '-':
+                if i + 1 < len(content) and content[i+1] == '-':
+                    self.tokens.append(Token(TokenType.MINUS_MINUS, "--", self.line, col))
+                    i += 2
+                elif i + 1 < len(content) and content[i+1] == '=':
+                    self.tokens.append(Token(TokenType.MINUS_EQUAL, "-=", self.line, col))
+                    i += 2
+                else:
+                    self.tokens.append(Token(TokenType.MINUS, "-", self.line, col))
+                    i += 1
+            elif char == '*':
+                if i + 1 < len(content) and content[i+1] == '=':
+                    self.tokens.append(Token(TokenType.STAR_EQUAL, "*=", self.line, col))
+                    i += 2
+                else:
+                    self.tokens.append(Token(TokenType.STAR, "*", self.line, col))
+                    i += 1
+            elif char == '/':
+                if i + 1 < len(content) and content[i+1] == '=':
+                    self.tokens.append(Token(TokenType.SLASH_EQUAL, "/=", self.line, col))
+                    i += 2
+                else:
+                    self.tokens.append(Token(TokenType.SLASH, "/", self.line, col))
+                    i += 1
+            elif char == '=':
+                if i + 1 < len(content) and content[i+1] == '=':
+                    self.tokens.append(Token(TokenType.EQUAL_EQUAL, "==", self.line, col))
+                    i += 2
+                else:
+                    self.tokens.append(Token(TokenType.EQUAL, "=", self.line, col))
+                    i += 1
+            elif char == '!':
+                if i + 1 < len(content) and content[i+1] == '=':
+                    self.tokens.append(Token(TokenType.BANG_EQUAL, "!=", self.line, col))
+                    i += 2
+                else:
+                    self.tokens.append(Token(TokenType.BANG, "!", self.line, col))
+                    i += 1
+            elif char == '>':
+                if i + 1 < len(content) and content[i+1] == '=':
+                    self.tokens.append(Token(TokenType.GREATER_EQUAL, ">=", self.line, col))
+                    i += 2
+                else:
+                    self.tokens.append(Token(TokenType.GREATER, ">", self.line, col))
+                    i += 1
+            elif char == '<':
+                if i + 1 < len(content) and content[i+1] == '=':
+                    self.tokens.append(Token(TokenType.LESS_EQUAL, "<=", self.line, col))
+                    i += 2
+                else:
+                    self.tokens.append(Token(TokenType.LESS, "<", self.line, col))
+                    i += 1
+            elif char == '@':
+                # Unexpected @ outside of pre-processed @meta
+                raise SyntaxError(f"Unexpected character '@' at line {self.line}:{col}")
+            elif char == '"':
+                # String literal
+                start_i = i
+                i += 1
+                string_val = ""
+                while i < len(content) and content[i] != '"':
+                    string_val += content[i]
+                    i += 1
+                if i >= len(content):
+                    raise SyntaxError(f"Unterminated string at line {self.line}:{col}")
+                i += 1
+                self.tokens.append(Token(TokenType.STRING, string_val, self.line, col))
+            elif char.isdigit():
+                # Number literal
+                start_i = i
+                num_str = ""
+                while i < len(content) and (content[i].isdigit() or content[i] == '.'):
+                    num_str += content[i]
+                    i += 1
+                self.tokens.append(Token(TokenType.NUMBER, float(num_str), self.line, col))
+            elif char.isalpha() or char == '_':
+                # Identifier or Keyword
+                start_i = i
+                ident = ""
+                while i < len(content) and (content[i].isalnum() or content[i] == '_'):
+                    ident += content[i]
+                    i += 1
+                
+                if ident in self.keywords:
+                    self.tokens.append(Token(self.keywords[ident], ident, self.line, col))
+                else:
+                    self.tokens.append(Token(TokenType.IDENTIFIER, ident, self.line, col))
+            else:
+                raise SyntaxError(f"Unexpected character '{char}' at line {self.line}:{col}")
+
+def token_stream(lexer_class, source):
+    """The tokens as (type, value, line, column), or the error the lexer raised."""
+    try:
+        tokens = lexer_class(source).tokenize()
+    except Exception as e:
+        return ("error", type(e).__name__, str(e))
+    return [(t.type, t.value, t.line, t.column) for t in tokens]
+
+FRAGMENTS = [
+    "let", "set", "func", "if", "elif", "else", "while", "for", "in", "return", "break", "continue",
+    "not", "and", "or", "true", "false", "yield", "x", "_tmp", "value2", "змінна", "Ωmega", "a1b",
+    "0", "7", "3.14", "10.", "٣",
+    "+", "++", "+=", "-", "--", "-=", "*", "*=", "/", "/=", "=", "==", "!=", "!", ">", ">=", "<", "<=",
+    "(", ")", ":", ",", ".", "[", "]", "{", "}", "\"text\"", "\"multi word\"", "# note",
+    "@meta {\"a\": 1}", "@meta{\n  \"b\": {\"c\": 2}\n}", " ", "  ", "\t", "\u00a0", "\x0c",
+]
+# Fragments that make the line fail, drawn rarely so most sources tokenize
+ERROR_FRAGMENTS = ["1.2.3", "²", "½", "Ⅻ", "\"", "#", "@", "@meta {", "$", "~"]
+LINE_BREAKS = ["\n", "\n", "\n", "\r\n", "\r", "\x0b", "\u2028"]
+INDENTS = ["", "", "", "    ", "    ", "        ", "  ", "\t", " \t"]
+
+def fuzz_source(rng):
+    lines = []
+    for _ in range(rng.randint(0, 12)):
+        parts = [rng.choice(ERROR_FRAGMENTS if rng.random() < 0.02 else FRAGMENTS)
+                 for _ in range(rng.randint(0, 8))]
+        lines.append(rng.choice(INDENTS) + rng.choice(["", " "]).join(parts))
+        lines.append(rng.choice(LINE_BREAKS))
+    return "".join(lines)
+
+def collect(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, n) for n in names if n.endswith(".tml"))
+        else:
+            files.append(path)
+    return sorted(files)
+
+def first_difference(expected, actual):
+    if isinstance(expected, tuple) or isinstance(actual, tuple):
+        return f"{expected if isinstance(expected, tuple) else 'tokens'} != {actual if isinstance(actual, tuple) else 'tokens'}"
+    for i, (a, b) in enumerate(zip(expected, actual)):
+        if a != b:
+            return f"token {i}: {a!r} != {b!r}"
+    return f"token count {len(expected)} != {len(actual)}"
+
+def document_state(document):
+    return ([(t.type, t.value, t.line, t.column) for t in document.tokens()], document.diagnostics(),
+            [document.line_spans(i) for i in range(len(document.lines))], document.metadata())
+
+def incremental_matches_lexer(source):
+    """False if the document tokenizes `source` differently from Lexer where both should agree."""
+    if any(c in source for c in OTHER_LINE_BREAKS):
+        return True
+    expected = token_stream(Lexer, source)
+    if isinstance(expected, tuple) or any(t[0] == TokenType.META and "\n" in t[1] for t in expected):
+        return True
+    document = IncrementalDocument(source)
+    if any(message == "Unterminated @meta block" for _, _, message in document.diagnostics()):
+        return True # Lexer skips the '@' of a tab-indented line and never sees the block
+    return document_state(document)[0] == expected
+
+def random_edits(rng, document, sources):
+    """Applies a few random line edits: pasted lines from `sources` and single characters typed into a line."""
+    edits = []
+    for _ in range(rng.randint(1, 6)):
+        lines = document.lines
+        first = rng.randint(0, len(lines))
+        removed = rng.randint(0, min(3, len(lines) - first))
+        if rng.random() < 0.3 and first < len(lines):
+            line = lines[first]
+            at = rng.randint(0, len(line))
+            typed = rng.choice(["x", " ", "    ", ":", "(", "\"", "#", "@meta {", "}", "\n"])
+            new_lines = (line[:at] + typed + line[at:]).split("\n")
+            removed = 1
+        else:
+            pasted = rng.choice(sources).split("\n")
+            start = rng.randrange(len(pasted))
+            new_lines = pasted[start:start + rng.randint(0, 3)]
+        edits.append((first, removed, new_lines))
+        document.edit(first, removed, new_lines)
+    return edits
+
+def main(args):
+    fuzz_cases, seed = FUZZ_CASES, 0
+    for option in ("--fuzz", "--seed"):
+        if option in args:
+            i = args.index(option)
+            value = int(args[i + 1])
+            del args[i:i + 2]
+            if option == "--fuzz":
+                fuzz_cases = value
+            else:
+                seed = value
+
+    failed = 0
+    files = collect(args or [EXAMPLES_DIR])
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            source = f.read()
+        expected, actual = token_stream(ReferenceLexer, source), token_stream(Lexer, source)
+        if expected != actual:
+            failed += 1
+            print(f"FAIL {os.path.relpath(path)}  [{first_difference(expected, actual)}]")
+    print(f"{len(files) - failed}/{len(files)} examples tokenize identically")
+
+    rng = random.Random(seed)
+    fuzz_failed = 0
+    for case in range(fuzz_cases):
+        source = fuzz_source(rng)
+        expected, actual = token_stream(ReferenceLexer, source), token_stream(Lexer, source)
+        if expected != actual:
+            fuzz_failed += 1
+            if fuzz_failed <= 5:
+                print(f"FAIL fuzz case {case}: {source!r}  [{first_difference(expected, actual)}]")
+    print(f"{fuzz_cases - fuzz_failed}/{fuzz_cases} fuzzed sources tokenize identically (seed {seed})")
+
+    sources = []
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            sources.append(f.read())
+    sources += [fuzz_source(rng) for _ in range(200)]
+    sources = ["".join("\n" if c in OTHER_LINE_BREAKS else c for c in source) for source in sources]
+    incremental_failed = 0
+    for source in sources:
+        if not incremental_matches_lexer(source):
+            incremental_failed += 1
+            if incremental_failed <= 5:
+                print(f"FAIL incremental tokens of {source[:60]!r}")
+    for case in range(EDIT_CASES):
+        document = IncrementalDocument(rng.choice(sources))
+        edits = random_edits(rng, document, sources)
+        if document_state(document) != document_state(IncrementalDocument(document.text())):
+            incremental_failed += 1
+            if incremental_failed <= 5:
+                print(f"FAIL edit case {case}: {edits!r}")
+    print(f"{len(sources) + EDIT_CASES - incremental_failed}/{len(sources) + EDIT_CASES} incremental documents match")
+    return 1 if failed or fuzz_failed or incremental_failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,208 @@
+"""
+Check of function-granular recompilation (compiler/function_cache.py) and
+of hot reload into a running VM (VM.reload_functions, used by
+MacroRuntime.hot_reload).
+
+1. Every example is compiled from scratch and through a FunctionCache, then
+   recompiled through the same cache after random edits: blank lines
+   inserted (functions move), number literals changed (functions change).
+   The bytecode, constants, line tables and Python backend source of the
+   cached compile must equal a fresh compile of the same text.
+2. A macro runs on every backend with recorders for the stdlib (see
+   verify_backends.py), a new version is swapped in between two ticks and
+   the macro goes on. Globals must survive, changed functions (including a
+   caller that inlined a changed callee) must run their new code,
+   unchanged ones must keep their objects, and a call suspended in a
+   replaced function must finish on the old code. A top-level constant
+   folded into the functions must take its new value as a global too.
+
+Usage: python verify_reload.py [file_or_directory ...] [--edits N] [--seed S]
+"""
+import os
+import random
+import re
+import sys
+from compiler.lexer import Lexer
+from compiler.parser import Parser
+from compiler.compiler import Compiler
+from compiler.function_cache import FunctionCache
+from runtime.vm.vm import VM
+from verify_backends import EXAMPLES_DIR, make_globals, drive
+from verify_lexer import collect
+
+EDITS = 8
+CONFIGS = ({}, {"opt": 1}, {"backend": "bytecode"}, {"toplevel_locals": True})
+
+def compile_source(source, cache=None, **options):
+    compiler = Compiler(function_cache=cache, **options)
+    chunk = compiler.compile(Parser(Lexer(source).tokenize(), report_errors=False).parse())
+    return chunk, compiler
+
+def compiled_state(chunk, compiler):
+    functions = {name: (func.arity, func.defaults, func.kwargs_param, func.locals_count, list(func.local_names),
+                        func.chunk.code, func.chunk.constants, func.chunk.lines, func.chunk.metadata,
+                        func.native_source, func.native_lines)
+                 for name, func in compiler.functions.items()}
+    return chunk.code, chunk.constants, chunk.lines, functions, compiler.native_fallbacks
+
+def random_edit(rng, source):
+    lines = source.split("\n")
+    i = rng.randrange(len(lines) + 1)
+    if rng.random() < 0.5 or i == len(lines):
+        lines.insert(i, "")
+    else:
+        lines[i] = re.sub(r"\b\d+\b", lambda m: str(int(m.group()) + 1), lines[i], count=1)
+    return "\n".join(lines)
+
+def check_cache(path, rng, edits):
+    """Number of compiles through the cache that differ from a fresh compile."""
+    with open(path, "r", encoding="utf-8") as f:
+        original = f.read()
+    failures = 0
+    for options in CONFIGS:
+        cache = FunctionCache()
+        source = original
+        for step in range(edits + 1):
+            try:
+                expected = compiled_state(*compile_source(source, **options))
+            except Exception:
+                break
+            if compiled_state(*compile_source(source, cache, **options)) != expected:
+                failures += 1
+                print(f"FAIL {os.path.relpath(path)} {options} after {step} edits")
+            source = random_edit(rng, source)
+    return failures
+
+# on_tick is the same text in both versions but inlines step, so it changes too
+VERSION_1 = """
+func untouched(a):
+    return a * 2
+let count = 0
+func on_tick(delta):
+    set count = step(count)
+    report()
+func step(x):
+    return x + 1
+func report():
+    print("tick v1", count)
+func worker():
+    while true:
+        print("worker v1")
+        yield
+func gone():
+    return 0
+"""
+
+VERSION_2 = """
+func untouched(a):
+    return a * 2
+let count = 0
+func on_tick(delta):
+    set count = step(count)
+    report()
+func step(x):
+    return x + 10
+func report():
+    print("tick v2", count, untouched(1), added())
+func worker():
+    while true:
+        print("worker v2")
+        yield
+func added():
+    return bonus
+let bonus = 100
+"""
+
+# SPEED is folded into speed(), so the reload changes the function and the global
+CONSTANT_V1 = """
+let SPEED = 5
+func speed():
+    return SPEED
+"""
+
+CONSTANT_V2 = CONSTANT_V1.replace("5", "10")
+
+def printed(log):
+    return [entry[1] for entry in log if entry[0] == "print"]
+
+def stop(vm):
+    vm.is_yielded = False
+    vm.frames.clear()
+    vm.stack.clear()
+
+def check_reload(backend):
+    """List of problems with a hot reload on `backend`."""
+    log = []
+    cache = FunctionCache()
+    chunk, compiler = compile_source(VERSION_1, cache, backend=backend)
+    chunk.metadata.update({"hot_calls": 2, "hot_loops": 10})
+    vm = VM(globals=make_globals(log))
+    drive(vm, log, None, chunk, compiler.functions)
+    for _ in range(3):
+        drive(vm, log, "on_tick", 0.016)
+    untouched = vm.functions["untouched"]
+    vm.call_function("worker") # suspends inside worker
+    problems = []
+
+    _, new = compile_source(VERSION_2, cache, backend=backend)
+    changed, removed = vm.reload_functions(new.functions)
+    vm.reload_globals({"count": 0.0, "bonus": 100.0}, new.folding.constants) # as MacroRuntime.apply_reload does
+    if sorted(changed) != ["added", "on_tick", "report", "step", "worker"] or removed != ["gone"]:
+        problems.append(f"changed {sorted(changed)}, removed {removed}")
+    if vm.functions["untouched"] is not untouched:
+        problems.append("unchanged function replaced")
+
+    del log[:]
+    vm.resume() # the suspended call goes on in the old worker
+    stop(vm)
+    drive(vm, log, "on_tick", 0.016)
+    vm.call_function("worker") # a new call runs the new one, up to its first yield
+    stop(vm)
+    expected = [repr(("worker v1",)), repr(("tick v2", 13.0, 2.0, 100.0)), repr(("worker v2",))]
+    if printed(log) != expected:
+        problems.append(f"printed {printed(log)}, expected {expected}")
+    return problems + check_constant_reload(backend)
+
+def check_constant_reload(backend):
+    """List of problems with the global of a folded constant after a reload that changes it."""
+    cache = FunctionCache()
+    chunk, compiler = compile_source(CONSTANT_V1, cache, backend=backend)
+    vm = VM(globals=make_globals([]))
+    vm.run(chunk, compiler.functions)
+    vm.call_function("speed")
+    _, new = compile_source(CONSTANT_V2, cache, backend=backend)
+    vm.reload_functions(new.functions)
+    vm.reload_globals({"SPEED": 10.0}, new.folding.constants)
+    result, value = vm.call_function("speed"), vm.globals["SPEED"]
+    if result != 10.0 or value != 10.0:
+        return [f"folded constant: speed() returns {result}, global SPEED is {value}"]
+    return []
+
+def main(args):
+    edits, seed = EDITS, 0
+    for option in ("--edits", "--seed"):
+        if option in args:
+            i = args.index(option)
+            value = int(args[i + 1])
+            del args[i:i + 2]
+            if option == "--edits":
+                edits = value
+            else:
+                seed = value
+
+    rng = random.Random(seed)
+    files = collect(args or [EXAMPLES_DIR])
+    failed = sum(1 for path in files if check_cache(path, rng, edits))
+    print(f"{len(files) - failed}/{len(files)} examples recompile identically through the function cache")
+
+    reload_failed = 0
+    for backend in ("bytecode", "tiered", "py"):
+        problems = check_reload(backend)
+        if problems:
+            reload_failed += 1
+            print(f"FAIL hot reload ({backend}): {'; '.join(problems)}")
+    print(f"{3 - reload_failed}/3 backends hot-reload correctly")
+    return 1 if failed or reload_failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,5 +1,6 @@
 import sys
 import os
+from collections import deque
 from PySide6.QtWidgets import (QApplication, QMainWindow, QGraphicsView, QGraphicsScene, 
                              QGraphicsRectItem, QGraphicsTextItem, QGraphicsLineItem,
                              QVBoxLayout, QHBoxLayout, QWidget, QPushButton, QFileDialog,
@@ -8,6 +9,7 @@ from PySide6.QtCore import Qt, QPointF, QRectF
 from PySide6.QtGui import QPen, QBrush, QColor, QFont, QPainter
 
 from compiler.opcodes import OpCode
+from compiler.cfg import ControlFlowGraph
 from compiler.compiler import Compiler
 from compiler.base import Chunk, FunctionObject
 from compiler.parser import Parser
@@ -25,70 +27,37 @@ class Block:
         self.height = 0
         self.type = "normal" # normal, entry, exit, loop_header
 
+def format_arg(arg):
+    """Formats an instruction argument; superinstruction tuples show fused opcodes by name."""
+    if arg is None:
+        return ""
+    if isinstance(arg, tuple):
+        return " " + ", ".join(a.name if isinstance(a, OpCode) else str(a) for a in arg)
+    return f" {arg}"
+
 class FlowAnalyzer:
     def analyze(self, chunk: Chunk):
         code = chunk.code
         if not code:
             return []
 
-        # Find all entry points (jump targets)
-        entry_points = {0}
-        jump_targets = set()
-        for i, (op, arg) in enumerate(code):
-            if op in (OpCode.JUMP, OpCode.JUMP_IF_FALSE, OpCode.JUMP_IF_TRUE, 
-                      OpCode.JUMP_IF_FALSE_POP, OpCode.JUMP_IF_TRUE_POP, OpCode.LOOP, OpCode.FOR_ITER):
-                if arg is not None:
-                    entry_points.add(arg)
-                    jump_targets.add(arg)
-                entry_points.add(i + 1)
-
-        # Create blocks
+        cfg = ControlFlowGraph(code)
+        loop_headers = cfg.loops().keys()
         blocks = []
-        sorted_entries = sorted([e for e in entry_points if e <= len(code)])
-        for i in range(len(sorted_entries)):
-            start = sorted_entries[i]
-            if start >= len(code):
-                continue
-            end = sorted_entries[i+1] if i+1 < len(sorted_entries) else len(code)
-            
-            block_code = code[start:end]
-            b = Block(start, end, block_code)
-            if start == 0:
+        for cfg_block in cfg.blocks:
+            b = Block(cfg_block.start, cfg_block.end, code[cfg_block.start:cfg_block.end])
+            last_op = code[cfg_block.last][0]
+            if cfg_block.start == 0:
                 b.type = "entry"
-            elif any(op in (OpCode.RETURN, OpCode.RETURN_NONE) for op, _ in block_code):
+            elif last_op in (OpCode.RETURN, OpCode.RETURN_NONE):
                 b.type = "exit"
-            elif start in jump_targets:
-                # Check if it's a loop header (target of a LOOP instruction)
-                is_loop = False
-                for op, arg in code:
-                    if op == OpCode.LOOP and arg == start:
-                        is_loop = True
-                        break
-                if is_loop:
-                    b.type = "loop_header"
-            
+            elif cfg_block.index in loop_headers:
+                b.type = "loop_header"
             blocks.append(b)
 
-        # Connect blocks
-        block_map = {b.start_ip: b for b in blocks}
-        for b in blocks:
-            if not b.instructions: continue
-            last_op, last_arg = b.instructions[-1]
-            
-            if last_op in (OpCode.JUMP, OpCode.LOOP):
-                if last_arg in block_map:
-                    b.successors.append(block_map[last_arg])
-            elif last_op in (OpCode.JUMP_IF_FALSE, OpCode.JUMP_IF_TRUE, 
-                            OpCode.JUMP_IF_FALSE_POP, OpCode.JUMP_IF_TRUE_POP, OpCode.FOR_ITER):
-                # Conditional jump: can go to target or next block
-                if last_arg in block_map:
-                    b.successors.append(block_map[last_arg])
-                if b.end_ip in block_map:
-                    b.successors.append(block_map[b.end_ip])
-            elif last_op not in (OpCode.RETURN, OpCode.RETURN_NONE):
-                # Fall through to next block
-                if b.end_ip in block_map:
-                    b.successors.append(block_map[b.end_ip])
+        # Jump target first, then the fall-through block
+        for cfg_block, b in zip(cfg.blocks, blocks):
+            b.successors = [blocks[succ] for succ in cfg_block.successors]
         
         return blocks
 
@@ -115,7 +84,7 @@ class BlockItem(QGraphicsRectItem):
         text_lines = [f"--- Block {block.start_ip} ---"]
         for ip, (op, arg) in enumerate(block.instructions):
             actual_ip = block.start_ip + ip
-            arg_str = f" {arg}" if arg is not None else ""
+            arg_str = format_arg(arg)
             text_lines.append(f"{actual_ip:03d}: {op.name}{arg_str}")
         
         self.text_item = QGraphicsTextItem("\n".join(text_lines), self)
@@ -157,22 +126,18 @@ class FlowChartWidget(QGraphicsView):
         visited = set()
         
         def assign_levels_from(start_block, start_level):
-            queue = [(start_block, start_level)]
+            queue = deque([(start_block, start_level)])
             while queue:
-                b, level = queue.pop(0)
+                b, level = queue.popleft()
                 if b.start_ip in visited:
                     if block_to_level[b.start_ip] < level:
-                        if b in levels.get(block_to_level[b.start_ip], []):
-                            levels[block_to_level[b.start_ip]].remove(b)
+                        # Re-inserted, so the block moves to the end of its new level
+                        del block_to_level[b.start_ip]
                         block_to_level[b.start_ip] = level
-                        if level not in levels: levels[level] = []
-                        levels[level].append(b)
                     continue
                 
                 visited.add(b.start_ip)
                 block_to_level[b.start_ip] = level
-                if level not in levels: levels[level] = []
-                levels[level].append(b)
                 
                 for succ in b.successors:
                     if succ.start_ip > b.start_ip:
@@ -185,9 +150,13 @@ class FlowChartWidget(QGraphicsView):
         # Handle unreachable blocks
         for b in blocks:
             if b.start_ip not in visited:
-                max_l = max(levels.keys()) + 1 if levels else 0
+                max_l = max(block_to_level.values()) + 1 if block_to_level else 0
                 assign_levels_from(b, max_l)
 
+        by_start = {b.start_ip: b for b in blocks}
+        for start_ip, level in block_to_level.items():
+            levels.setdefault(level, []).append(by_start[start_ip])
+
         # 2. Position blocks based on levels
         max_level = max(levels.keys()) if levels else 0
         curr_y = 50
@@ -200,7 +169,7 @@ class FlowChartWidget(QGraphicsView):
                 text_lines = [f"--- Block {b.start_ip} ---"]
                 for ip, (op, arg) in enumerate(b.instructions):
                     actual_ip = b.start_ip + ip
-                    arg_str = f" {arg}" if arg is not None else ""
+                    arg_str = format_arg(arg)
                     text_lines.append(f"{actual_ip:03d}: {op.name}{arg_str}")
                 
                 text_item = QGraphicsTextItem("\n".join(text_lines))